@@ -1,36 +1,85 @@
-from typing import Any, List, Union
-import requests
-from PIL import Image
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING, Any, List, Union
 from contextlib import closing
-from tqdm import tqdm
-import re
 import io
 import sys
 import os
 import json
 import time
 import traceback
-import onnxruntime
-import ddddocr
-from .utils import make_dirs, parse_days_and_times, HiddenPrints, get_date_sort_key
+import copy
+import importlib
+import shutil
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .utils import make_dirs, subject_paths, HiddenPrints, LockedWriter
+from .parsing import build_course_detail, course_event_target, extract_form_state, make_soup, parse_course_rows, parse_sections
+from .transport import AdaptiveRateLimiter, RateLimiter, ScraperSession, make_adapter
+from .replay import Corpus, RecordingSession, ReplaySession
+from .checkpoint import CheckpointJournal
+from .writer import SubjectWriter
+from .timetable import TimetableBuilder
+from .search import SearchIndexBuilder
+from .metrics import Metrics
+from .captcha import CAPTCHA_LENGTH, CaptchaPool, get_ocr, recognize
+from .aggregate import aggregate, load_subjects, CourseListBuilder, CourseNamesBuilder, DepartmentsBuilder, InstructorsBuilder
 from functools import reduce
 
+if TYPE_CHECKING:
+    from PIL import Image
+    from bs4 import BeautifulSoup
+    from .catalog import Catalog
+
 # Captcha
-onnxruntime.set_default_logger_severity(3)
-ocr = ddddocr.DdddOcr()
 MAX_AUTO_CAPTCHA_ATTEMPTS = 16
+# Guesses below the confidence are re-fetched (up to MAX_CAPTCHA_REFETCHES times) instead of posted
+MIN_CAPTCHA_CONFIDENCE = 0.1
+MAX_CAPTCHA_REFETCHES = 4
 
 # General
 FLUSH = '\x1b[1K\r'
 
 
+# Modules only some runs need (sqlite3, brotli / orjson), imported by the methods using them
+LAZY_ATTRIBUTES = {
+    'SnapshotStore': 'store',
+    'Catalog': 'catalog',
+    'CatalogBuilder': 'catalog',
+    'publish_snapshot': 'publish',
+    'LEASE_SECONDS': 'coordinator',
+    'Heartbeat': 'coordinator',
+    'default_worker_id': 'coordinator',
+    'merge_outputs': 'coordinator',
+}
+
+
+# Loaded on first access, so the stat / info paths never pay for the OCR model (see captcha.py),
+# asyncio or multiprocessing
+def __getattr__(name):
+    if name == 'ocr':
+        return get_ocr()
+    if name == 'AsyncCourseScraper':
+        from .aio import AsyncCourseScraper
+        return AsyncCourseScraper
+    if name == 'PipelineCourseScraper':
+        from .pipeline import PipelineCourseScraper
+        return PipelineCourseScraper
+    if name in LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(f'.{LAZY_ATTRIBUTES[name]}', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class CourseScraper:
-    def __init__(self, current_term="2022-23 Term 1", merge_dir='../data', dirname='data', course_dirname='courses', derived_dirname='derived', resources_dirname='resources', save_captchas=False, timestamp: Union[str, bool] = False):
+    def __init__(self, current_term="2022-23 Term 1", merge_dir='../data', dirname='data', course_dirname='courses', derived_dirname='derived', resources_dirname='resources', save_captchas=False, timestamp: Union[str, bool] = False, max_rps=None, parser=None, base_url='http://rgsntl.rgs.cuhk.edu.hk', record_dir=None, replay_dir=None, replay_latency=0, checkpoint=False, incremental=False, captcha_prefetch=0, min_captcha_confidence=MIN_CAPTCHA_CONFIDENCE, timeout=(10, 30), retries=3, adaptive_rate=False, pool_maxsize=10, metrics=False, profile=False, trace_memory=False, keep_courses=False, store_dir=None, merge_snapshot=None, store_only=False, refresh=False):
         now = str(int(time.time())) if type(timestamp) is bool else timestamp
+        # Always recorded, exported to logs/metrics-{timestamp}.json & .prom by post_processing with metrics=True
+        self.metrics = Metrics(profile, trace_memory)
+        self.export_metrics = metrics
         self.dir_prefix = os.path.join(dirname, now)
         self.timestamp = now
         self.current_term = current_term
+        # BeautifulSoup backend, defaults to lxml if installed
+        self.parser = parser
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_1_0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9'
@@ -41,8 +90,24 @@ class CourseScraper:
             'Upgrade-Insecure-Requests': '1',
             'Content-Type': 'application/x-www-form-urlencoded',
         }
-        self.course_url = 'http://rgsntl.rgs.cuhk.edu.hk/aqs_prd_applx/Public/tt_dsp_crse_catalog.aspx'
-        self.sess = requests.Session()
+        self.base_url = base_url
+        self.course_url = f'{base_url}/aqs_prd_applx/Public/tt_dsp_crse_catalog.aspx'
+        # Record every response into record_dir, or serve them back from replay_dir without network
+        self.record_corpus = Corpus(record_dir) if record_dir else None
+        self.replay_corpus = Corpus(replay_dir) if replay_dir else None
+        self.replay_latency = replay_latency
+        # Shared by every session (incl. parallel workers) to cap the overall request rate, or with
+        # adaptive_rate, to back off from max_rps when responses get slow or fail
+        self.limiter = AdaptiveRateLimiter(
+            max_rps or 10) if adaptive_rate else RateLimiter(max_rps)
+        # (connect, read) timeout & retries of every request, over keep-alive connections shared by all sessions
+        self.timeout = timeout
+        self.retries = retries
+        self.adapter = make_adapter(pool_maxsize)
+        self.sess = self.new_session()
+        # Courses are streamed to disk as they're parsed, keep_courses also keeps every saved subject
+        # in self.courses (e.g. for generate_stat(cs.courses)) at the cost of memory growing with the run
+        self.keep_courses = keep_courses
         self.courses = {}
         self.form_body = {}
         self.stat_dir = os.path.join(
@@ -51,44 +116,198 @@ class CourseScraper:
         self.derived_dirname = os.path.join(self.dir_prefix, derived_dirname)
         self.resources_dirname = os.path.join(
             self.dir_prefix, resources_dirname)
+        self.partial_dirname = os.path.join(self.dir_prefix, 'partial')
+        self.catalog_path = os.path.join(self.dir_prefix, 'catalog.sqlite')
         self.save_captchas = save_captchas
         self.auto_captcha_attempts = 0
-        make_dirs([dirname, self.dir_prefix, self.course_dirname, self.derived_dirname,
+        # Number of search pages with a recognized captcha kept ready in the background, 0 to disable
+        self.captcha_prefetch = captcha_prefetch
+        self.min_captcha_confidence = min_captcha_confidence
+        self.captcha_pool = None
+        # Parallel workers cannot prompt for input, so they give up on the subject instead
+        self.manual_fallback = True
+        make_dirs([dirname, self.dir_prefix, self.course_dirname, self.derived_dirname, self.partial_dirname,
                   self.stat_dir, self.resources_dirname, 'captchas', 'logs'])
-        self.log_file = open(os.path.join('logs', f'parser-{now}.log'), 'w')
+        self.log_file = LockedWriter(
+            open(os.path.join('logs', f'parser-{now}.log'), 'w'), self.metrics.record_log)
+        # Runs are also kept in a deduplicated snapshot store (store_only: only there), merge_snapshot
+        # (e.g. 'latest') merges from one of its snapshots instead of merge_dir, materialising files as they're read
+        self.store = None
+        if store_dir:
+            from .store import SnapshotStore
+            self.store = SnapshotStore(store_dir)
+        self.store_only = store_only
+        self.merge_snapshot = None
+        if self.store and merge_snapshot:
+            if merge_snapshot == 'latest' and not self.store.snapshots():
+                # First run into the store, nothing to merge from
+                merge_dir = os.path.join(self.store.path, 'materialized', 'none')
+            else:
+                self.merge_snapshot = self.store.snapshot(merge_snapshot)
+                merge_dir = self.merge_snapshot.dirname
+        if self.store and self.store.has_snapshot(now):
+            # e.g. stat / info of a stored run
+            self.store.snapshot(now).materialize(self.dir_prefix)
+        self.merge_dir = merge_dir
         self.old_courses_dir = os.path.join(merge_dir, 'courses')
+        # Journal each course & term as it's parsed, rerun with the same timestamp to resume
+        self.journal = CheckpointJournal(os.path.join(
+            self.dir_prefix, 'checkpoints')) if checkpoint else None
+        # Only fetch terms from current_term on, older terms are taken from merge_dir
+        self.incremental = incremental
+        # Only fetch the sections of current_term and patch them into the courses of merge_dir (e.g. during
+        # add/drop), courses that aren't in merge_dir yet are fetched in full
+        self.refresh = refresh
         try:
             # Need to accumulate instructors for ppl to write reviews for prev courses
-            with open(os.path.join(merge_dir, 'resources/instructors.json'), 'r') as f:
+            with open(self.merge_path('resources/instructors.json'), 'r') as f:
                 self.instructors = json.load(f)
         except FileNotFoundError:
             self.instructors = []
 
-    def post_processing(self, stat=False):
+    def new_session(self) -> ScraperSession:
+        if self.replay_corpus:
+            return ReplaySession(self.replay_corpus, self.limiter, self.replay_latency, self.metrics)
+        options = {
+            'timeout': self.timeout,
+            'retries': self.retries,
+            'adapter': self.adapter,
+            'is_transient': self.is_transient_page,
+            'metrics': self.metrics,
+        }
+        if self.record_corpus:
+            return RecordingSession(self.record_corpus, self.limiter, **options)
+        return ScraperSession(self.limiter, **options)
+
+    # Every catalog page is an ASP.NET form, one without __VIEWSTATE is an error / throttling page
+    # (not a wrong captcha, which renders the search form again) and worth another try
+    @staticmethod
+    def is_transient_page(res) -> bool:
+        return 'html' in res.headers.get('Content-Type', '') and b'__VIEWSTATE' not in res.content
+
+    # A copy of the scraper with its own session, form state and captcha loop
+    def spawn_worker(self):
+        worker = copy.copy(self)
+        worker.sess = self.new_session()
+        worker.form_body = {}
+        worker.auto_captcha_attempts = 0
+        worker.captcha_pool = None
+        worker.manual_fallback = False
+        return worker
+
+    def post_processing(self, stat=False, courses: dict = None):
+        self.close_captcha_pool()
         if stat:
-            self.generate_stat()
+            self.generate_stat(courses)
+        if self.export_metrics:
+            self.save_metrics()
+        if self.store:
+            self.save_snapshot()
+        self.close()
+
+    # Releases the captcha pool & the parser log without post processing, e.g. after a failed run
+    def close(self):
+        self.close_captcha_pool()
         try:
             self.log_file.close()
         except Exception:
             pass
 
-    def generate_stat(self):
-        self.remove_empty_courses()
-        self.process_subjects(label_availability=True, concise=True)
-        self.process_instructors_name()
+    def save_snapshot(self):
+        if self.unfinished_subjects():
+            # Kept out of the store (and on disk) until a resumed run finishes them
+            print(f"Not storing {self.dir_prefix}, {', '.join(self.unfinished_subjects())} unfinished")
+            return
+        stats = self.store.put_snapshot(self.dir_prefix, self.timestamp)
+        print(f"Stored {stats['subjects']} subjects in {self.store.path}, {stats['new_objects']}/{stats['objects']} new objects")
+        if self.store_only:
+            shutil.rmtree(self.dir_prefix)
+
+    # Subjects with courses still in partial/ or a checkpoint journal, i.e. interrupted mid-subject
+    def unfinished_subjects(self) -> list:
+        subjects = set()
+        for dirname in [self.partial_dirname, os.path.join(self.dir_prefix, 'checkpoints')]:
+            if os.path.isdir(dirname):
+                subjects.update(os.path.splitext(name)[0] for name in os.listdir(dirname))
+        return sorted(subjects)
+
+    def save_metrics(self):
+        prefix = os.path.join('logs', f'metrics-{self.timestamp}')
+        self.metrics.write_json(f'{prefix}.json')
+        self.metrics.write_prometheus(f'{prefix}.prom')
+        self.metrics.write_profile(
+            os.path.join('logs', f'profile-{self.timestamp}.pstats'))
+        print(f'Saved metrics in {prefix}.json & .prom')
+
+    # Build every derived output in one pass over the subjects. Pass courses (e.g. self.courses after
+    # a full run with keep_courses=True or save=False) to skip reading the course dir, empty courses (the
+    # saved subjects weren't kept) read it anyway. workers > 1 loads subject files in parallel.
+    # publish: also bundle the files for the frontend into publish/, see cuscraper.publish
+    def generate_stat(self, courses: dict = None, workers=1, publish=True):
+        course_list = CourseListBuilder(
+            self.current_term, label_availability=True, concise=True)
+        instructors = InstructorsBuilder(self.instructors)
+        departments = DepartmentsBuilder()
+        course_names = CourseNamesBuilder()
+        timetable = TimetableBuilder()
+        search_index = SearchIndexBuilder()
+        # Indexed SQLite copy of the course files, see cuscraper.catalog
+        from .catalog import CatalogBuilder
+        catalog = CatalogBuilder(self.catalog_path)
+        aggregate(self.iter_subjects(courses, workers), [
+                  course_list, instructors, departments, course_names, timetable, search_index, catalog])
+        self.save_course_list(course_list.result())
+        self.save_instructors(*instructors.result())
         # Below for frontend only, and no need update per sem unless faculty changed / new course code
-        self.process_faculty_subjects()
-        self.group_faculty_subjects()
-        self.get_courses_hashset()
-
+        department_subjects = self.save_departments(*departments.result())
+        self.group_faculty_subjects(department_subjects)
+        self.save_courses_hashset(*course_names.result())
+        # Interval index of every timeslot, see cuscraper.timetable
+        timetable.result().save(os.path.join(self.derived_dirname, 'timetable.json'))
+        # Full-text search over titles, descriptions, outcomes, syllabi & requirements, see cuscraper.search
+        search_index.result().save(os.path.join(self.derived_dirname, 'search_index.json'))
+        if publish:
+            self.publish_artifacts()
+
+    def publish_artifacts(self):
+        from .publish import publish_snapshot
+        if self.merge_snapshot:
+            # Compressed files of the previous bundle are reused from there
+            self.merge_snapshot.materialize(prefix='publish/')
+        manifest = publish_snapshot(self.dir_prefix, previous=os.path.join(self.merge_dir, 'publish'))
+        print(f"Published {len(manifest)} files, {sum(entry['gzip_bytes'] for entry in manifest.values())} bytes gzipped")
+
+    # Query API over catalog.sqlite of this run, written by generate_stat, or with merged=True, of merge_dir
+    # (or merge_snapshot, materialised on first access)
+    def catalog(self, merged=False) -> 'Catalog':
+        from .catalog import Catalog
+        return Catalog(self.merge_path('catalog.sqlite') if merged else self.catalog_path)
+
+    # Non-empty subjects, removing empty {subject}.json along the way
+    def iter_subjects(self, courses: dict = None, workers=1):
+        if courses:
+            # In course dir order, so the outputs are the same as when reading it
+            order = {subject: i for i, subject in enumerate(subject_paths(self.course_dirname))}
+            subjects = sorted(courses.items(), key=lambda item: order.get(item[0], len(order)))
+        else:
+            subjects = load_subjects(self.course_dirname, workers)
+        for subject, subject_courses in subjects:
+            if not subject_courses or len(subject_courses) == 0:
+                subject_path = os.path.join(
+                    self.course_dirname, f'{subject}.json')
+                if os.path.exists(subject_path):
+                    self.log_file.write(f'Removed empty {subject}.json\n')
+                    os.remove(subject_path)
+                continue
+            yield subject, subject_courses
+
+    # fn(courses, subject, file) for every subject, always from the course files, which may have changed
+    # since generate_stat wrote catalog.sqlite. Query the catalog through self.catalog() instead
     def with_course(self, fn):
-        with os.scandir(self.course_dirname) as it:
-            for entry in it:
-                with open(entry.path, 'r') as f:
-                    filename = entry.path[(len(self.course_dirname)+1):-5]
-                    if(len(filename) == 4):  # i.e. filename is a valid subject code
-                        courses = json.load(f)
-                        fn(courses, filename, f)
+        for subject, path in subject_paths(self.course_dirname).items():
+            with open(path, 'r') as f:
+                courses = json.load(f)
+                fn(courses, subject, f)
 
     def with_course_section(self, fn):
         def append_to_sections(courses, subject, f):
@@ -110,94 +329,59 @@ class CourseScraper:
     # Get all department codes
 
     def process_faculty_subjects(self):
-        subject_department_mapping = {}
-        subjects_under_department = {}
+        departments, = aggregate(load_subjects(
+            self.course_dirname), [DepartmentsBuilder()])
+        return self.save_departments(*departments)
 
-        def append_to_mapping(courses, subject, f):
-            for course in courses:
-                if 'academic_group' in course:
-                    subject_department_mapping[subject] = course['academic_group']
-                    break
-        self.with_course(append_to_mapping)
+    def save_departments(self, subject_department_mapping, subjects_under_department):
         with open(os.path.join(self.derived_dirname, 'subjects.json'), 'w') as f:
             json.dump(subject_department_mapping, f)
-        for k, v in subject_department_mapping.items():
-            if v in subjects_under_department:
-                subjects_under_department[v].append(k)
-            else:
-                subjects_under_department[v] = [k]
         print(f'Number of departments: {len(subjects_under_department)}')
         with open(os.path.join(self.derived_dirname, 'departments.json'), 'w') as f:
             json.dump(subjects_under_department, f)
+        return subjects_under_department
 
     # Get all courses under a subject, and save Id and title only
     def process_subjects(self, label_availability=False, concise=False):
-        all_courses = {}
+        all_courses, = aggregate(load_subjects(self.course_dirname), [
+            CourseListBuilder(self.current_term, label_availability, concise)])
+        self.save_course_list(all_courses)
 
-        def append_to_subjects(courses, subject, f):
-            course_list = []
-            for course in courses:
-                course_concise = {
-                    'courseId' if not concise else 'c': subject + course['code'],
-                    'title' if not concise else 't': course['title']
-                }
-                if label_availability:
-                    avaliable = False
-                    if 'terms' in course:
-                        for term in course['terms'].keys():
-                            if term == self.current_term:
-                                avaliable = True
-                                break
-                    if avaliable:
-                        course_concise['offerring' if not concise else 'o'] = 1
-                course_list.append(course_concise)
-            all_courses[subject] = course_list
-        self.with_course(append_to_subjects)
+    def save_course_list(self, all_courses):
         with open(os.path.join(self.resources_dirname, 'course_list.json'), 'w') as f:
             json.dump(all_courses, f)
 
     # Get all lecturer name
     def process_instructors_name(self):
-        TITLE_PREFIXS = ['Ms', 'Dr', 'Mr', 'Miss', 'Professor', 'Prof']
-        REMOVE_TITLE_REGEX = r'\b(?:' + '|'.join(TITLE_PREFIXS) + r')\.\s*'
-        CLEANING_REGEX = r'|'.join(map(re.escape, [
-                                   '.', '\n\r', '\n\n', '***'] + list(map(lambda x: f"{x} ", TITLE_PREFIXS))))
-        instructors = set(self.instructors)
-
-        def append_to_instructors(section, course):
-            for instructor in section['instructors']:
-                # Remove the title
-                instructor = re.sub(REMOVE_TITLE_REGEX, '', instructor)
-                instructor = re.sub(CLEANING_REGEX, '', instructor).strip()
-                # Split for multiple instructors in one section
-                for part in instructor.split(', '):
-                    instructors.add(part)
-
-        self.with_course_section(append_to_instructors)
-        sorted_instructors = list(instructors)
-        sorted_instructors.sort()
+        (sorted_instructors, instructor_index), = aggregate(load_subjects(
+            self.course_dirname), [InstructorsBuilder(self.instructors)])
+        self.save_instructors(sorted_instructors, instructor_index)
+
+    def save_instructors(self, sorted_instructors, instructor_index=None):
         print(f"Found {len(sorted_instructors)} instructors")
         with open(os.path.join(self.resources_dirname, 'instructors.json'), 'w') as f:
             json.dump(sorted_instructors, f)
+        if instructor_index is not None:
+            # Sections taught by each instructor, so reviews & "courses taught by" are a key lookup
+            with open(os.path.join(self.derived_dirname, 'instructor_index.json'), 'w') as f:
+                json.dump(instructor_index, f)
 
     def remove_empty_courses(self):
-        def append_to_remove(courses, subject, f):
-            if not courses or len(courses) == 0:
-                self.log_file.write(f'Removed empty {subject}.json\n')
-                os.remove(os.path.join(self.course_dirname, f'{subject}.json'))
-        self.with_course(append_to_remove)
+        for _ in self.iter_subjects():
+            pass
 
-    def faculty_department_mapping(self):
+    def faculty_department_mapping(self, department_subjects=None):
         department_list = {}
-        with open(os.path.join(self.derived_dirname, 'departments.json'), 'r') as f:
-            department_subjects = json.load(f)
-            for department, subjects in department_subjects.items():
-                # Need manually edit each field now
-                department_list[department] = 0
+        if department_subjects is None:
+            with open(os.path.join(self.derived_dirname, 'departments.json'), 'r') as f:
+                department_subjects = json.load(f)
+        for department, subjects in department_subjects.items():
+            # Need manually edit each field now
+            department_list[department] = 0
         with open(os.path.join(self.stat_dir, 'faculty_departments.json'), 'w') as f:
             json.dump(department_list, f)
 
-    def group_faculty_subjects(self):
+    def group_faculty_subjects(self, department_subjects=None):
         try:
             faculty_subjects = {}
             with open(os.path.join(self.stat_dir, 'faculties.json'), 'r') as f:
@@ -208,16 +392,17 @@ class CourseScraper:
                     faculty_lookup[key] = faculty
                 with open(os.path.join(self.stat_dir, 'faculty_departments.json'), 'r') as f:
                     department_faculty_mapping = json.load(f)
-                    with open(os.path.join(self.derived_dirname, 'departments.json'), 'r') as f:
-                        department_subjects = json.load(f)
-                        for department, faculty_key in department_faculty_mapping.items():
-                            try:
-                                faculty_subjects[faculty_lookup[faculty_key]
-                                                 ] += department_subjects[department]
-                            except Exception:
-                                self.log_file.write(
-                                    'Missing department (maybe renamed) {}\n'.format(department))
-                                self.log_file.write(traceback.format_exc())
+                    if department_subjects is None:
+                        with open(os.path.join(self.derived_dirname, 'departments.json'), 'r') as f:
+                            department_subjects = json.load(f)
+                    for department, faculty_key in department_faculty_mapping.items():
+                        try:
+                            faculty_subjects[faculty_lookup[faculty_key]
+                                             ] += department_subjects[department]
+                        except Exception:
+                            self.log_file.write(
+                                'Missing department (maybe renamed) {}\n'.format(department))
+                            self.log_file.write(traceback.format_exc())
 
             for arr in faculty_subjects.values():
                 arr.sort()
@@ -225,10 +410,14 @@ class CourseScraper:
             with open(os.path.join(self.derived_dirname, 'faculty_subjects.json'), 'w') as f:
                 json.dump(faculty_subjects, f)
         except FileNotFoundError:
-            self.faculty_department_mapping()
+            self.faculty_department_mapping(department_subjects)
             print('Generated departments mapping, please label with faculty code')
 
-    def parse_all(self, save=True, manual=False, skip_parsed=False, verbose=True):
+    def parse_all(self, save=True, manual=False, skip_parsed=False, verbose=True, workers=1):
+        from tqdm import tqdm
+        if manual and workers > 1:
+            raise ValueError(
+                'Manual captcha input is not supported with multiple workers')
         self.get_code_list()
         num_subjects = len(self.code_list)
         print(
@@ -239,6 +428,11 @@ class CourseScraper:
                 for entry in it:
                     subject = entry.path[(len(self.course_dirname)+1):-5]
                     parsed_subjects[subject] = True
+        if workers > 1:
+            self.parse_parallel(
+                [code for code in self.code_list if code not in parsed_subjects], save, workers, verbose)
+            print(f"Done! Saved at {self.dir_prefix}")
+            return self.timestamp
         for idx, code in enumerate(tqdm(self.code_list), start=1):
             with HiddenPrints(not verbose):
                 if skip_parsed and code in parsed_subjects:
@@ -247,21 +441,99 @@ class CourseScraper:
                     continue
                 print(f'({idx}/{num_subjects})', end=' ')
                 self.search_subject(code, save, manual)
+        self.close_captcha_pool()
         print(f"Done! Saved at {self.dir_prefix}")
         return self.timestamp
 
+    # Parse subjects with multiple workers, each owning an independent session & form state
+    def parse_parallel(self, subjects, save=True, workers=4, verbose=True):
+        from tqdm import tqdm
+        subject_queue = queue.Queue()
+        for subject in subjects:
+            subject_queue.put(subject)
+        num_subjects = len(subjects)
+        out = sys.stdout
+        progress_lock = threading.Lock()
+        pbar = tqdm(total=num_subjects)
+
+        def run_worker(worker):
+            while True:
+                try:
+                    subject = subject_queue.get_nowait()
+                except queue.Empty:
+                    worker.close_captcha_pool()
+                    return
+                try:
+                    done = worker.search_subject(subject, save)
+                    status = 'done' if done else 'gave up (captcha)'
+                except Exception as e:
+                    status = f'failed ({e})'
+                    self.log_file.write(
+                        f'Error parsing subject {subject}: {str(e)}\n')
+                    self.log_file.write(traceback.format_exc())
+                with progress_lock:
+                    pbar.update()
+                    if verbose:
+                        pbar.write(
+                            f'({pbar.n}/{num_subjects}) {subject} {status}', file=out)
+
+        # Interleaved per-course output from workers is unreadable, report per subject instead
+        with HiddenPrints(), ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_worker, self.spawn_worker())
+                       for _ in range(min(workers, num_subjects))]
+            for future in futures:
+                future.result()
+        pbar.close()
+
+    # Parse the subjects leased from a coordinator queue until it is empty, see cuscraper.coordinator.
+    # Several processes / hosts can share the queue, each with its own dir (or the same shared one)
+    # lease_seconds defaults to coordinator.LEASE_SECONDS
+    def parse_queue(self, lease_queue, worker_id=None, save=True, lease_seconds=None):
+        from .coordinator import LEASE_SECONDS, Heartbeat, default_worker_id
+        lease_seconds = lease_seconds or LEASE_SECONDS
+        worker_id = worker_id or default_worker_id()
+        # Nobody to type in a captcha
+        self.manual_fallback = False
+        while True:
+            subject = lease_queue.claim(worker_id, lease_seconds)
+            if subject is None:
+                break
+            print(f'{worker_id} leased {subject}')
+            try:
+                with Heartbeat(lease_queue, subject, worker_id, lease_seconds) as heartbeat:
+                    done = self.search_subject(subject, save)
+            except Exception as e:
+                self.log_file.write(f'Error parsing subject {subject}: {str(e)}\n')
+                self.log_file.write(traceback.format_exc())
+                lease_queue.fail(subject, worker_id, str(e))
+                continue
+            if not done:
+                lease_queue.fail(subject, worker_id, 'gave up (captcha)')
+                continue
+            if heartbeat.lost:
+                self.log_file.write(f'Lease of {subject} expired while parsing it\n')
+            output = os.path.abspath(os.path.join(self.course_dirname, f'{subject}.json'))
+            lease_queue.complete(subject, worker_id, output if os.path.exists(output) else None)
+        self.close_captcha_pool()
+        print(f"Queue empty, saved at {self.dir_prefix}")
+        return self.timestamp
+
+    # Assemble the {subject}.json completed by the queue's workers into this run's course dir
+    def merge_queue(self, lease_queue) -> int:
+        from .coordinator import merge_outputs
+        merged = merge_outputs(lease_queue, self.course_dirname)
+        print(f'Merged {merged} subjects into {self.course_dirname}')
+        failed = lease_queue.failed()
+        if failed:
+            print(f'{len(failed)} subjects failed: {", ".join(failed)}')
+        return merged
+
     def get_courses_hashset(self):
-        subject_courses_list = {}
-        full_name_courses = []
+        course_names, = aggregate(load_subjects(
+            self.course_dirname), [CourseNamesBuilder()])
+        self.save_courses_hashset(*course_names)
 
-        def append_to_hashset(courses, subject, f):
-            courses_list = []
-            for course in courses:
-                code = course["code"]
-                courses_list.append(code)
-                full_name_courses.append(f"{subject}{code}")
-            subject_courses_list[subject] = courses_list
-        self.with_course(append_to_hashset)
+    def save_courses_hashset(self, subject_courses_list, full_name_courses):
         with open(os.path.join(self.derived_dirname, 'subject_course_names.json'), 'w') as f:
             json.dump(subject_courses_list, f)
         # Derive all courses list for FE to use
@@ -269,44 +541,70 @@ class CourseScraper:
             json.dump(full_name_courses, f)
 
     def get_code_list(self):
-        with closing(requests.get(self.course_url, headers=self.headers)) as res:
-            soup = BeautifulSoup(res.text, 'html.parser')
+        with closing(self.sess.get(self.course_url, headers=self.headers)) as res:
+            soup = make_soup(res.text, self.parser)
             code_list = []
             for node in soup.select('#ddl_subject option')[1:]:
                 code_list.append(node.get('value'))
             # print(list(filter(None, code_list)))
             self.code_list = list(filter(None, code_list))
 
-    def get_captcha(self, soup: BeautifulSoup, manual=False) -> Image:
-        captcha_id = soup.select_one('#hf_Captcha')['value']
-        captcha_url = f'http://rgsntl.rgs.cuhk.edu.hk/aqs_prd_applx/Public/BuildCaptcha.aspx?captchaname={captcha_id}&len=4'
+    def fetch_captcha_image(self, captcha_id) -> bytes:
+        captcha_url = f'{self.base_url}/aqs_prd_applx/Public/BuildCaptcha.aspx?captchaname={captcha_id}&len={CAPTCHA_LENGTH}'
         with closing(self.sess.get(captcha_url, headers=self.headers)) as captcha_res:
-            in_memory_file = io.BytesIO(captcha_res.content)
-            im = Image.open(in_memory_file)
-            if manual:
-                im.show()
-                captcha = str(input('Input the captcha here: '))
-            else:
-                captcha = ocr.classification(in_memory_file.getvalue())
-                print(
-                    f'Recognized captcha: {captcha} (#{self.auto_captcha_attempts})')
-            self.form_body.update({
-                'hf_Captcha': captcha_id,
-                'txt_captcha': captcha,
-            })
-            return im
-
-    def update_form(self, soup: BeautifulSoup, update=True, additional_keys=None) -> dict:
-        form_body = {'__VIEWSTATEFIELDCOUNT': soup.select_one(
-            '#__VIEWSTATEFIELDCOUNT')['value']}
+            return captcha_res.content
+
+    def get_captcha(self, form_state: dict, manual=False) -> 'Image.Image':
+        from PIL import Image
+        captcha_id = form_state['hf_Captcha']
+        image = self.fetch_captcha_image(captcha_id)
+        if manual:
+            im = Image.open(io.BytesIO(image))
+            im.show()
+            captcha = str(input('Input the captcha here: '))
+        else:
+            with self.metrics.parse_stage('captcha_ocr'):
+                captcha, confidence = recognize(image)
+            refetches = 0
+            # A new image is cheaper than a search POST that is likely wrong, and
+            # each fetch replaces the captcha, so the last image is the one to answer
+            while confidence < self.min_captcha_confidence and refetches < MAX_CAPTCHA_REFETCHES:
+                refetches += 1
+                image = self.fetch_captcha_image(captcha_id)
+                with self.metrics.parse_stage('captcha_ocr'):
+                    captcha, confidence = recognize(image)
+            im = Image.open(io.BytesIO(image))
+            print(
+                f'Recognized captcha: {captcha} ({confidence:.2f}, #{self.auto_captcha_attempts})')
+        self.form_body.update({
+            'hf_Captcha': captcha_id,
+            'txt_captcha': captcha,
+        })
+        return im
+
+    # form_state & captcha image of a new search page, for the captcha pool
+    def fetch_search_page(self) -> tuple:
+        with closing(self.sess.get(self.course_url, headers=self.headers)) as res:
+            form_state = extract_form_state(res.text)
+        return form_state, self.fetch_captcha_image(form_state['hf_Captcha'])
+
+    def close_captcha_pool(self):
+        if self.captcha_pool:
+            self.captcha_pool.close()
+            self.captcha_pool = None
+
+    # page is either the raw html or the form state extracted from it
+    def update_form(self, page: Union[str, dict, 'BeautifulSoup'], update=True, additional_keys=None) -> dict:
+        form_state = page if isinstance(
+            page, dict) else extract_form_state(str(page))
+        form_body = {'__VIEWSTATEFIELDCOUNT': form_state['__VIEWSTATEFIELDCOUNT']}
         form_keys = ['__EVENTVALIDATION', '__VIEWSTATEGENERATOR', '__VIEWSTATE'] + \
             [f'__VIEWSTATE{str(i)}' for i in range(
                 1, int(form_body['__VIEWSTATEFIELDCOUNT']))]
         if additional_keys:
             form_keys.extend(additional_keys)
         for k in form_keys:
-            id = k.replace('$', '_')
-            form_body[k] = soup.select_one(f'#{id}')['value']
+            form_body[k] = form_state[k.replace('$', '_')]
         if update:
             self.form_body.update(form_body)
         else:
@@ -314,234 +612,209 @@ class CourseScraper:
 
     # get all course under a subject code
     def search_subject(self, subject, save=True, manual=False):
+        from PIL import Image
         print(f'Parsing courses under subject {subject}')
-        with closing(self.sess.get(self.course_url, headers=self.headers)) as res:
-            soup = BeautifulSoup(res.text, 'html.parser')
-            self.update_form(soup)
-            self.form_body.update({
-                'ddl_subject': subject,
-                'hf_previous_page': 'SEARCH',
-                'hf_max_search_iteration': '1',
-                'hf_search_iteration': '1',
-            })
-            while True:
-                im = self.get_captcha(soup, manual)
-                form_body = {'btn_search': 'Search'}
-                form_body.update(self.form_body)
-                with closing(self.sess.post(self.course_url, headers=self.form_headers, data=form_body)) as res:
-                    correct_captcha = self.parse_subject_courses(
-                        subject, res.text, save)
-                    if correct_captcha:
-                        self.auto_captcha_attempts = 0
-                        if self.save_captchas:
-                            # Save image & label here as training dataset
-                            filename = str(int(time.time()))
-                            im.save(
-                                f"captchas/{self.form_body['txt_captcha']}_{filename}.png")
-                        break
-                    else:
-                        if not manual:
-                            self.auto_captcha_attempts += 1
-                            if self.auto_captcha_attempts > MAX_AUTO_CAPTCHA_ATTEMPTS:
-                                print(
-                                    f'Reached max attempt of {MAX_AUTO_CAPTCHA_ATTEMPTS}, please enter manually!')
-                                manual = True
-                        print('Wrong captcha!')
+        if self.captcha_prefetch and not manual and self.captcha_pool is None:
+            self.captcha_pool = CaptchaPool(
+                self.fetch_search_page, self.captcha_prefetch, self.min_captcha_confidence, self.metrics)
+        form_state = None
+        attempts = 0
+        while True:
+            if self.captcha_pool and not manual:
+                # Search page & captcha fetched and recognized in the background
+                try:
+                    ticket = self.captcha_pool.get()
+                except Exception as e:
+                    self.log_file.write(
+                        f'Captcha pool failed, prefetching disabled: {str(e)}\n')
+                    self.close_captcha_pool()
+                    continue
+                form_state = ticket.form_state
+                self.search_form(form_state, subject)
+                self.form_body.update({
+                    'hf_Captcha': form_state['hf_Captcha'],
+                    'txt_captcha': ticket.captcha,
+                })
+                im = Image.open(io.BytesIO(ticket.image))
+                print(
+                    f'Prefetched captcha: {ticket.captcha} ({ticket.confidence:.2f}, #{self.auto_captcha_attempts})')
+            else:
+                if form_state is None:
+                    with closing(self.sess.get(self.course_url, headers=self.headers)) as res:
+                        form_state = extract_form_state(res.text)
+                    self.search_form(form_state, subject)
+                im = self.get_captcha(form_state, manual)
+            form_body = {'btn_search': 'Search'}
+            form_body.update(self.form_body)
+            attempts += 1
+            with closing(self.sess.post(self.course_url, headers=self.form_headers, data=form_body)) as res:
+                correct_captcha = self.parse_subject_courses(
+                    subject, res.text, save)
+                if correct_captcha:
+                    self.metrics.record_captcha(subject, attempts)
+                    self.auto_captcha_attempts = 0
+                    if self.save_captchas:
+                        # Save image & label here as training dataset
+                        filename = str(int(time.time()))
+                        im.save(
+                            f"captchas/{self.form_body['txt_captcha']}_{filename}.png")
+                    return True
+                else:
+                    if not manual:
+                        self.auto_captcha_attempts += 1
+                        if self.auto_captcha_attempts > MAX_AUTO_CAPTCHA_ATTEMPTS:
+                            if not self.manual_fallback:
+                                self.metrics.record_captcha(
+                                    subject, attempts, solved=False)
+                                self.auto_captcha_attempts = 0
+                                self.log_file.write(
+                                    f'Gave up {subject} after {MAX_AUTO_CAPTCHA_ATTEMPTS} captcha attempts\n')
+                                return False
+                            print(
+                                f'Reached max attempt of {MAX_AUTO_CAPTCHA_ATTEMPTS}, please enter manually!')
+                            manual = True
+                    print('Wrong captcha!')
+
+    def search_form(self, form_state: dict, subject):
+        self.update_form(form_state)
+        self.form_body.update({
+            'ddl_subject': subject,
+            'hf_previous_page': 'SEARCH',
+            'hf_max_search_iteration': '1',
+            'hf_search_iteration': '1',
+        })
 
     # parse the courses under a subject and get details of each course
     def parse_subject_courses(self, subject, html, save):
         global FLUSH
-        course_list = []
-        course_code_set = set()
-        soup = BeautifulSoup(html, 'html.parser')
-        self.update_form(soup)
-        course_detail_node = soup.select_one('#gv_detail')
-        if not course_detail_node:
+        with self.metrics.parse_stage('course_rows'):
+            self.update_form(html)
+            course_rows = parse_course_rows(make_soup(html, self.parser))
+        if course_rows is None:
             return False
-        course_row_nodes = course_detail_node.findChildren(
-            'tr', recursive=False)
-        course_row_nodes.pop(0)  # remove the header node
-        print(f'Found {len(course_row_nodes)} courses under subject {subject}')
-        for i, row in enumerate(course_row_nodes):
-            a_node = row.select('a')
-            course = {
-                'code': a_node[0].text,
-                'title': a_node[1].text,
-            }
-            sys.stdout.write('{}Posting request #{} for {}{} {}'.format(
-                FLUSH, i + 1, subject, course['code'], course['title']))
-            form_body = {
-                '__EVENTTARGET': 'gv_detail$ctl{}$lbtn_course_title'.format(f'0{i+2}' if i + 2 < 10 else str(i+2)),
-            }
-            form_body.update(self.form_body)
-            with closing(self.sess.post(self.course_url, headers=self.headers, data=form_body)) as res:
-                course_detail = self.parse_course_detail(
-                    res.text, subject + course['code'])
-                course.update(course_detail)
-            course_code_set.add(course["code"])
-            course_list.append(course)
-        course_list = sorted(course_list, key=lambda x: x['code'])
-        if save:
-            # Check for old entries and merge
-            old_courses = self.__load_subject(subject)
-            for course in old_courses:
-                if not course["code"] in course_code_set:
-                    course_list.append(course)
-            with open(os.path.join(self.course_dirname, f'{subject}.json'), 'w') as f:
-                json.dump(course_list, f)
-        print(f'{FLUSH}Saved {len(course_list)} {subject} courses in {os.path.join(self.course_dirname, subject)}.json')
-        self.courses[subject] = course_list
+        print(f'Found {len(course_rows)} courses under subject {subject}')
+        caches = self.course_caches(subject)
+        writer = self.subject_writer(subject, save)
+        try:
+            for i, course in enumerate(course_rows):
+                cache = caches.pop(course['code'], {})
+                if cache.get('course'):
+                    sys.stdout.write('{}Resumed #{} {}{} {}'.format(
+                        FLUSH, i + 1, subject, course['code'], course['title']))
+                    writer.write(cache['course'])
+                    continue
+                sys.stdout.write('{}Posting request #{} for {}{} {}'.format(
+                    FLUSH, i + 1, subject, course['code'], course['title']))
+                form_body = {
+                    '__EVENTTARGET': course_event_target(i),
+                }
+                form_body.update(self.form_body)
+                with closing(self.sess.post(self.course_url, headers=self.headers, data=form_body)) as res:
+                    course_detail = self.parse_course_detail(
+                        res.text, subject + course['code'], cache, self.course_journal(subject, course['code']))
+                    # A new dict, so course_rows doesn't keep every parsed course alive
+                    course = {**course, **course_detail}
+                writer.write(course)
+                if self.journal:
+                    self.journal.record_course(subject, course)
+            self.save_subject_courses(subject, writer, save)
+        except BaseException:
+            # Nothing half written is left in partial/, an interrupted subject resumes from its journal
+            writer.discard()
+            raise
         return True
 
+    # Unsaved subjects (save=False) are only kept in memory, in self.courses
+    def subject_writer(self, subject, save=True) -> SubjectWriter:
+        return SubjectWriter(os.path.join(self.course_dirname, f'{subject}.json'),
+                             self.partial_dirname if save else None, self.keep_courses)
+
+    def save_subject_courses(self, subject, writer: SubjectWriter, save):
+        # Check for old entries and merge
+        num_courses = writer.finalize(
+            self.__load_subject(subject) if save else (), save)
+        if save:
+            print(f'{FLUSH}Saved {num_courses} {subject} courses in {os.path.join(self.course_dirname, subject)}.json')
+        if writer.courses is not None:
+            self.courses[subject] = writer.courses
+        if self.journal:
+            self.journal.clear(subject)
+
+    # What is known about each course of the subject before fetching it (see build_course_detail):
+    # progress journaled by an interrupted run, in incremental mode, terms before current_term from merge_dir,
+    # and in refresh mode, the whole course from merge_dir
+    def course_caches(self, subject) -> dict:
+        caches = {}
+        if self.refresh:
+            # Only the sections of current_term are fetched, the outcome fields are kept too
+            for course in self.__load_subject(subject):
+                caches[course['code']] = {
+                    'refresh_term': self.current_term, 'old_course': course, 'outcome': {}}
+        elif self.incremental:
+            for course in self.__load_subject(subject):
+                caches[course['code']] = {
+                    'reuse_before': self.current_term, 'old_terms': course.get('terms', {})}
+        if self.journal:
+            for code, checkpoint in self.journal.load(subject).items():
+                caches.setdefault(code, {}).update(
+                    (key, value) for key, value in checkpoint.items() if value is not None)
+        return caches
+
+    def course_journal(self, subject, code):
+        return self.journal.course_journal(subject, code) if self.journal else None
+
     def __load_subject(self, subject) -> List[Any]:
         try:
-            subject_path = os.path.join(
-                self.old_courses_dir, f"{subject}.json")
-            with open(subject_path, 'r') as f:
+            with open(self.merge_path(f'courses/{subject}.json'), 'r') as f:
                 return json.load(f)
         except Exception:
             self.log_file.write(traceback.format_exc())
             return []
 
-    def parse_course_detail(self, html, course_id) -> dict:
-        # Get general information about the course
-        soup = BeautifulSoup(html, 'html.parser')
-        try:
-            course_detail = {
-                'career': soup.select_one('#uc_course_lbl_acad_career').text,
-                'units': soup.select_one('#uc_course_lbl_units').text,
-                'grading': soup.select_one('#uc_course_lbl_grading_basis').text,
-                'components': soup.select_one('#uc_course_lbl_component').text,
-                'campus': soup.select_one('#uc_course_lbl_campus').text,
-                'academic_group': soup.select_one('#uc_course_lbl_acad_group').text,
-                'requirements': soup.select_one('#uc_course_tc_enrl_requirement'),
-                'description': soup.select_one('#uc_course_lbl_crse_descrlong').text,
-                'outcome': '',
-                'syllabus': '',
-                'required_readings': '',
-                'recommended_readings': '',
-            }
-            course_detail['requirements'] = soup.select_one(
-                '#uc_course_tc_enrl_requirement').get_text(';') if course_detail['requirements'] else ''
-        except AttributeError as e:
-            print('Error parsing information for this course')
-            self.log_file.write(
-                f'Error parsing course info for {course_id}: {str(e)}\n')
-            self.log_file.write(traceback.format_exc())
-            return {}
-
-        # Get sections of the course
-        try:
-            term_selection_options = soup.select_one(
-                '#uc_course_ddl_class_term').findChildren('option', recursive=False)
-            terms = {}
-            offered = False
-            for term_node in term_selection_options:
-                if term_node.has_attr('selected'):
-                    course_sections = self.parse_sections(course_id, soup)
-                else:
-                    # post form request to get schedule for non-default term
-                    form = {
-                        'uc_course$btn_class_section': 'Show sections',
-                        'uc_course$ddl_class_term': term_node['value'],
-                    }
-                    form.update(self.update_form(soup, update=False))
-                    with closing(self.sess.post(self.course_url, headers=self.headers, data=form)) as res:
-                        soup_alt = BeautifulSoup(res.text, 'html.parser')
-                        course_sections = self.parse_sections(
-                            course_id, soup_alt)
-                    pass
-                if course_sections:
-                    offered = True
-                    terms[term_node.text] = course_sections
-            if offered:
-                course_detail['terms'] = terms
-            # Get course outcome for the course
-            form = {
-                'btn_course_outcome': 'Course Outcome',
-                'uc_course$ddl_class_term': term_selection_options[0]['value'],
-                'hf_previous_page': 'SEARCH'
-            }
-            form.update(self.update_form(soup, update=False, additional_keys=[
-                        'hf_course_offer_nbr', 'hf_course_id']))
-
-            with closing(self.sess.post(self.course_url, headers=self.headers, data=form)) as res:
-                soup = BeautifulSoup(res.text, 'html.parser')
-                course_detail.update({
-                    'outcome': soup.select_one('#uc_course_outcome_lbl_learning_outcome').text,
-                    'syllabus': soup.select_one('#uc_course_outcome_lbl_course_syllabus').text,
-                    'required_readings': soup.select_one('#uc_course_outcome_lbl_req_reading').text,
-                    'recommended_readings': soup.select_one('#uc_course_outcome_lbl_rec_reading').text,
-                })
-                assessment_nodes = soup.select_one('#uc_course_outcome_gv_ast').findChildren(
-                    'tr', recursive=False)  # if no node, will raise error and return
-                assessment_nodes.pop(0)
-                assessments = {}
-                for tr in assessment_nodes:
-                    td_nodes = tr.select('td')
-                    assessments[td_nodes[1].text] = td_nodes[2].text
-                course_detail['assessments'] = assessments
-        except AttributeError as e:
-            # Probably just missing some non-mandatory fields
-            # print('Error parsing terms for this course')
-            self.log_file.write(
-                f'Error parsing course terms for {course_id}: {str(e)}\n')
-            self.log_file.write(traceback.format_exc())
-            pass
-        except Exception as e:
-            print('Error parsing section / outcome for this course')
-            self.log_file.write(
-                f'Error parsing course details for {course_id}: {str(e)}\n')
-            self.log_file.write(traceback.format_exc())
-            pass
-        return course_detail
-
-    def parse_sections(self, course_id: str, soup: BeautifulSoup) -> dict:
-        course_sections = {}
-        course_sections_table_container = soup.select_one(
-            '#uc_course_gv_sched')
-        if not course_sections_table_container:
-            return None
-        course_sections_table = course_sections_table_container.findChildren(
-            'tr', recursive=False)
-        course_sections_table.pop(0)  # remove the header node
-        for schedule in course_sections_table:
-            try:
-                # schedule is a <tr> tag with 3 children, first is the section code, second is the reg status, last is course detail table
-                children = schedule.findChildren('td', recursive=False)
-                section = children[0].text.strip('\n')
-                start_times, end_times, days, locations, instructors, meeting_dates = [], [], [], [], [], ''
-                # each tr is a teaching timeslot, e.g. Wed and Thu Lectures are two teaching timelot
-                timeslots = children[2].findChildren('tr')
-                for node in timeslots:
-                    # 0: days & time 1: Room 2: Instructor 3: part of teaching date
-                    details = list(filter(lambda x: x != '\n',
-                                   node.get_text(';').split(';')))
-                    days_and_times = parse_days_and_times(details[0])
-                    meeting_dates += f', {details[3]}'
-                    # i.e. duplicated (meeting dates may not dup, so add before continue)
-                    if days_and_times[0] in days and days_and_times[1] in start_times:
-                        continue
-                    days.append(days_and_times[0])
-                    start_times.append(days_and_times[1])
-                    end_times.append(days_and_times[2])
-                    locations.append(details[1])
-                    instructors.append(details[2])
-                # split, dedup & sort dates
-                processed_meeting_dates = sorted(set(list(filter(None, meeting_dates.split(', ')))), key=get_date_sort_key)
-                course_sections[section] = {
-                    'startTimes': start_times,
-                    'endTimes': end_times,
-                    'days': days,
-                    'locations': locations,
-                    'instructors': instructors,
-                    'meetingDates': processed_meeting_dates,
-                }
-            except Exception as e:
-                # Probably just missing some non-mandatory fields
-                self.log_file.write(
-                    f'Error parsing course section for {course_id}: {str(e)}\n')
-                self.log_file.write(traceback.format_exc())
-                pass
+    # Path of a file of merge_dir, e.g. courses/CSCI.json
+    def merge_path(self, relpath) -> str:
+        if self.merge_snapshot:
+            return self.merge_snapshot.path(relpath)
+        return os.path.join(self.merge_dir, relpath)
+
+    # form to request the schedule of another term from a course detail page
+    def term_form(self, form_state: dict, term_value) -> dict:
+        form = {
+            'uc_course$btn_class_section': 'Show sections',
+            'uc_course$ddl_class_term': term_value,
+        }
+        form.update(self.update_form(form_state, update=False))
+        return form
+
+    # form to request the Course Outcome page from a course detail page
+    def outcome_form(self, form_state: dict, term_value) -> dict:
+        form = {
+            'btn_course_outcome': 'Course Outcome',
+            'uc_course$ddl_class_term': term_value,
+            'hf_previous_page': 'SEARCH'
+        }
+        form.update(self.update_form(form_state, update=False, additional_keys=[
+                    'hf_course_offer_nbr', 'hf_course_id']))
+        return form
+
+    def parse_course_detail(self, html, course_id, cache: dict = None, journal=None) -> dict:
+        with self.metrics.parse_stage('course_detail') as timer:
+            soup = make_soup(html, self.parser)
+            # Extracted once, every follow-up form of this page is derived from it
+            form_state = extract_form_state(html)
+
+            def fetch(form):
+                # Requests of the term & outcome pages don't count as parse time
+                with timer.paused(), closing(self.sess.post(self.course_url, headers=self.headers, data=form)) as res:
+                    text = res.text
+                return make_soup(text, self.parser)
+
+            return build_course_detail(
+                course_id, soup,
+                lambda term_value: fetch(self.term_form(form_state, term_value)),
+                lambda term_value: fetch(self.outcome_form(form_state, term_value)),
+                self.log_file.write, cache, journal)
+
+    def parse_sections(self, course_id: str, soup: 'BeautifulSoup') -> dict:
+        return parse_sections(course_id, soup, self.log_file.write)
 
-        return course_sections
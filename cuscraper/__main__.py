@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import sys
+import cuscraper
+from . import CourseScraper
+
+# Command line entry point, e.g.
+#   python -m cuscraper scrape --term "2022-23 Term 1" --workers 4 --stat
+#   python -m cuscraper subject AIST CSCI
+#   python -m cuscraper stat --timestamp 1660000000
+#   python -m cuscraper info --timestamp 1660000000
+#   python -m cuscraper diff --timestamp 1660000000 -o changes.json
+#   python -m cuscraper apply mirror changes.json
+#   python -m cuscraper store store materialize data/1660000000 --name 1660000000
+#   python -m cuscraper queue queue.sqlite init && python -m cuscraper worker queue.sqlite --timestamp 1660000000
+# stat & info work on an existing data dir and never load the captcha model.
+
+ENGINES = {
+    'sync': 'CourseScraper',
+    'async': 'AsyncCourseScraper',
+    'pipeline': 'PipelineCourseScraper',
+}
+
+
+def make_scraper(args, **kwargs) -> CourseScraper:
+    return getattr(cuscraper, ENGINES[getattr(args, 'engine', 'sync')])(
+        current_term=args.term, merge_dir=args.merge_dir, dirname=args.dirname,
+        timestamp=args.timestamp or False, parser=args.parser, store_dir=args.store_dir, **kwargs)
+
+
+def scraper_kwargs(args) -> dict:
+    kwargs = {
+        'save_captchas': args.save_captchas,
+        'max_rps': args.max_rps,
+        'record_dir': args.record_dir,
+        'replay_dir': args.replay_dir,
+        'checkpoint': args.checkpoint,
+        'incremental': args.incremental,
+        'refresh': args.refresh,
+        'metrics': args.metrics or args.profile or args.trace_memory,
+        'profile': args.profile,
+        'trace_memory': args.trace_memory,
+        'merge_snapshot': args.merge_snapshot,
+        'store_only': args.store_only,
+    }
+    if args.base_url:
+        kwargs['base_url'] = args.base_url
+    if args.engine == 'async':
+        kwargs['concurrency'] = args.concurrency
+    elif args.engine == 'pipeline':
+        kwargs['parse_workers'] = args.parse_workers
+    return kwargs
+
+
+def scrape(args):
+    cs = make_scraper(args, **scraper_kwargs(args))
+    try:
+        cs.parse_all(save=not args.no_save, manual=args.manual, skip_parsed=args.skip_parsed,
+                     verbose=not args.quiet, workers=args.workers)
+        cs.post_processing(stat=args.stat)
+    finally:
+        cs.close()
+    return 0
+
+
+def subject(args):
+    cs = make_scraper(args, **scraper_kwargs(args))
+    try:
+        for code in args.subjects:
+            cs.search_subject(code.upper(), save=not args.no_save, manual=args.manual)
+        cs.post_processing(stat=args.stat)
+    finally:
+        cs.close()
+    return 0
+
+
+def stat(args):
+    cs = make_scraper(args)
+    cs.generate_stat(workers=args.workers, publish=not args.no_publish)
+    cs.post_processing()
+    return 0
+
+
+def info(args):
+    cs = make_scraper(args)
+    cs.info()
+    cs.post_processing()
+    return 0
+
+
+def diff(args):
+    from .diff import diff_snapshots
+    if not args.new and not args.timestamp:
+        print('Either --timestamp or --new is required')
+        return 2
+    old = args.old or args.merge_dir
+    new = args.new or os.path.join(args.dirname, args.timestamp)
+    delta = diff_snapshots(old, new, args.cache_dir)
+    for kind, n in delta['summary'].items():
+        print(f'{kind:<20} {n}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(delta, f)
+        print(f'Saved changes in {args.output}')
+    return 0
+
+
+def apply(args):
+    from .diff import apply_delta
+    with open(args.changes, 'r') as f:
+        delta = json.load(f)
+    try:
+        n = apply_delta(args.target, delta)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f'Updated {n} subjects in {args.target}')
+    return 0
+
+
+def store(args):
+    from .store import SnapshotStore
+    snapshot_store = SnapshotStore(args.store)
+    if args.action == 'list':
+        for name in snapshot_store.snapshots():
+            print(name)
+    elif args.action == 'put':
+        if not args.path:
+            print('put needs the data/<timestamp> dir to store')
+            return 2
+        stats = snapshot_store.put_snapshot(args.path, args.name)
+        print(f"Stored {stats['name']}: {stats['subjects']} subjects, {stats['new_objects']}/{stats['objects']} new objects")
+    else:
+        snapshot = snapshot_store.snapshot(args.name or 'latest')
+        print(f'Materialised {snapshot.name} in {snapshot.materialize(args.path)}')
+    return 0
+
+
+def lease_queue(args):
+    from .coordinator import open_queue
+    queue = open_queue(args.queue, args.max_attempts)
+    if args.action == 'init':
+        subjects = [code.upper() for code in args.subjects]
+        if not subjects:
+            cs = make_scraper(args)
+            cs.get_code_list()
+            subjects = cs.code_list
+        print(f'Queued {queue.add(subjects)} of {len(subjects)} subjects')
+    elif args.action == 'status':
+        for state, n in queue.status().items():
+            print(f'{state:<8} {n}')
+        for subject, error in queue.failed().items():
+            print(f'{subject} failed: {error}')
+    elif args.action == 'reset':
+        print(f'Queued {queue.reset_failed()} failed subjects again')
+    else:
+        if not args.timestamp:
+            print('merge needs the --timestamp of the snapshot to assemble')
+            return 2
+        cs = make_scraper(args)
+        cs.merge_queue(queue)
+        cs.post_processing(stat=args.stat)
+    return 0
+
+
+def worker(args):
+    from .coordinator import open_queue
+    cs = make_scraper(args, **scraper_kwargs(args))
+    try:
+        cs.parse_queue(open_queue(args.queue, args.max_attempts), args.worker_id,
+                       save=not args.no_save, lease_seconds=args.lease_seconds)
+        cs.post_processing(stat=args.stat)
+    finally:
+        cs.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cuscraper', description='Scrape the CUHK course catalog')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--term', default='2022-23 Term 1',
+                        help='current term, e.g. "2022-23 Term 1"')
+    common.add_argument('--dirname', default='data',
+                        help='output root, results go to <dirname>/<timestamp>')
+    common.add_argument('--merge-dir', default='../data',
+                        help='previous output merged into the new one')
+    common.add_argument('--parser', default=None,
+                        help='BeautifulSoup backend, defaults to lxml if installed')
+    common.add_argument('--store-dir', default=None,
+                        help='also keep runs in this deduplicated snapshot store')
+
+    scraping = argparse.ArgumentParser(add_help=False)
+    scraping.add_argument('--timestamp', default=None,
+                          help='output dir name, reuse one to resume a run (defaults to now)')
+    scraping.add_argument('--engine', choices=ENGINES, default='sync')
+    scraping.add_argument('--concurrency', type=int, default=8,
+                          help='concurrent requests per subject with --engine async')
+    scraping.add_argument('--parse-workers', type=int, default=None,
+                          help='parser processes with --engine pipeline')
+    scraping.add_argument('--max-rps', type=float, default=None,
+                          help='cap on the overall request rate')
+    scraping.add_argument('--base-url', default=None,
+                          help='e.g. a local replay server')
+    scraping.add_argument('--record-dir', default=None)
+    scraping.add_argument('--replay-dir', default=None)
+    scraping.add_argument('--checkpoint', action='store_true',
+                          help='journal progress per course, to resume an interrupted run')
+    scraping.add_argument('--incremental', action='store_true',
+                          help='only fetch terms from --term on, reuse older terms from --merge-dir')
+    scraping.add_argument('--refresh', action='store_true',
+                          help='only fetch the sections of --term, patched into the courses of --merge-dir')
+    scraping.add_argument('--manual', action='store_true',
+                          help='input captchas by hand')
+    scraping.add_argument('--save-captchas', action='store_true')
+    scraping.add_argument('--no-save', action='store_true')
+    scraping.add_argument('--merge-snapshot', default=None,
+                          help='merge from this snapshot of --store-dir (e.g. latest) instead of --merge-dir')
+    scraping.add_argument('--store-only', action='store_true',
+                          help='remove <dirname>/<timestamp> once stored in --store-dir')
+    scraping.add_argument('--metrics', action='store_true',
+                          help='save a run report & a Prometheus textfile in logs/')
+    scraping.add_argument('--profile', action='store_true',
+                          help='cProfile the parse stages into logs/profile-<timestamp>.pstats')
+    scraping.add_argument('--trace-memory', action='store_true',
+                          help='report the peak memory of each parse stage')
+    scraping.add_argument('--stat', action='store_true',
+                          help='generate the derived outputs afterwards')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    p = subparsers.add_parser('scrape', parents=[common, scraping],
+                              help='parse all subjects')
+    p.add_argument('--workers', type=int, default=1,
+                   help='subjects parsed in parallel')
+    p.add_argument('--skip-parsed', action='store_true',
+                   help='skip subjects already saved under --timestamp')
+    p.add_argument('--quiet', action='store_true')
+    p.set_defaults(fn=scrape)
+
+    p = subparsers.add_parser('subject', parents=[common, scraping],
+                              help='parse the given subjects')
+    p.add_argument('subjects', nargs='+', help='subject codes, e.g. AIST')
+    p.set_defaults(fn=subject)
+
+    p = subparsers.add_parser('stat', parents=[common],
+                              help='generate the derived outputs of a scraped dir')
+    p.add_argument('--timestamp', required=True)
+    p.add_argument('--workers', type=int, default=1,
+                   help='subject files loaded in parallel')
+    p.add_argument('--no-publish', action='store_true',
+                   help='skip the minified & precompressed bundle in publish/')
+    p.set_defaults(fn=stat)
+
+    p = subparsers.add_parser('info', parents=[common],
+                              help='number of courses in a scraped dir')
+    p.add_argument('--timestamp', required=True)
+    p.set_defaults(fn=info)
+
+    p = subparsers.add_parser('diff', parents=[common],
+                              help='changes between two snapshots, by default --timestamp against --merge-dir')
+    p.add_argument('--old', help='snapshot or course dir, defaults to --merge-dir')
+    p.add_argument('--new', help='snapshot or course dir, defaults to <dirname>/<timestamp>')
+    p.add_argument('--timestamp')
+    p.add_argument('-o', '--output', help='save the change set as json')
+    p.add_argument('--cache-dir', help='cache the digests of subject files here, so unchanged snapshots are not read again')
+    p.set_defaults(fn=diff)
+
+    p = subparsers.add_parser('apply',
+                              help='update a copy of the old snapshot with a saved change set')
+    p.add_argument('target', help='snapshot or course dir')
+    p.add_argument('changes', help='change set saved by diff -o')
+    p.set_defaults(fn=apply)
+
+    p = subparsers.add_parser('store', help='list, add or materialise snapshots of a snapshot store')
+    p.add_argument('store', help='store dir')
+    p.add_argument('action', choices=['list', 'put', 'materialize'])
+    p.add_argument('path', nargs='?',
+                   help='put: data/<timestamp> dir to store, materialize: where to (defaults to the store)')
+    p.add_argument('--name', help='snapshot name, defaults to the dir name for put & latest for materialize')
+    p.set_defaults(fn=store)
+
+    leasing = argparse.ArgumentParser(add_help=False)
+    leasing.add_argument('queue', help='lease queue, a .sqlite file or a dir on a shared filesystem')
+    leasing.add_argument('--max-attempts', type=int, default=3,
+                         help='claims of a subject before it is marked failed')
+
+    p = subparsers.add_parser('queue', parents=[leasing, common],
+                              help='fill, inspect or merge a queue of subjects leased to workers')
+    p.add_argument('action', choices=['init', 'status', 'reset', 'merge'])
+    p.add_argument('subjects', nargs='*', help='init: subject codes, defaults to every subject of the catalog')
+    p.add_argument('--timestamp', help='merge: snapshot to assemble the workers\' subjects into')
+    p.add_argument('--stat', action='store_true',
+                   help='merge: also generate the derived outputs')
+    p.set_defaults(fn=lease_queue)
+
+    p = subparsers.add_parser('worker', parents=[leasing, common, scraping],
+                              help='parse the subjects of a lease queue until it is empty')
+    p.add_argument('--worker-id', default=None,
+                   help='defaults to <host>-<pid>-<thread>')
+    p.add_argument('--lease-seconds', type=float, default=300,
+                   help='lease of a subject, renewed every third of it while parsing')
+    p.set_defaults(fn=worker)
+
+    args = parser.parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import heapq
+import json
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from .utils import subject_paths
+
+# Derived outputs are built by feeding every subject once to a set of builders, instead of
+# re-reading the course directory for each output file.
+#   builder.add(subject, courses) for each subject, then builder.result(), or builder.discard() (if it
+#   has one) when the pass fails
+
+
+# (subject, courses) of every {subject}.json in scandir order, loading up to `workers` files ahead
+def load_subjects(course_dirname, workers=1):
+    paths = subject_paths(course_dirname).items()
+
+    def load(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    if workers <= 1:
+        for subject, path in paths:
+            yield subject, load(path)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for subject, path in paths:
+            pending.append((subject, executor.submit(load, path)))
+            if len(pending) > workers:
+                subject, future = pending.popleft()
+                yield subject, future.result()
+        while pending:
+            subject, future = pending.popleft()
+            yield subject, future.result()
+
+
+def aggregate(subjects, builders):
+    try:
+        for subject, courses in subjects:
+            for builder in builders:
+                builder.add(subject, courses)
+        return [builder.result() for builder in builders]
+    except BaseException:
+        # Builders writing a file as they go (e.g. CatalogBuilder) clean it up
+        for builder in builders:
+            if hasattr(builder, 'discard'):
+                builder.discard()
+        raise
+
+
+# course_list.json: all courses under each subject, with id and title only
+class CourseListBuilder:
+    def __init__(self, current_term, label_availability=False, concise=False):
+        self.current_term = current_term
+        self.label_availability = label_availability
+        self.concise = concise
+        self.all_courses = {}
+
+    def add(self, subject, courses):
+        concise = self.concise
+        course_list = []
+        for course in courses:
+            course_concise = {
+                'courseId' if not concise else 'c': subject + course['code'],
+                'title' if not concise else 't': course['title']
+            }
+            if self.label_availability and self.current_term in course.get('terms', {}):
+                course_concise['offerring' if not concise else 'o'] = 1
+            course_list.append(course_concise)
+        self.all_courses[subject] = course_list
+
+    def result(self):
+        return self.all_courses
+
+
+TITLE_PREFIXS = ['Ms', 'Dr', 'Mr', 'Miss', 'Professor', 'Prof']
+REMOVE_TITLE_REGEX = re.compile(r'\b(?:' + '|'.join(TITLE_PREFIXS) + r')\.\s*')
+CLEANING_REGEX = re.compile(r'|'.join(map(re.escape, [
+    '.', '\n\r', '\n\n', '***'] + list(map(lambda x: f"{x} ", TITLE_PREFIXS)))))
+
+
+# Names in an instructor string of a section, without titles. The same few thousand strings repeat
+# in every term of every section, so each is only cleaned once
+@lru_cache(maxsize=None)
+def normalize_instructor(instructor: str) -> tuple:
+    instructor = REMOVE_TITLE_REGEX.sub('', instructor)
+    instructor = CLEANING_REGEX.sub('', instructor).strip()
+    # Split for multiple instructors in one section
+    return tuple(instructor.split(', '))
+
+
+# Sorted union of the previous instructors.json (sorted already, unless edited by hand) and the new names
+def merge_sorted(previous: list, names: set) -> list:
+    if any(a >= b for a, b in zip(previous, previous[1:])):
+        return sorted(names.union(previous))
+    previous_set = set(previous)
+    return list(heapq.merge(previous, sorted(name for name in names if name not in previous_set)))
+
+
+# instructors.json: all lecturer names, accumulated with the ones from previous runs, and
+# instructor_index.json: [course id, term, section] taught by each instructor of this run
+class InstructorsBuilder:
+    def __init__(self, instructors=()):
+        self.previous = list(instructors)
+        self.index = {}
+
+    def add(self, subject, courses):
+        index = self.index
+        for course in courses:
+            if 'terms' in course:
+                course_id = subject + course['code']
+                for term, sections in course['terms'].items():
+                    for name, section in sections.items():
+                        for instructor in section['instructors']:
+                            for part in normalize_instructor(instructor):
+                                sections_taught = index.setdefault(part, [])
+                                # An instructor is usually listed for each timeslot of the section
+                                if not sections_taught or sections_taught[-1] != [course_id, term, name]:
+                                    sections_taught.append([course_id, term, name])
+
+    def result(self):
+        return merge_sorted(self.previous, set(self.index)), {name: self.index[name] for name in sorted(self.index)}
+
+
+# subjects.json & departments.json: department of each subject, and subjects under each department
+class DepartmentsBuilder:
+    def __init__(self):
+        self.subject_department_mapping = {}
+
+    def add(self, subject, courses):
+        for course in courses:
+            if 'academic_group' in course:
+                self.subject_department_mapping[subject] = course['academic_group']
+                break
+
+    def result(self):
+        subjects_under_department = {}
+        for k, v in self.subject_department_mapping.items():
+            if v in subjects_under_department:
+                subjects_under_department[v].append(k)
+            else:
+                subjects_under_department[v] = [k]
+        return self.subject_department_mapping, subjects_under_department
+
+
+# subject_course_names.json & courses.json: course codes under each subject, and all full course codes
+class CourseNamesBuilder:
+    def __init__(self):
+        self.subject_courses_list = {}
+        self.full_name_courses = []
+
+    def add(self, subject, courses):
+        courses_list = []
+        for course in courses:
+            code = course["code"]
+            courses_list.append(code)
+            self.full_name_courses.append(f"{subject}{code}")
+        self.subject_courses_list[subject] = courses_list
+
+    def result(self):
+        return self.subject_courses_list, self.full_name_courses
@@ -0,0 +1,117 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from . import CourseScraper, FLUSH
+from .parsing import build_course_detail, cached_term_sections, course_event_target, extract_form_state, make_soup, parse_course_info, parse_course_rows, parse_term_options
+
+
+# Same output as CourseScraper, but the course detail, term & outcome requests of a subject
+# are posted concurrently. Each request carries its own copy of the form (viewstate) it was
+# derived from, so they don't depend on each other's responses.
+class AsyncCourseScraper(CourseScraper):
+    def __init__(self, *args, concurrency=8, **kwargs):
+        self.concurrency = concurrency
+        # Keep a pooled connection per concurrent request
+        kwargs.setdefault('pool_maxsize', max(10, concurrency))
+        super().__init__(*args, **kwargs)
+
+    def parse_subject_courses(self, subject, html, save):
+        coro = self.parse_subject_courses_async(subject, html, save)
+        try:
+            asyncio.get_running_loop()
+            loop_running = True
+        except RuntimeError:
+            loop_running = False
+        if not loop_running:
+            return asyncio.run(coro)
+        # e.g. in notebooks, where a loop is already running in this thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+
+    async def parse_subject_courses_async(self, subject, html, save):
+        with self.metrics.parse_stage('course_rows'):
+            self.update_form(html)
+            course_rows = parse_course_rows(make_soup(html, self.parser))
+        if course_rows is None:
+            return False
+        print(f'Found {len(course_rows)} courses under subject {subject}')
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.num_fetched = 0
+        form_body = dict(self.form_body)
+        caches = self.course_caches(subject)
+        writer = self.subject_writer(subject, save)
+        try:
+            await asyncio.gather(*[
+                self.fetch_course(subject, i, course, form_body, len(course_rows), caches.get(course['code'], {}), writer) for i, course in enumerate(course_rows)])
+            self.save_subject_courses(subject, writer, save)
+        except BaseException:
+            writer.discard()
+            raise
+        return True
+
+    async def post(self, form) -> str:
+        def _post():
+            with closing(self.sess.post(self.course_url, headers=self.headers, data=form)) as res:
+                return res.text
+        async with self.semaphore:
+            return await asyncio.to_thread(_post)
+
+    # Written to writer as soon as it's parsed (at its position on the search page) instead of returned
+    async def fetch_course(self, subject, i, course, form_body, num_courses, cache=None, writer=None):
+        if cache and cache.get('course'):
+            if writer is not None:
+                writer.write(cache['course'], i)
+                return None
+            return cache['course']
+        form = {
+            '__EVENTTARGET': course_event_target(i),
+        }
+        form.update(form_body)
+        html = await self.post(form)
+        with self.metrics.parse_stage('course_detail'):
+            soup = make_soup(html, self.parser)
+            form_state = extract_form_state(html)
+        pages = await self.prefetch_course_pages(soup, form_state, cache)
+
+        def fetch(key):
+            page = pages[key]
+            if isinstance(page, BaseException):
+                raise page
+            return make_soup(page, self.parser)
+
+        with self.metrics.parse_stage('course_detail'):
+            course = {**course, **build_course_detail(
+                subject + course['code'], soup,
+                lambda term_value: fetch(('term', term_value)),
+                lambda term_value: fetch(('outcome', term_value)),
+                self.log_file.write, cache, self.course_journal(subject, course['code']))}
+        if writer is not None:
+            writer.write(course, i)
+        if self.journal:
+            self.journal.record_course(subject, course)
+        self.num_fetched += 1
+        sys.stdout.write('{}Fetched #{}/{} {}{} {}'.format(
+            FLUSH, self.num_fetched, num_courses, subject, course['code'], course['title']))
+        return course if writer is None else None
+
+    # Request every page build_course_detail may ask for at once, failures are kept & raised on access
+    async def prefetch_course_pages(self, soup, form_state, cache=None) -> dict:
+        try:
+            parse_course_info(soup)
+            term_selection_options = parse_term_options(soup)
+        except AttributeError:
+            # Parsing stops before any follow-up request is needed
+            return {}
+        forms = {}
+        for term_node in term_selection_options:
+            if not term_node.has_attr('selected') and not cached_term_sections(cache, term_node.text)[0]:
+                forms[('term', term_node['value'])] = lambda value=term_node['value']: self.term_form(form_state, value)
+        if term_selection_options and not (cache and cache.get('outcome') is not None):
+            first_value = term_selection_options[0]['value']
+            forms[('outcome', first_value)] = lambda: self.outcome_form(form_state, first_value)
+
+        async def request(make_form):
+            return await self.post(make_form())
+        pages = await asyncio.gather(*[request(make_form) for make_form in forms.values()], return_exceptions=True)
+        return dict(zip(forms.keys(), pages))
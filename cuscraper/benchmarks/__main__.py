@@ -0,0 +1,207 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from .. import CourseScraper
+from ..model import load_courses
+from ..parsing import make_soup
+from ..utils import HiddenPrints, parse_days_and_times, get_date_sort_key
+from .fixtures import CATALOG_SUBJECTS, COURSES_PER_SUBJECT, TERMS, CatalogFixture, FixtureSession, generate_course_dir
+
+# Throughput benchmarks of the parsing & post-processing hot paths on synthetic data, e.g.
+#   python -m cuscraper.benchmarks --save-baseline bench_baseline.json
+#   python -m cuscraper.benchmarks --baseline bench_baseline.json --subjects 1 250 2500
+
+
+class BenchmarkRunner:
+    def __init__(self, repeat=3, memory=True):
+        self.repeat = repeat
+        self.memory = memory
+        self.results = {}
+
+    # fn returns the number of units it processed, e.g. pages or courses. Best of `repeat` runs is kept
+    def measure(self, name, fn, unit):
+        seconds = float('inf')
+        with HiddenPrints():
+            for _ in range(self.repeat):
+                gc.collect()
+                start = time.perf_counter()
+                units = fn()
+                seconds = min(seconds, time.perf_counter() - start)
+        result = {
+            'seconds': seconds,
+            'rate': units / seconds if seconds else 0,
+            'unit': f'{unit}/s',
+        }
+        if self.memory:
+            gc.collect()
+            tracemalloc.start()
+            with HiddenPrints():
+                fn()
+            result['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        self.results[name] = result
+        peak = f'{result["peak_kb"]:>10.0f} KB peak' if self.memory else ''
+        print(f'{name:<48} {result["seconds"] * 1000:>10.2f} ms {result["rate"]:>12.1f} {result["unit"]:<12}{peak}')
+
+    def bench_parsing(self, scraper: CourseScraper, num_courses):
+        fixture = CatalogFixture(1, num_courses)
+        subject = next(iter(fixture.subjects))
+        scraper.sess = FixtureSession(fixture)
+        detail_pages = [fixture.detail_page(subject, i)
+                        for i in range(num_courses)]
+        term_pages = [fixture.detail_page(subject, i, term)
+                      for i in range(num_courses) for term in TERMS]
+
+        def update_form():
+            for html in detail_pages:
+                scraper.update_form(html, update=False, additional_keys=[
+                                    'hf_course_offer_nbr', 'hf_course_id'])
+            return len(detail_pages)
+        self.measure('update_form', update_form, 'pages')
+
+        def soup():
+            for html in detail_pages:
+                make_soup(html, scraper.parser)
+            return len(detail_pages)
+        self.measure(f'make_soup ({scraper.parser or "default"})', soup, 'pages')
+
+        soups = [make_soup(html, scraper.parser) for html in term_pages]
+
+        def parse_sections():
+            for s in soups:
+                scraper.parse_sections(subject, s)
+            return len(soups)
+        self.measure('parse_sections', parse_sections, 'pages')
+
+        def parse_course_detail():
+            start = scraper.sess.num_requests
+            for i, html in enumerate(detail_pages):
+                scraper.parse_course_detail(html, subject + str(i))
+            return len(detail_pages) + scraper.sess.num_requests - start
+        self.measure('parse_course_detail', parse_course_detail, 'pages')
+
+        result_page = fixture.result_page(subject)
+
+        def parse_subject_courses():
+            start = scraper.sess.num_requests
+            scraper.parse_subject_courses(subject, result_page, False)
+            return 1 + scraper.sess.num_requests - start
+        self.measure('parse_subject_courses', parse_subject_courses, 'pages')
+        self.results['parse_subject_courses (courses)'] = dict(
+            self.results['parse_subject_courses'], rate=num_courses / self.results['parse_subject_courses']['seconds'], unit='courses/s')
+
+        times = [f'{d} {h}:{m:02d}{p} - {h + 1}:{m:02d}{p}' for d in ['Mo', 'Tu', 'We', 'Th', 'Fr']
+                 for h in range(1, 12) for m in (0, 15, 30, 45) for p in ('AM', 'PM')] * 20
+
+        def days_and_times():
+            for s in times:
+                parse_days_and_times(s)
+            return len(times)
+        self.measure('parse_days_and_times', days_and_times, 'strings')
+
+        dates = [f'{d:02d}/{m:02d}' for m in range(1, 13)
+                 for d in range(1, 29)] * 30
+
+        def date_sort():
+            sorted(dates, key=get_date_sort_key)
+            return len(dates)
+        self.measure('get_date_sort_key', date_sort, 'dates')
+
+    def bench_stat(self, scraper: CourseScraper, num_subjects, courses_per_subject):
+        num_courses = generate_course_dir(
+            scraper.course_dirname, num_subjects, courses_per_subject)
+        suffix = f' [{num_subjects} subjects]'
+        steps = [
+            ('remove_empty_courses', scraper.remove_empty_courses),
+            ('process_subjects', lambda: scraper.process_subjects(
+                label_availability=True, concise=True)),
+            ('process_instructors_name', scraper.process_instructors_name),
+            ('process_faculty_subjects', scraper.process_faculty_subjects),
+            ('group_faculty_subjects', scraper.group_faculty_subjects),
+            ('get_courses_hashset', scraper.get_courses_hashset),
+            ('generate_stat', scraper.generate_stat),
+            ('load_courses (model)', lambda: [load_courses(os.path.join(scraper.course_dirname, name))
+                                              for name in os.listdir(scraper.course_dirname)]),
+        ]
+        for name, fn in steps:
+            def run(fn=fn):
+                fn()
+                return num_courses
+            self.measure(name + suffix, run, 'courses')
+
+
+def compare(results, baseline, tolerance) -> list:
+    regressions = []
+    print(f'\n{"benchmark":<48} {"baseline":>14} {"current":>14} {"change":>8}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['rate'], result['rate']
+        change = (new - old) / old if old else 0
+        flag = ''
+        if change < -tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<48} {old:>14.1f} {new:>14.1f} {change * 100:>7.1f}%{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cuscraper.benchmarks', description='Benchmark the parsing and post-processing hot paths on synthetic data')
+    parser.add_argument('--subjects', type=int, nargs='+', default=[1, CATALOG_SUBJECTS],
+                        help=f'synthetic catalog sizes for the post-processing benchmarks, the real catalog is ~{CATALOG_SUBJECTS} subjects')
+    parser.add_argument('--courses', type=int, default=COURSES_PER_SUBJECT,
+                        help='courses per subject')
+    parser.add_argument('--parser', default=None,
+                        help='BeautifulSoup backend, defaults to lxml if installed')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per benchmark, the fastest one is reported')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc pass for peak memory')
+    parser.add_argument('--output', help='save results as json')
+    parser.add_argument('--baseline', help='compare against a saved baseline')
+    parser.add_argument('--save-baseline', help='save results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed throughput drop against the baseline before failing')
+    args = parser.parse_args(argv)
+
+    runner = BenchmarkRunner(args.repeat, not args.no_memory)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            scraper = CourseScraper(timestamp='bench', merge_dir=os.path.join(
+                tmp, 'nothing'), parser=args.parser)
+            runner.bench_parsing(scraper, args.courses)
+            scraper.post_processing()
+            for num_subjects in args.subjects:
+                scraper = CourseScraper(timestamp=f'bench-{num_subjects}', merge_dir=os.path.join(
+                    tmp, 'nothing'), parser=args.parser)
+                runner.bench_stat(scraper, num_subjects, args.courses)
+                scraper.post_processing()
+        finally:
+            os.chdir(cwd)
+
+    report = {'results': runner.results, 'python': sys.version.split()[0],
+              'parser': args.parser, 'courses_per_subject': args.courses}
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(runner.results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance * 100:.0f}%')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from .. import MIN_CAPTCHA_CONFIDENCE
+from ..captcha import get_ocr, recognize
+from ..metrics import percentile
+from ..utils import HiddenPrints
+from .fixtures import captcha_samples
+
+# Accuracy & speed of captcha models on labelled images, e.g. the ones saved with save_captchas=True
+#   python -m cuscraper.benchmarks.captcha captchas
+#   python -m cuscraper.benchmarks.captcha captchas --models default beta onnx:model.onnx:charsets.json
+#   python -m cuscraper.benchmarks.captcha --synthetic 500
+
+
+# (label, path) of each {label}_{timestamp}.png, images are read by the evaluating workers
+def load_samples(path, limit=None) -> list:
+    samples = []
+    with os.scandir(path) as it:
+        for entry in it:
+            name, ext = os.path.splitext(entry.name)
+            if ext == '.png' and '_' in name:
+                samples.append((name.split('_')[0], entry.path))
+    samples.sort(key=lambda sample: sample[1])
+    return samples[:limit] if limit else samples
+
+
+# default: the scraper's model, beta: ddddocr's beta model, onnx:<model.onnx>:<charsets.json>: a custom one
+def load_model(spec: str):
+    if spec == 'default':
+        return get_ocr()
+    import onnxruntime
+    import ddddocr
+    onnxruntime.set_default_logger_severity(3)
+    with HiddenPrints():
+        if spec == 'beta':
+            return ddddocr.DdddOcr(beta=True)
+        if spec.startswith('onnx:'):
+            _, model_path, charsets_path = spec.split(':', 2)
+            return ddddocr.DdddOcr(det=False, ocr=False, import_onnx_path=model_path, charsets_path=charsets_path)
+    raise ValueError(f'Unknown model {spec}')
+
+
+def read_image(image) -> bytes:
+    if isinstance(image, bytes):
+        return image
+    with open(image, 'rb') as f:
+        return f.read()
+
+
+# Run the model over the samples with `workers` threads sharing the ONNX session
+def evaluate(ocr, samples, workers=1, min_confidence=MIN_CAPTCHA_CONFIDENCE) -> dict:
+    def run(sample):
+        label, image = sample
+        image = read_image(image)
+        start = time.perf_counter()
+        text, confidence = recognize(image, ocr)
+        return label, text, confidence, time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, samples, chunksize=16))
+    else:
+        results = list(map(run, samples))
+    seconds = time.perf_counter() - start
+
+    count = len(results)
+    correct = correct_exact = kept = kept_correct = length_errors = 0
+    confusion = Counter()
+    latencies = []
+    for label, text, confidence, latency in results:
+        latencies.append(latency)
+        correct_exact += text == label
+        # The model mixes cases, labels (e.g. synthetic ones) needn't follow it
+        label, text = label.lower(), text.lower()
+        correct += text == label
+        if confidence >= min_confidence:
+            kept += 1
+            kept_correct += text == label
+        if len(text) != len(label):
+            length_errors += 1
+            continue
+        for expected, got in zip(label, text):
+            if expected != got:
+                confusion[(expected, got)] += 1
+    latencies.sort()
+    accuracy = correct / count if count else 0
+    kept_accuracy = kept_correct / kept if kept else 0
+    return {
+        'count': count,
+        'correct': correct,
+        'accuracy': accuracy,
+        'accuracy_exact': correct_exact / count if count else 0,
+        'length_errors': length_errors,
+        'images_per_s': count / seconds if seconds else 0,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.5) * 1000,
+            'p90': percentile(latencies, 0.9) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': (latencies[-1] if latencies else 0) * 1000,
+        },
+        # Guesses at or above min_confidence are posted, the rest re-fetched (see CourseScraper.get_captcha)
+        'min_confidence': min_confidence,
+        'kept': kept / count if count else 0,
+        'kept_accuracy': kept_accuracy,
+        # Round trips per searched subject: search POSTs alone, and captcha fetches with low-confidence re-fetching
+        'posts_per_subject': 1 / accuracy if accuracy else float('inf'),
+        'posts_per_subject_refetch': 1 / kept_accuracy if kept_accuracy else float('inf'),
+        'fetches_per_subject_refetch': count / kept_correct if kept_correct else float('inf'),
+        'confusion': [[expected, got, n] for (expected, got), n in confusion.most_common()],
+    }
+
+
+def report(name, result, top=10):
+    latency = result['latency_ms']
+    print(f'\n{name}: {result["count"]} images')
+    print(f'  accuracy          {result["accuracy"]:.5f} ({result["correct"]}/{result["count"]}), '
+          f'{result["accuracy_exact"]:.5f} case-sensitive, {result["length_errors"]} wrong length')
+    print(f'  speed             {result["images_per_s"]:.1f} images/s, latency p50 {latency["p50"]:.2f} ms  '
+          f'p90 {latency["p90"]:.2f} ms  p99 {latency["p99"]:.2f} ms  max {latency["max"]:.2f} ms')
+    print(f'  confidence >= {result["min_confidence"]:<4} {result["kept"] * 100:.1f}% posted, {result["kept_accuracy"]:.5f} accuracy')
+    print(f'  per subject       {result["posts_per_subject"]:.2f} search POSTs, or {result["posts_per_subject_refetch"]:.2f} POSTs & '
+          f'{result["fetches_per_subject_refetch"]:.2f} captcha fetches with re-fetching')
+    if result['confusion']:
+        pairs = ', '.join(f'{expected}->{got} x{n}' for expected, got, n in result['confusion'][:top])
+        print(f'  top confusions    {pairs}')
+
+
+def compare(results):
+    print(f'\n{"model":<24} {"accuracy":>9} {"img/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"POSTs":>7} {"fetches":>8}')
+    # Fewest round trips first, i.e. captcha fetches + search POSTs per subject with re-fetching
+    ranked = sorted(results.items(), key=lambda item: item[1]['posts_per_subject_refetch'] + item[1]['fetches_per_subject_refetch'])
+    for name, result in ranked:
+        print(f'{name:<24} {result["accuracy"]:>9.5f} {result["images_per_s"]:>9.1f} {result["latency_ms"]["p50"]:>8.2f} '
+              f'{result["latency_ms"]["p99"]:>8.2f} {result["posts_per_subject_refetch"]:>7.2f} {result["fetches_per_subject_refetch"]:>8.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cuscraper.benchmarks.captcha', description='Benchmark captcha models on labelled images')
+    parser.add_argument('path', nargs='?', default='captchas',
+                        help='dir of {label}_{timestamp}.png, as saved with save_captchas=True')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='use N generated images instead of path')
+    parser.add_argument('--models', nargs='+', default=['default'],
+                        help='default, beta or onnx:<model.onnx>:<charsets.json>')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='images recognized concurrently')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='only the first N images')
+    parser.add_argument('--min-confidence', type=float, default=MIN_CAPTCHA_CONFIDENCE)
+    parser.add_argument('--top', type=int, default=10,
+                        help='character confusions shown per model')
+    parser.add_argument('--output', help='save results as json')
+    args = parser.parse_args(argv)
+
+    samples = captcha_samples(args.synthetic) if args.synthetic else load_samples(
+        args.path, args.limit)
+    if not samples:
+        print(f'No labelled captchas in {args.path}')
+        return 1
+    results = {}
+    for spec in args.models:
+        ocr = load_model(spec)
+        # Warm up, the first inference allocates the session buffers
+        recognize(read_image(samples[0][1]), ocr)
+        results[spec] = evaluate(ocr, samples, args.workers, args.min_confidence)
+        report(spec, results[spec], args.top)
+    if len(results) > 1:
+        compare(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'python': sys.version.split()[0], 'workers': args.workers}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
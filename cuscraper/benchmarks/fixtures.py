@@ -0,0 +1,327 @@
+import base64
+import html
+import io
+import json
+import os
+import random
+import re
+import requests
+from PIL import Image, ImageDraw, ImageFont
+from ..transport import ScraperSession
+
+# Synthetic stand-ins for the course catalog: pages shaped like the real ones (incl. large split
+# viewstates) for the parsing benchmarks, and course directories for the post-processing ones.
+
+# Rough size of a real full-catalog run
+CATALOG_SUBJECTS = 250
+COURSES_PER_SUBJECT = 35
+
+DAYS = ['Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa']
+TERMS = ['2020-21 Term 1', '2020-21 Term 2', '2021-22 Term 1',
+         '2021-22 Term 2', '2022-23 Term 1']
+COMPONENTS = ['LEC', 'TUT', 'LAB', 'SEM']
+WORDS = ['analysis', 'system', 'theory', 'design', 'data', 'computing', 'language', 'culture', 'society',
+         'market', 'method', 'structure', 'practice', 'modelling', 'history', 'policy', 'learning', 'network']
+ASSESSMENTS = ['Essay test or exam', 'Homework or assignment',
+               'Lab reports', 'Presentation', 'Project', 'Others']
+
+
+def subject_codes(n: int) -> list:
+    codes = []
+    for i in range(n):
+        code = ''
+        for _ in range(4):
+            code = chr(ord('A') + i % 26) + code
+            i //= 26
+        codes.append(code)
+    return codes
+
+
+def departments(stat_dir=None) -> list:
+    stat_dir = stat_dir or os.path.join(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))), 'stat')
+    with open(os.path.join(stat_dir, 'faculty_departments.json'), 'r') as f:
+        return list(json.load(f).keys())
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def to_12_hours(minutes: int) -> str:
+    hour, minute = divmod(minutes, 60)
+    return f'{hour % 12 or 12}:{minute:02d}{"PM" if hour >= 12 else "AM"}'
+
+
+def to_24_hours(minutes: int) -> str:
+    return '{}:{:02d}'.format(*divmod(minutes, 60))
+
+
+# Section schedules as (section, [(day, start, end, location, instructor, dates)])
+def make_schedule(rng: random.Random, instructors: list) -> list:
+    schedule = []
+    for s in range(rng.randint(1, 4)):
+        component = COMPONENTS[min(s, len(COMPONENTS) - 1)]
+        name = f'{"-" if s else "--"}{component}{f"-L0{s}" if s else ""} ({5000 + rng.randint(0, 4999)})'
+        meetings = []
+        for _ in range(rng.randint(1, 3)):
+            start = rng.randrange(8 * 60 + 30, 18 * 60, 60)
+            end = start + rng.choice([45, 105, 165])
+            dates = ', '.join(
+                f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}' for _ in range(rng.randint(1, 6)))
+            meetings.append((rng.randrange(len(DAYS)), start, end, f'{rng.choice(["LSB", "YIA", "ERB", "MMW"])} {rng.randint(100, 999)}',
+                             rng.choice(instructors), dates))
+        schedule.append((name, meetings))
+    return schedule
+
+
+# A course record in the same format as the scraper output
+def make_course(rng: random.Random, code: str, department: str, instructors: list) -> dict:
+    course = {
+        'code': code,
+        'title': sentence(rng, rng.randint(2, 5))[:-1],
+        'career': rng.choice(['Undergraduate', 'Postgraduate - Taught']),
+        'units': rng.choice(['1.00', '2.00', '3.00']),
+        'grading': 'Graded',
+        'components': 'Lecture Tutorial',
+        'campus': 'Main Campus',
+        'academic_group': department,
+        'requirements': rng.choice(['', f'Prerequisite: {code} or equivalent']),
+        'description': sentence(rng, rng.randint(30, 120)),
+        'outcome': sentence(rng, rng.randint(10, 60)),
+        'syllabus': sentence(rng, rng.randint(10, 80)),
+        'required_readings': sentence(rng, rng.randint(0, 20)),
+        'recommended_readings': '',
+    }
+    terms = {}
+    for term in rng.sample(TERMS, rng.randint(0, len(TERMS))):
+        sections = {}
+        for name, meetings in make_schedule(rng, instructors):
+            dates = sorted(set(', '.join(m[5] for m in meetings).split(', ')),
+                           key=lambda s: tuple(map(int, s.split('/')[::-1])))
+            sections[name] = {
+                'startTimes': [to_24_hours(m[1]) for m in meetings],
+                'endTimes': [to_24_hours(m[2]) for m in meetings],
+                'days': [m[0] + 1 for m in meetings],
+                'locations': [m[3] for m in meetings],
+                'instructors': [m[4] for m in meetings],
+                'meetingDates': dates,
+            }
+        terms[term] = sections
+    if terms:
+        course['terms'] = {term: terms[term]
+                           for term in TERMS if term in terms}
+    course['assessments'] = {
+        a: str(rng.randint(1, 9) * 10) for a in rng.sample(ASSESSMENTS, rng.randint(1, 4))}
+    return course
+
+
+def make_instructors(rng: random.Random, n=400) -> list:
+    titles = ['Professor', 'Prof.', 'Dr.', 'Dr', 'Mr.', 'Ms', 'Miss']
+    names = []
+    for i in range(n):
+        name = f'{rng.choice(titles)} {rng.choice(WORDS).upper()} {chr(65 + i % 26)}{i}'
+        if i % 17 == 0:
+            name += f', {rng.choice(titles)} {rng.choice(WORDS).upper()} Z{i}'
+        names.append(name)
+    return names
+
+
+# Write {subject}.json for num_subjects synthetic subjects, e.g. num_subjects=CATALOG_SUBJECTS * 10
+def generate_course_dir(dirname, num_subjects=CATALOG_SUBJECTS, courses_per_subject=COURSES_PER_SUBJECT, seed=0) -> int:
+    rng = random.Random(seed)
+    instructors = make_instructors(rng)
+    department_list = departments()
+    os.makedirs(dirname, exist_ok=True)
+    num_courses = 0
+    for subject in subject_codes(num_subjects):
+        department = rng.choice(department_list)
+        n = rng.randint(courses_per_subject // 2, courses_per_subject * 3 // 2)
+        codes = sorted(rng.sample(range(1000, 6000), n))
+        courses = [make_course(rng, str(code), department, instructors)
+                   for code in codes]
+        num_courses += len(courses)
+        with open(os.path.join(dirname, f'{subject}.json'), 'w') as f:
+            json.dump(courses, f)
+    return num_courses
+
+
+def hidden_inputs(fields: dict) -> str:
+    return ''.join(
+        f'<input type="hidden" name="{k}" id="{k.replace("$", "_")}" value="{html.escape(v)}" />' for k, v in fields.items())
+
+
+# Page identity is kept at the start of __VIEWSTATE, so the fixture session knows which page a form came from
+def form_state(tag: str, rng: random.Random, viewstate_fields=8, viewstate_size=24000, extra=None) -> str:
+    fields = {'__VIEWSTATEFIELDCOUNT': str(viewstate_fields)}
+    blob = base64.b64encode(rng.randbytes(
+        viewstate_size * viewstate_fields * 3 // 4)).decode()
+    chunks = [blob[i * viewstate_size:(i + 1) * viewstate_size]
+              for i in range(viewstate_fields)]
+    fields['__VIEWSTATE'] = f'{tag}|{chunks[0]}'
+    for i in range(1, viewstate_fields):
+        fields[f'__VIEWSTATE{i}'] = chunks[i]
+    fields['__VIEWSTATEGENERATOR'] = 'A1B2C3D4'
+    fields['__EVENTVALIDATION'] = base64.b64encode(
+        rng.randbytes(600)).decode()
+    fields.update(extra or {})
+    return hidden_inputs(fields)
+
+
+def page(body: str) -> str:
+    return f'<!DOCTYPE html><html><head><title>Course Catalog</title></head><body><form method="post" id="form1">{body}</form></body></html>'
+
+
+class CatalogFixture:
+    def __init__(self, num_subjects=1, courses_per_subject=COURSES_PER_SUBJECT, seed=0):
+        self.rng = random.Random(seed)
+        self.instructors = make_instructors(self.rng)
+        department_list = departments()
+        self.subjects = {}
+        for subject in subject_codes(num_subjects):
+            department = self.rng.choice(department_list)
+            codes = sorted(self.rng.sample(
+                range(1000, 6000), courses_per_subject))
+            self.subjects[subject] = [{
+                'code': str(code),
+                'department': department,
+                'title': sentence(self.rng, self.rng.randint(2, 5))[:-1],
+                'schedules': {term: make_schedule(self.rng, self.instructors) for term in TERMS},
+                # Fixed per course, so pages requested in any order (e.g. concurrently) give the same courses
+                'description': sentence(self.rng, 80),
+                'outcome': sentence(self.rng, 40),
+                'syllabus': sentence(self.rng, 60),
+                'required_readings': sentence(self.rng, 12),
+            } for code in codes]
+
+    def search_page(self, n=0) -> str:
+        options = '<option value="">Select</option>' + ''.join(
+            f'<option value="{s}">{s}</option>' for s in self.subjects)
+        return page(form_state('search', self.rng, extra={'hf_Captcha': f'captcha{n}'}) +
+                    f'<select name="ddl_subject" id="ddl_subject">{options}</select>'
+                    '<input name="txt_captcha" type="text" id="txt_captcha" />')
+
+    def result_page(self, subject) -> str:
+        rows = ''.join(
+            f'<tr><td><a id="gv_detail_ctl{i + 2:02d}_lbtn_course_nbr" href="#">{c["code"]}</a></td>'
+            f'<td><a id="gv_detail_ctl{i + 2:02d}_lbtn_course_title" href="#">{html.escape(c["title"])}</a></td>'
+            '<td>Main Campus</td></tr>'
+            for i, c in enumerate(self.subjects[subject]))
+        return page(form_state(f'result:{subject}', self.rng) +
+                    f'<table id="gv_detail"><tr><th>Course Code</th><th>Course Title</th><th>Campus</th></tr>{rows}</table>')
+
+    def schedule_table(self, schedule) -> str:
+        rows = ''
+        for name, meetings in schedule:
+            slots = ''.join(
+                f'<tr><td>{DAYS[day]} {to_12_hours(start)} - {to_12_hours(end)}</td><td>{location}</td>'
+                f'<td>{instructor}</td><td>{dates}</td></tr>'
+                for day, start, end, location, instructor, dates in meetings)
+            rows += f'<tr><td>\n{name}\n</td><td>Open</td><td><table>{slots}</table></td></tr>'
+        return f'<table id="uc_course_gv_sched"><tr><th>Class Section</th><th>Status</th><th>Details</th></tr>{rows}</table>'
+
+    def detail_page(self, subject, i, term=TERMS[-1]) -> str:
+        course = self.subjects[subject][i]
+        selected = ' selected="selected"'
+        options = ''.join(
+            f'<option{selected if t == term else ""} value="{t[:4]}{t[-1]}">{t}</option>' for t in TERMS)
+        labels = {
+            'uc_course_lbl_acad_career': 'Undergraduate',
+            'uc_course_lbl_units': '3.00',
+            'uc_course_lbl_grading_basis': 'Graded',
+            'uc_course_lbl_component': 'Lecture Tutorial',
+            'uc_course_lbl_campus': 'Main Campus',
+            'uc_course_lbl_acad_group': course['department'],
+            'uc_course_lbl_crse_descrlong': course['description'],
+        }
+        return page(form_state(f'detail:{subject}:{i}', self.rng, extra={'hf_course_offer_nbr': '1', 'hf_course_id': f'00{i}'}) +
+                    ''.join(f'<span id="{k}">{html.escape(v)}</span>' for k, v in labels.items()) +
+                    f'<div id="uc_course_tc_enrl_requirement"><span>Prerequisite: {subject}1000</span></div>'
+                    f'<select name="uc_course$ddl_class_term" id="uc_course_ddl_class_term">{options}</select>' +
+                    self.schedule_table(course['schedules'][term]))
+
+    def outcome_page(self, subject, i) -> str:
+        course = self.subjects[subject][i]
+        labels = {
+            'uc_course_outcome_lbl_learning_outcome': course['outcome'],
+            'uc_course_outcome_lbl_course_syllabus': course['syllabus'],
+            'uc_course_outcome_lbl_req_reading': course['required_readings'],
+            'uc_course_outcome_lbl_rec_reading': '',
+        }
+        rows = ''.join(
+            f'<tr><td>{k}</td><td>{a}</td><td>{10 * (k + 1)}</td></tr>' for k, a in enumerate(ASSESSMENTS[:4]))
+        return page(form_state('outcome', self.rng) +
+                    ''.join(f'<span id="{k}">{html.escape(v)}</span>' for k, v in labels.items()) +
+                    f'<table id="uc_course_outcome_gv_ast"><tr><th></th><th>Type</th><th>Percent</th></tr>{rows}</table>')
+
+
+CAPTCHA_CHARS = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+
+
+# Drawn small with Pillow's default font (no size argument, for Pillow < 10.1) and scaled up to the real size
+def captcha_image(text='7XQ2', seed=0) -> bytes:
+    rng = random.Random(seed)
+    im = Image.new('RGB', (40, 14), (255, 255, 255))
+    draw = ImageDraw.Draw(im)
+    font = ImageFont.load_default()
+    for i, c in enumerate(text.upper()):
+        draw.text((3 + 9 * i + rng.randint(-1, 1), 1 + rng.randint(-1, 1)), c,
+                  fill=tuple(rng.randint(0, 90) for _ in range(3)), font=font)
+    im = im.resize((120, 40), Image.BILINEAR)
+    draw = ImageDraw.Draw(im)
+    for _ in range(3):
+        draw.line([(rng.randint(0, 120), rng.randint(0, 40)) for _ in range(2)],
+                  fill=tuple(rng.randint(100, 200) for _ in range(3)))
+    buffer = io.BytesIO()
+    im.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+# (label, image) pairs in the shape of the captchas saved with save_captchas=True, i.e. lowercase labels
+# as the model returns them
+def captcha_samples(num, seed=0) -> list:
+    rng = random.Random(seed)
+    samples = []
+    for i in range(num):
+        label = ''.join(rng.choice(CAPTCHA_CHARS) for _ in range(4)).lower()
+        samples.append((label, captcha_image(label, seed + i)))
+    return samples
+
+
+# Answers the scraper's requests from a CatalogFixture, accepting any captcha
+class FixtureSession(ScraperSession):
+    def __init__(self, fixture: CatalogFixture, limiter=None):
+        super().__init__(limiter)
+        self.fixture = fixture
+        self.num_requests = 0
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        self.num_requests += 1
+        data = data or {}
+        tag = data.get('__VIEWSTATE', '').split('|')[0].split(':')
+        content_type = 'text/html; charset=utf-8'
+        if 'BuildCaptcha' in url:
+            content, content_type = captcha_image(), 'image/png'
+        elif method.upper() == 'GET':
+            content = self.fixture.search_page(self.num_requests)
+        elif 'btn_search' in data:
+            content = self.fixture.result_page(data['ddl_subject'])
+        elif '__EVENTTARGET' in data:
+            i = int(re.search(r'ctl(\d+)', data['__EVENTTARGET']).group(1)) - 2
+            content = self.fixture.detail_page(tag[1], i)
+        elif 'uc_course$btn_class_section' in data:
+            term = next(t for t in TERMS if f'{t[:4]}{t[-1]}' ==
+                        data['uc_course$ddl_class_term'])
+            content = self.fixture.detail_page(tag[1], int(tag[2]), term)
+        elif 'btn_course_outcome' in data:
+            content = self.fixture.outcome_page(tag[1], int(tag[2]))
+        else:
+            raise KeyError(f'Unexpected request to {url}')
+        res = requests.Response()
+        res.status_code = 200
+        res.headers['Content-Type'] = content_type
+        res.encoding = 'utf-8'
+        res.url = url
+        res._content = content.encode() if isinstance(content, str) else content
+        res._content_consumed = True
+        return res
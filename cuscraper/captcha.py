@@ -0,0 +1,154 @@
+import queue
+import random
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# The OCR model takes seconds & hundreds of MB to load (onnxruntime included), so it's only
+# built on the first captcha, e.g. never for generate_stat / info on existing data.
+
+# The catalog always asks for 4 alphanumeric characters (BuildCaptcha.aspx?len=4)
+CAPTCHA_LENGTH = 4
+# Rounds of captchas all below min_confidence in a row before the pool gives up (see CaptchaPool)
+MAX_POOL_MISSES = 5
+
+_ocr = None
+_ocr_lock = threading.Lock()
+
+
+def get_ocr():
+    global _ocr
+    if _ocr is None:
+        with _ocr_lock:
+            if _ocr is None:
+                import onnxruntime
+                import ddddocr
+                onnxruntime.set_default_logger_severity(3)
+                _ocr = ddddocr.DdddOcr()
+    return _ocr
+
+
+def classify(image_bytes: bytes) -> str:
+    return get_ocr().classification(image_bytes)
+
+
+# (text, confidence in [0, 1]) from the given model, the shared one by default. Confidence is the
+# model's own score where ddddocr reports one (probability=True), 1 otherwise, and 0 for a guess
+# that can't be right, e.g. 3 characters
+def recognize(image_bytes: bytes, ocr=None) -> tuple:
+    ocr = ocr or get_ocr()
+    try:
+        result = ocr.classification(image_bytes, probability=True)
+    except TypeError:
+        # ddddocr without probability support
+        result = ocr.classification(image_bytes)
+    if isinstance(result, dict):
+        text, confidence = decode_probabilities(result)
+    else:
+        text, confidence = result, 1.0
+    if len(text) != CAPTCHA_LENGTH or not text.isalnum():
+        confidence = 0.0
+    return text, confidence
+
+
+def decode_probabilities(result: dict) -> tuple:
+    if 'text' in result:
+        return result['text'], float(result.get('confidence', 1.0))
+    # Older ddddocr only returns the per-step distribution over the charset, decode it like
+    # the model does (best class per step, blanks & repeats dropped)
+    charset, steps = result['charsets'], result['probability']
+    text, confidence, last = '', 1.0, None
+    for step in steps:
+        best = max(range(len(step)), key=step.__getitem__)
+        if best != last and charset[best] != '':
+            text += charset[best]
+            confidence *= step[best]
+        last = best
+    return text, confidence
+
+
+# Recognize many images, still one inference per image: ddddocr runs a single image per call, but the
+# ONNX session is shared and releases the GIL while running, so `workers` of them run concurrently
+def recognize_concurrent(images: list, workers: int = 4) -> list:
+    if len(images) <= 1 or workers <= 1:
+        return [recognize(image) for image in images]
+    get_ocr()
+    with ThreadPoolExecutor(max_workers=min(workers, len(images))) as executor:
+        return list(executor.map(recognize, images))
+
+
+CaptchaTicket = namedtuple(
+    'CaptchaTicket', ['form_state', 'image', 'captcha', 'confidence'])
+
+
+# Keeps up to `size` search pages with their captcha already fetched & recognized, in a background
+# thread, so a search never waits on the captcha round trip. fetch() returns (form_state, image bytes)
+# of a new search page, through the scraper's session & its rate limiter. Tickets below min_confidence
+# are dropped instead of being posted (counted in metrics), and a round with none left is fetched again
+# after a jittered exponential backoff, up to max_misses rounds in a row before the pool gives up.
+class CaptchaPool:
+    def __init__(self, fetch, size=4, min_confidence=0.0, metrics=None, max_misses=MAX_POOL_MISSES, backoff=0.5):
+        self.fetch = fetch
+        self.size = size
+        self.min_confidence = min_confidence
+        self.metrics = metrics
+        self.max_misses = max_misses
+        self.backoff = backoff
+        self.tickets = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    def fill(self):
+        misses = 0
+        while not self.stopped.is_set():
+            try:
+                pages = [self.fetch() for _ in range(
+                    max(1, self.size - self.tickets.qsize()))]
+                results = recognize_concurrent([image for _, image in pages])
+                tickets = [CaptchaTicket(form_state, image, captcha, confidence) for (
+                    form_state, image), (captcha, confidence) in zip(pages, results)]
+            except Exception as e:
+                # Raised to the caller of get()
+                self.put(e)
+                return
+            kept = [ticket for ticket in tickets if ticket.confidence >= self.min_confidence]
+            if self.metrics:
+                for _ in range(len(tickets) - len(kept)):
+                    self.metrics.record_error('captcha_low_confidence')
+            for ticket in kept:
+                self.put(ticket)
+            if kept:
+                misses = 0
+                continue
+            misses += 1
+            if misses >= self.max_misses:
+                if self.metrics:
+                    self.metrics.record_error('captcha_pool_gave_up')
+                self.put(RuntimeError(
+                    f'No captcha above confidence {self.min_confidence} in {misses} rounds'))
+                return
+            self.stopped.wait(random.uniform(0, self.backoff * 2 ** misses))
+
+    def put(self, ticket):
+        while not self.stopped.is_set():
+            try:
+                self.tickets.put(ticket, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def get(self) -> CaptchaTicket:
+        while True:
+            if not self.thread.is_alive() and self.tickets.empty():
+                raise RuntimeError('Captcha pool stopped')
+            try:
+                ticket = self.tickets.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if isinstance(ticket, Exception):
+                raise ticket
+            return ticket
+
+    def close(self):
+        self.stopped.set()
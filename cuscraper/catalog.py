@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+from .aggregate import normalize_instructor
+from .timetable import DAYS, to_minutes
+
+# The course files of a snapshot as an indexed SQLite database, so point lookups & aggregations are
+# queries instead of json.load-ing every {subject}.json. Saved by generate_stat as data/<timestamp>/catalog.sqlite:
+#   courses       subject, code & the course fields (others as json in extra), index on (subject, code)
+#   terms         term names
+#   sections      course, term, name & meeting dates (json), indexes on term & course
+#   meetings      timeslots of a section: day (0-6, or e.g. 'TBA' as listed), start & end (minutes of the day,
+#                 None if not a time), location & instructor as listed, indexes on (term, day, start) & location
+#   instructors   names cleaned like instructors.json, section_instructors links them to sections
+#   assessments   course, name & weight
+#   catalog = Catalog('data/1660000000/catalog.sqlite')
+#   catalog.courses_taught_by('Wong Kam Fai', '2022-23 Term 1')
+
+COURSE_FIELDS = ['title', 'career', 'units', 'grading', 'components', 'campus', 'academic_group', 'requirements',
+                 'description', 'outcome', 'syllabus', 'required_readings', 'recommended_readings']
+SCHEMA = f'''
+CREATE TABLE courses (id INTEGER PRIMARY KEY, subject TEXT NOT NULL, code TEXT NOT NULL,
+                      {', '.join(f'{field} TEXT' for field in COURSE_FIELDS)}, extra TEXT);
+CREATE TABLE terms (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE sections (id INTEGER PRIMARY KEY, course_id INTEGER NOT NULL, term_id INTEGER NOT NULL,
+                       name TEXT NOT NULL, meeting_dates TEXT);
+CREATE TABLE meetings (id INTEGER PRIMARY KEY, section_id INTEGER NOT NULL, term_id INTEGER NOT NULL, day INTEGER,
+                       start INTEGER, end INTEGER, start_time TEXT, end_time TEXT, location TEXT, instructor TEXT);
+CREATE TABLE instructors (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE section_instructors (section_id INTEGER NOT NULL, instructor_id INTEGER NOT NULL,
+                                  PRIMARY KEY (section_id, instructor_id));
+CREATE TABLE assessments (course_id INTEGER NOT NULL, name TEXT NOT NULL, weight TEXT);
+'''
+# Created once the rows are in, a lot faster than updating them on every insert
+INDEXES = '''
+CREATE INDEX courses_subject_code ON courses (subject, code);
+CREATE INDEX sections_term ON sections (term_id);
+CREATE INDEX sections_course ON sections (course_id);
+CREATE INDEX meetings_term_day_start ON meetings (term_id, day, start);
+CREATE INDEX meetings_location ON meetings (location);
+CREATE INDEX meetings_section ON meetings (section_id);
+CREATE INDEX section_instructors_instructor ON section_instructors (instructor_id);
+CREATE INDEX assessments_course ON assessments (course_id);
+'''
+
+
+# Writes the database next to path and moves it in place on result(), one transaction for the whole catalog
+class CatalogBuilder:
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f'{path}.tmp'
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        # Transactions are explicit, the whole build is one
+        self.db = sqlite3.connect(self.tmp_path, isolation_level=None)
+        # A half-written database is thrown away anyway
+        self.db.execute('PRAGMA journal_mode = OFF')
+        self.db.execute('PRAGMA synchronous = OFF')
+        self.db.executescript(SCHEMA)
+        self.db.execute('BEGIN')
+        self.ids = {'course': 0, 'section': 0}
+        self.terms = {}
+        self.instructors = {}
+
+    def lookup(self, table: dict, name) -> int:
+        if name not in table:
+            table[name] = len(table) + 1
+        return table[name]
+
+    def add(self, subject, courses):
+        course_rows, section_rows, meeting_rows, section_instructor_rows, assessment_rows = [], [], [], [], []
+        for course in courses:
+            self.ids['course'] += 1
+            course_id = self.ids['course']
+            extra = {key: value for key, value in course.items() if key not in COURSE_FIELDS and key not in (
+                'code', 'terms', 'assessments')}
+            course_rows.append((course_id, subject, course['code'], *(course.get(field) for field in COURSE_FIELDS),
+                                json.dumps(extra) if extra else None))
+            for name, weight in (course.get('assessments') or {}).items():
+                assessment_rows.append((course_id, name, weight))
+            for term, sections in (course.get('terms') or {}).items():
+                term_id = self.lookup(self.terms, term)
+                for name, section in sections.items():
+                    self.ids['section'] += 1
+                    section_id = self.ids['section']
+                    section_rows.append((section_id, course_id, term_id, name, json.dumps(section.get('meetingDates', []))))
+                    instructor_ids = set()
+                    for day, start_time, end_time, location, instructor in zip(
+                            section['days'], section['startTimes'], section['endTimes'], section['locations'], section['instructors']):
+                        meeting_rows.append((section_id, term_id, day, to_minutes(start_time),
+                                             to_minutes(end_time), start_time, end_time, location, instructor))
+                        for part in normalize_instructor(instructor) if isinstance(instructor, str) else ():
+                            instructor_ids.add(self.lookup(self.instructors, part))
+                    section_instructor_rows += [(section_id, instructor_id) for instructor_id in instructor_ids]
+        self.db.executemany(f'INSERT INTO courses VALUES ({", ".join("?" * (len(COURSE_FIELDS) + 4))})', course_rows)
+        self.db.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?)', section_rows)
+        self.db.executemany('INSERT INTO meetings (section_id, term_id, day, start, end, start_time, end_time, location, instructor) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', meeting_rows)
+        self.db.executemany('INSERT INTO section_instructors VALUES (?, ?)', section_instructor_rows)
+        self.db.executemany('INSERT INTO assessments VALUES (?, ?, ?)', assessment_rows)
+
+    def result(self) -> str:
+        try:
+            self.db.executemany('INSERT INTO terms VALUES (?, ?)', [(i, name) for name, i in self.terms.items()])
+            self.db.executemany('INSERT INTO instructors VALUES (?, ?)', [(i, name) for name, i in self.instructors.items()])
+            self.db.execute('COMMIT')
+            self.db.executescript(INDEXES + 'ANALYZE;')
+            self.db.close()
+            os.replace(self.tmp_path, self.path)
+        finally:
+            self.discard()
+        return self.path
+
+    # Closes & removes the half-written database, e.g. when another builder of the pass failed
+    def discard(self):
+        self.db.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class Catalog:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'No catalog at {path}, see generate_stat')
+        self.db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()) -> list:
+        return self.db.execute(sql, params).fetchall()
+
+    def subjects(self) -> list:
+        return [row[0] for row in self.query('SELECT DISTINCT subject FROM courses ORDER BY subject')]
+
+    # {subject: number of courses}
+    def course_counts(self) -> dict:
+        return dict(self.query('SELECT subject, COUNT(*) FROM courses GROUP BY subject ORDER BY subject'))
+
+    def count_courses(self) -> int:
+        return self.query('SELECT COUNT(*) FROM courses')[0][0]
+
+    # Courses matching the condition on the courses table as in their {subject}.json (key order aside),
+    # with a query per table instead of per course
+    def fetch_courses(self, where, params) -> list:
+        rows = self.query(f'SELECT * FROM courses WHERE {where} ORDER BY id', params)
+        joined = f'JOIN courses ON courses.id = course_id WHERE {where}'
+        sections = self.query('SELECT sections.id, course_id, terms.name AS term, sections.name, meeting_dates FROM sections '
+                              f'JOIN terms ON terms.id = term_id {joined} ORDER BY sections.id', params)
+        meetings = {}
+        for meeting in self.query('SELECT section_id, day, start_time, end_time, location, instructor FROM meetings '
+                                  f'JOIN sections ON sections.id = section_id {joined} ORDER BY meetings.id', params):
+            meetings.setdefault(meeting['section_id'], []).append(meeting)
+        assessments = {}
+        for assessment in self.query(f'SELECT course_id, assessments.name, weight FROM assessments {joined} '
+                                     'ORDER BY assessments.rowid', params):
+            assessments.setdefault(assessment['course_id'], {})[assessment['name']] = assessment['weight']
+        terms = {}
+        for section in sections:
+            section_meetings = meetings.get(section['id'], [])
+            terms.setdefault(section['course_id'], {}).setdefault(section['term'], {})[section['name']] = {
+                'startTimes': [meeting['start_time'] for meeting in section_meetings],
+                'endTimes': [meeting['end_time'] for meeting in section_meetings],
+                'days': [meeting['day'] for meeting in section_meetings],
+                'locations': [meeting['location'] for meeting in section_meetings],
+                'instructors': [meeting['instructor'] for meeting in section_meetings],
+                'meetingDates': json.loads(section['meeting_dates']),
+            }
+        courses = []
+        for row in rows:
+            course = {'code': row['code']}
+            course.update((field, row[field]) for field in COURSE_FIELDS if row[field] is not None)
+            if row['extra']:
+                course.update(json.loads(row['extra']))
+            if row['id'] in terms:
+                course['terms'] = terms[row['id']]
+            if row['id'] in assessments:
+                course['assessments'] = assessments[row['id']]
+            courses.append(course)
+        return courses
+
+    # The course as in {subject}.json (key order aside), None if there's no such course
+    def course(self, course_id):
+        courses = self.fetch_courses('subject = ? AND code = ?', (course_id[:4], course_id[4:]))
+        return courses[0] if courses else None
+
+    # Every course of the subject as in {subject}.json (key order aside)
+    def load(self, subject) -> list:
+        return self.fetch_courses('subject = ?', (subject,))
+
+    # [(course id, title)] of the subject
+    def courses(self, subject) -> list:
+        return [(subject + code, title) for code, title in self.query(
+            'SELECT code, title FROM courses WHERE subject = ? ORDER BY id', (subject,))]
+
+    # [(course id, section)] offered in the term, of one subject or all of them
+    def sections(self, term, subject=None) -> list:
+        sql = ('SELECT subject || code, sections.name FROM sections JOIN terms ON terms.id = term_id '
+               'JOIN courses ON courses.id = course_id WHERE terms.name = ?')
+        params = [term]
+        if subject:
+            sql += ' AND subject = ?'
+            params.append(subject)
+        return [tuple(row) for row in self.query(sql + ' ORDER BY sections.id', params)]
+
+    # [(course id, term, section)] with the instructor (name as in instructors.json), in one term or all
+    def courses_taught_by(self, instructor, term=None) -> list:
+        sql = ('SELECT subject || code, terms.name, sections.name FROM instructors '
+               'JOIN section_instructors ON instructor_id = instructors.id JOIN sections ON sections.id = section_id '
+               'JOIN terms ON terms.id = term_id JOIN courses ON courses.id = course_id WHERE instructors.name = ?')
+        params = [instructor]
+        if term:
+            sql += ' AND terms.name = ?'
+            params.append(term)
+        return [tuple(row) for row in self.query(sql + ' ORDER BY sections.id', params)]
+
+    # [(course id, section, day, start time, end time, location)] of the timeslots overlapping [start, end)
+    # on the day ('Mo' or 0-6), times as 'HH:MM'
+    def meetings_between(self, term, day, start: str, end: str, location=None) -> list:
+        sql = ('SELECT subject || code, sections.name, meetings.day, start_time, end_time, location FROM meetings '
+               'JOIN terms ON terms.id = meetings.term_id JOIN sections ON sections.id = section_id '
+               'JOIN courses ON courses.id = course_id WHERE terms.name = ? AND meetings.day = ? AND start < ? AND meetings.end > ?')
+        params = [term, DAYS.get(day, day), to_minutes(end), to_minutes(start)]
+        if location is not None:
+            sql += ' AND location = ?'
+            params.append(location)
+        return [tuple(row) for row in self.query(sql + ' ORDER BY start, meetings.id', params)]
+
+    # [(course id, section, day, start time, end time)] at the location in the term, in weekly order
+    def location_schedule(self, term, location) -> list:
+        return [tuple(row) for row in self.query(
+            'SELECT subject || code, sections.name, meetings.day, start_time, end_time FROM meetings '
+            'JOIN terms ON terms.id = meetings.term_id JOIN sections ON sections.id = section_id '
+            'JOIN courses ON courses.id = course_id WHERE location = ? AND terms.name = ? ORDER BY meetings.day, start',
+            (location, term))]
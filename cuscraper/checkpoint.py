@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+
+# Append-only journal of the progress within each subject, so an interrupted run (restarted with the
+# same timestamp) resumes at the course & term it stopped at. One {subject}.jsonl per unfinished subject:
+#   {"code": ..., "term": ..., "sections": ...}   sections of one term of a course
+#   {"code": ..., "outcome": {...}}               fields from the Course Outcome page
+#   {"code": ..., "course": {...}}                a finished course
+
+
+class CheckpointJournal:
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.lock = threading.Lock()
+        os.makedirs(dirname, exist_ok=True)
+
+    def path(self, subject):
+        return os.path.join(self.dirname, f'{subject}.jsonl')
+
+    # code -> {'terms': {term: sections}, 'outcome': fields or None, 'course': course or None}
+    def load(self, subject) -> dict:
+        checkpoints = {}
+        try:
+            with open(self.path(subject), 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # i.e. the last line, cut off by the crash
+                        break
+                    checkpoint = checkpoints.setdefault(
+                        record['code'], {'terms': {}, 'outcome': None, 'course': None})
+                    if 'term' in record:
+                        checkpoint['terms'][record['term']
+                                            ] = record['sections']
+                    elif 'outcome' in record:
+                        checkpoint['outcome'] = record['outcome']
+                    else:
+                        checkpoint['course'] = record['course']
+        except FileNotFoundError:
+            pass
+        return checkpoints
+
+    def append(self, subject, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            with open(self.path(subject), 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # journal callback of build_course_detail for one course
+    def course_journal(self, subject, code):
+        return lambda record: self.append(subject, {'code': code, **record})
+
+    def record_course(self, subject, course):
+        self.append(subject, {'code': course['code'], 'course': course})
+
+    # The subject is saved, nothing left to resume
+    def clear(self, subject):
+        try:
+            os.remove(self.path(subject))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,359 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+
+# Queue of subjects leased to scraper processes, possibly on several hosts, so a run isn't limited to
+# one machine & source IP. Workers claim a subject for lease_seconds, heartbeat while parsing it and
+# complete it with the path of their {subject}.json. A lease that isn't renewed (dead worker) expires
+# and the subject goes back to the queue, up to max_attempts claims. No service is needed, the queue is
+#   a SQLite file (path ending in .sqlite / .db), for workers on one host, or
+#   a directory on a shared filesystem, where claims are atomic renames (see DirectoryLeaseQueue).
+#   python -m cuscraper queue queue.sqlite init                  # subjects of the catalog
+#   python -m cuscraper worker queue.sqlite --timestamp 1660000000    # on each host, as many as wanted
+#   python -m cuscraper queue queue.sqlite merge --timestamp 1660000000
+# A subject is done by the first worker completing it, one finishing after its lease expired still counts.
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}'
+
+
+def open_queue(path, max_attempts=MAX_ATTEMPTS):
+    if path.endswith(('.sqlite', '.db')):
+        return SQLiteLeaseQueue(path, max_attempts)
+    return DirectoryLeaseQueue(path, max_attempts)
+
+
+class SQLiteLeaseQueue:
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        # Autocommit, transactions are explicit (BEGIN IMMEDIATE) so a claim is atomic across processes
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute('''CREATE TABLE IF NOT EXISTS items (subject TEXT PRIMARY KEY, state TEXT NOT NULL,
+                           worker TEXT, expires REAL, attempts INTEGER NOT NULL DEFAULT 0, output TEXT, error TEXT)''')
+
+    def close(self):
+        self.db.close()
+
+    def transaction(self, fn):
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn()
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+            return result
+
+    # Subjects already in the queue are left as they are, returns the number added
+    def add(self, subjects) -> int:
+        def add():
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO items (subject, state) VALUES (?, 'pending')",
+                                [(subject,) for subject in subjects])
+            return self.db.total_changes - before
+        return self.transaction(add)
+
+    # A pending subject or one whose lease expired, None when there is nothing left to claim
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        def claim():
+            now = time.time()
+            # Leases that ran out of attempts can't be claimed again
+            self.db.execute("UPDATE items SET state = 'failed', error = 'lease expired' WHERE state = 'leased' AND expires < ? AND attempts >= ?",
+                            (now, self.max_attempts))
+            row = self.db.execute("SELECT subject FROM items WHERE state = 'pending' OR (state = 'leased' AND expires < ?) ORDER BY attempts, subject LIMIT 1",
+                                  (now,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE items SET state = 'leased', worker = ?, expires = ?, attempts = attempts + 1 WHERE subject = ?",
+                            (worker, now + lease_seconds, row[0]))
+            return row[0]
+        return self.transaction(claim)
+
+    # False if the lease was lost, i.e. it expired & another worker claimed the subject, or it's done
+    def heartbeat(self, subject, worker, lease_seconds=LEASE_SECONDS) -> bool:
+        def heartbeat():
+            cursor = self.db.execute("UPDATE items SET expires = ? WHERE subject = ? AND worker = ? AND state = 'leased'",
+                                     (time.time() + lease_seconds, subject, worker))
+            return cursor.rowcount == 1
+        return self.transaction(heartbeat)
+
+    # False if another worker completed the subject first
+    def complete(self, subject, worker, output) -> bool:
+        def complete():
+            cursor = self.db.execute("UPDATE items SET state = 'done', worker = ?, output = ?, expires = NULL WHERE subject = ? AND state != 'done'",
+                                     (worker, output, subject))
+            return cursor.rowcount == 1
+        return self.transaction(complete)
+
+    # Back to the queue, or failed after max_attempts
+    def fail(self, subject, worker, error=None):
+        def fail():
+            self.db.execute("UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, expires = NULL, error = ? "
+                            "WHERE subject = ? AND worker = ? AND state = 'leased'", (self.max_attempts, error, subject, worker))
+        self.transaction(fail)
+
+    # e.g. to retry the failed subjects of a finished run
+    def reset_failed(self) -> int:
+        def reset_failed():
+            return self.db.execute("UPDATE items SET state = 'pending', attempts = 0, error = NULL WHERE state = 'failed'").rowcount
+        return self.transaction(reset_failed)
+
+    def status(self) -> dict:
+        with self.lock:
+            counts = dict(self.db.execute('SELECT state, COUNT(*) FROM items GROUP BY state'))
+        return {state: counts.get(state, 0) for state in ['pending', 'leased', 'done', 'failed']}
+
+    # subject -> path of the {subject}.json of the worker that completed it
+    def outputs(self) -> dict:
+        with self.lock:
+            return dict(self.db.execute("SELECT subject, output FROM items WHERE state = 'done' ORDER BY subject"))
+
+    def failed(self) -> dict:
+        with self.lock:
+            return dict(self.db.execute("SELECT subject, error FROM items WHERE state = 'failed' ORDER BY subject"))
+
+
+# The queue as files, for workers sharing a filesystem (e.g. NFS) where SQLite locking isn't reliable:
+#   pending/<subject>            number of claims so far
+#   leased/<subject>~<worker>    '<claims> <lease seconds>', its mtime is the last heartbeat
+#   done/<subject>               {'worker', 'output', 'finished'}, created exclusively
+#   failed/<subject>             the error
+# Every transition is a rename (atomic, so only one worker wins a claim) or an exclusive create.
+class DirectoryLeaseQueue:
+    STATES = ['pending', 'leased', 'done', 'failed']
+
+    def __init__(self, dirname, max_attempts=MAX_ATTEMPTS):
+        self.dirname = dirname
+        self.max_attempts = max_attempts
+        for state in self.STATES:
+            os.makedirs(os.path.join(dirname, state), exist_ok=True)
+
+    def close(self):
+        pass
+
+    def state_path(self, state, name) -> str:
+        return os.path.join(self.dirname, state, name)
+
+    def names(self, state) -> list:
+        return sorted(os.listdir(os.path.join(self.dirname, state)))
+
+    @staticmethod
+    def lease_name(subject, worker) -> str:
+        return f'{subject}~{worker}'
+
+    # (claims so far, lease seconds of the claim)
+    @staticmethod
+    def read_lease(path) -> tuple:
+        with open(path, 'r') as f:
+            attempts, _, lease_seconds = f.read().partition(' ')
+        # Just claimed, its lease not written yet
+        return int(attempts or 0), float(lease_seconds) if lease_seconds else LEASE_SECONDS
+
+    def is_done(self, subject) -> bool:
+        return os.path.exists(self.state_path('done', subject))
+
+    def add(self, subjects) -> int:
+        known = set(self.names('pending')) | set(self.names('done')) | set(self.names('failed')) | set(
+            name.split('~', 1)[0] for name in self.names('leased'))
+        added = 0
+        for subject in subjects:
+            if subject in known:
+                continue
+            try:
+                with open(self.state_path('pending', subject), 'x') as f:
+                    f.write('0')
+                added += 1
+            except FileExistsError:
+                pass
+            known.add(subject)
+        return added
+
+    # Expired leases back to pending/ (or failed/ after max_attempts)
+    def requeue_expired(self):
+        now = time.time()
+        for name in self.names('leased'):
+            path = self.state_path('leased', name)
+            try:
+                attempts, lease_seconds = self.read_lease(path)
+                if now - os.stat(path).st_mtime < lease_seconds:
+                    continue
+            except (FileNotFoundError, ValueError):
+                # Gone, or being claimed
+                continue
+            subject = name.split('~', 1)[0]
+            if self.is_done(subject):
+                target = None
+            elif attempts >= self.max_attempts:
+                target = self.state_path('failed', subject)
+            else:
+                target = self.state_path('pending', subject)
+            try:
+                if target is None:
+                    os.remove(path)
+                else:
+                    os.rename(path, target)
+            except FileNotFoundError:
+                # Requeued by another worker
+                continue
+            if target is not None and attempts >= self.max_attempts:
+                with open(target, 'w') as f:
+                    f.write('lease expired')
+
+    # Least claimed first, like the SQLite queue
+    def pending(self) -> list:
+        pending = []
+        for subject in self.names('pending'):
+            try:
+                pending.append((self.read_lease(self.state_path('pending', subject))[0], subject))
+            except (FileNotFoundError, ValueError):
+                continue
+        return [subject for _, subject in sorted(pending)]
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        self.requeue_expired()
+        for subject in self.pending():
+            pending = self.state_path('pending', subject)
+            leased = self.state_path('leased', self.lease_name(subject, worker))
+            try:
+                # Fresh mtime first, or the lease would look expired as soon as it's taken
+                os.utime(pending)
+                os.rename(pending, leased)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            if self.is_done(subject):
+                os.remove(leased)
+                continue
+            attempts = self.read_lease(leased)[0] + 1
+            with open(leased, 'w') as f:
+                f.write(f'{attempts} {lease_seconds}')
+            return subject
+        return None
+
+    def heartbeat(self, subject, worker, lease_seconds=LEASE_SECONDS) -> bool:
+        try:
+            os.utime(self.state_path('leased', self.lease_name(subject, worker)))
+        except FileNotFoundError:
+            return False
+        return not self.is_done(subject)
+
+    def complete(self, subject, worker, output) -> bool:
+        try:
+            with open(self.state_path('done', subject), 'x') as f:
+                json.dump({'worker': worker, 'output': output, 'finished': time.time()}, f)
+            completed = True
+        except FileExistsError:
+            completed = False
+        for path in [self.state_path('leased', self.lease_name(subject, worker)), self.state_path('pending', subject),
+                     self.state_path('failed', subject)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return completed
+
+    def fail(self, subject, worker, error=None):
+        leased = self.state_path('leased', self.lease_name(subject, worker))
+        try:
+            attempts = self.read_lease(leased)[0]
+        except FileNotFoundError:
+            return
+        if attempts >= self.max_attempts:
+            with open(leased, 'w') as f:
+                f.write(error or '')
+            target = self.state_path('failed', subject)
+        else:
+            target = self.state_path('pending', subject)
+        try:
+            os.rename(leased, target)
+        except FileNotFoundError:
+            pass
+
+    def reset_failed(self) -> int:
+        reset = 0
+        for subject in self.names('failed'):
+            path = self.state_path('failed', subject)
+            with open(path, 'w') as f:
+                f.write('0')
+            try:
+                os.rename(path, self.state_path('pending', subject))
+                reset += 1
+            except FileNotFoundError:
+                pass
+        return reset
+
+    def status(self) -> dict:
+        return {state: len(self.names(state)) for state in self.STATES}
+
+    def outputs(self) -> dict:
+        outputs = {}
+        for subject in self.names('done'):
+            try:
+                with open(self.state_path('done', subject), 'r') as f:
+                    outputs[subject] = json.load(f)['output']
+            except ValueError:
+                # Being written
+                continue
+        return outputs
+
+    def failed(self) -> dict:
+        failed = {}
+        for subject in self.names('failed'):
+            with open(self.state_path('failed', subject), 'r') as f:
+                failed[subject] = f.read() or None
+        return failed
+
+
+# Renews the lease every lease_seconds / 3 while the subject is being parsed
+class Heartbeat:
+    def __init__(self, queue, subject, worker, lease_seconds=LEASE_SECONDS):
+        self.queue = queue
+        self.subject = subject
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(self.subject, self.worker, self.lease_seconds):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Copies the {subject}.json completed by the workers into course_dirname (of the snapshot of the run),
+# returns the number of subjects copied
+def merge_outputs(queue, course_dirname) -> int:
+    os.makedirs(course_dirname, exist_ok=True)
+    merged = 0
+    for subject, output in queue.outputs().items():
+        if not output:
+            # Completed without saving
+            continue
+        path = os.path.join(course_dirname, f'{subject}.json')
+        if not (os.path.exists(path) and os.path.samefile(output, path)):
+            tmp_path = f'{path}.tmp'
+            shutil.copyfile(output, tmp_path)
+            os.replace(tmp_path, path)
+        merged += 1
+    return merged
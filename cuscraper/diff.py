@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+from .utils import subject_paths
+
+# Change set between two snapshots of the course files (data/<timestamp>, or merge_dir), for the
+# frontend & notification jobs to update incrementally instead of reloading everything:
+#   delta = diff_snapshots('data/1660000000', 'data/1660100000')
+#   apply_delta('mirror/courses', delta)  # mirror/courses now matches data/1660100000/courses byte for byte
+#
+# {'from', 'to', 'summary': {counts by kind of change}, 'subjects': {subject: {
+#     'base': digest of the old {subject}.json (None if new), 'hash': digest of the new one (None if removed),
+#     'added': {code: course}, 'removed': [code], 'changed': {code: course change},
+#     'order': [code] when the codes aren't in the order applying the changes gives}}}
+# A course change has 'hash' of the new course and what changed: 'fields': {field: [old, new]},
+# 'removed_fields', 'sections_added': {term: {section: ...}}, 'sections_removed': {term: [section]},
+# 'sections_changed': {term: {section: {key: [old, new]}}}, plus 'course' (the whole new course)
+# in the rare case applying those doesn't give the new course exactly (e.g. keys reordered).
+# Unchanged subjects are skipped by the digest of their file, optionally cached in cache_dir.
+
+_MISSING = object()
+SECTION_CHANGES = {
+    'startTimes': 'time_changes',
+    'endTimes': 'time_changes',
+    'days': 'time_changes',
+    'meetingDates': 'time_changes',
+    'locations': 'location_changes',
+    'instructors': 'instructor_changes',
+}
+DESCRIPTION_FIELDS = {'description', 'outcome', 'syllabus',
+                      'required_readings', 'recommended_readings'}
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+# Of the course as written in {subject}.json, i.e. key order matters
+def course_hash(course: dict) -> str:
+    return digest(json.dumps(course).encode())
+
+
+def section_hashes(course: dict) -> dict:
+    return {term: {name: course_hash(section) for name, section in sections.items()}
+            for term, sections in course.get('terms', {}).items()}
+
+
+# A snapshot dir (with courses/) or a course dir itself
+def course_dir_of(path) -> str:
+    courses = os.path.join(path, 'courses')
+    return courses if os.path.isdir(courses) else path
+
+
+def file_digest(path) -> str:
+    with open(path, 'rb') as f:
+        return digest(f.read())
+
+
+# Cache of subject_hashes for the course dir, kept in cache_dir so diffing never writes to a snapshot
+def hashes_cache_path(course_dir, cache_dir) -> str:
+    return os.path.join(cache_dir, f'hashes-{digest(os.path.abspath(course_dir).encode())}.json')
+
+
+# Digest of each {subject}.json. With cache_dir, cached by (size, mtime) so an unchanged snapshot
+# is never read again
+def subject_hashes(course_dir, cache_dir=None) -> dict:
+    cache_path = hashes_cache_path(course_dir, cache_dir) if cache_dir else None
+    cache = {}
+    if cache_path:
+        try:
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+    hashes, updated = {}, {}
+    for subject, path in subject_paths(course_dir).items():
+        stat = os.stat(path)
+        entry = cache.get(subject)
+        if not entry or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+            entry = {'hash': file_digest(path),
+                     'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        updated[subject] = entry
+        hashes[subject] = entry['hash']
+    if cache_path and updated != cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(updated, f)
+        os.replace(tmp_path, cache_path)
+    return hashes
+
+
+def load_courses(path) -> list:
+    if path is None:
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def diff_course(old: dict, new: dict) -> dict:
+    change = {'hash': course_hash(new)}
+    fields = {key: [old.get(key), value] for key, value in new.items()
+              if key != 'terms' and old.get(key, _MISSING) != value}
+    if fields:
+        change['fields'] = fields
+    removed_fields = [key for key in old if key not in new]
+    if removed_fields:
+        change['removed_fields'] = removed_fields
+    old_terms, new_terms = old.get('terms', {}), new.get('terms', {})
+    old_hashes, new_hashes = section_hashes(old), section_hashes(new)
+    added, removed, changed = {}, {}, {}
+    for term, sections in new_terms.items():
+        old_sections = old_terms.get(term, {})
+        for name, section in sections.items():
+            if name not in old_sections:
+                added.setdefault(term, {})[name] = section
+            elif new_hashes[term][name] != old_hashes[term][name]:
+                old_section = old_sections[name]
+                changed.setdefault(term, {})[name] = {
+                    key: [old_section.get(key), value] for key, value in section.items() if old_section.get(key) != value}
+    for term, sections in old_terms.items():
+        for name in sections:
+            if name not in new_terms.get(term, {}):
+                removed.setdefault(term, []).append(name)
+    if added:
+        change['sections_added'] = added
+    if removed:
+        change['sections_removed'] = removed
+    if changed:
+        change['sections_changed'] = changed
+    if course_hash(apply_course(old, change)) != change['hash']:
+        change['course'] = new
+    return change
+
+
+def apply_course(old: dict, change: dict) -> dict:
+    if 'course' in change:
+        return change['course']
+    course = json.loads(json.dumps(old))
+    for key, (_, value) in change.get('fields', {}).items():
+        course[key] = value
+    terms = course.get('terms', {})
+    for term, names in change.get('sections_removed', {}).items():
+        for name in names:
+            del terms[term][name]
+        if not terms[term]:
+            del terms[term]
+    for term, sections in change.get('sections_changed', {}).items():
+        for name, keys in sections.items():
+            for key, (_, value) in keys.items():
+                terms[term][name][key] = value
+    for term, sections in change.get('sections_added', {}).items():
+        course.setdefault('terms', {}).setdefault(term, {}).update(sections)
+    # After the sections, a course with no terms left has its sections removed as well
+    for key in change.get('removed_fields', ()):
+        course.pop(key, None)
+    return course
+
+
+def count_changes(summary, change):
+    for key in change.get('fields', {}):
+        summary['description_changes' if key in DESCRIPTION_FIELDS else 'other_changes'] += 1
+    summary['sections_added'] += sum(len(sections)
+                                     for sections in change.get('sections_added', {}).values())
+    summary['sections_removed'] += sum(len(names)
+                                       for names in change.get('sections_removed', {}).values())
+    for sections in change.get('sections_changed', {}).values():
+        for keys in sections.values():
+            for kind in set(SECTION_CHANGES.get(key, 'other_changes') for key in keys):
+                summary[kind] += 1
+
+
+def diff_subject(old_courses: list, new_courses: list, summary: dict) -> dict:
+    delta = {}
+    old_by_code = {course['code']: course for course in old_courses}
+    new_by_code = {course['code']: course for course in new_courses}
+    if len(old_by_code) != len(old_courses) or len(new_by_code) != len(new_courses):
+        # Duplicated codes, can't be told apart
+        delta['courses'] = new_courses
+        return delta
+    added = {code: course for code,
+             course in new_by_code.items() if code not in old_by_code}
+    removed = [code for code in old_by_code if code not in new_by_code]
+    changed = {}
+    for code, course in new_by_code.items():
+        old = old_by_code.get(code)
+        if old is not None and course_hash(old) != course_hash(course):
+            changed[code] = diff_course(old, course)
+            count_changes(summary, changed[code])
+    summary['courses_added'] += len(added)
+    summary['courses_removed'] += len(removed)
+    summary['courses_changed'] += len(changed)
+    if added:
+        delta['added'] = added
+    if removed:
+        delta['removed'] = removed
+    if changed:
+        delta['changed'] = changed
+    order = [code for code in old_by_code if code in new_by_code] + list(added)
+    if order != list(new_by_code):
+        delta['order'] = list(new_by_code)
+    return delta
+
+
+# cache_dir: where to cache the digests of the subject files between runs, e.g. '.cache'
+def diff_snapshots(old_path, new_path, cache_dir=None) -> dict:
+    old_dir, new_dir = course_dir_of(old_path), course_dir_of(new_path)
+    old_hashes, new_hashes = subject_hashes(old_dir, cache_dir), subject_hashes(new_dir, cache_dir)
+    old_paths, new_paths = subject_paths(old_dir), subject_paths(new_dir)
+    summary = dict.fromkeys(['subjects_changed', 'courses_added', 'courses_removed', 'courses_changed', 'sections_added', 'sections_removed',
+                             'time_changes', 'location_changes', 'instructor_changes', 'description_changes', 'other_changes'], 0)
+    subjects = {}
+    for subject in sorted(set(old_hashes) | set(new_hashes)):
+        base, new_hash = old_hashes.get(subject), new_hashes.get(subject)
+        if base == new_hash:
+            continue
+        delta = {'base': base, 'hash': new_hash}
+        delta.update(diff_subject(load_courses(old_paths.get(subject)),
+                                  load_courses(new_paths.get(subject)), summary))
+        subjects[subject] = delta
+    summary['subjects_changed'] = len(subjects)
+    return {'from': old_path, 'to': new_path, 'summary': summary, 'subjects': subjects}
+
+
+# Update the {subject}.json files of course_dir (a copy of the 'from' snapshot) to the 'to' snapshot.
+# Raises ValueError, before writing the subject, if a file isn't the one the delta was made from.
+def apply_delta(path, delta: dict) -> int:
+    course_dir = course_dir_of(path)
+    for subject, subject_delta in delta['subjects'].items():
+        subject_path = os.path.join(course_dir, f'{subject}.json')
+        exists = os.path.exists(subject_path)
+        if (file_digest(subject_path) if exists else None) != subject_delta['base']:
+            raise ValueError(
+                f'{subject_path} is not the snapshot the changes were made from')
+        if subject_delta['hash'] is None:
+            os.remove(subject_path)
+            continue
+        if 'courses' in subject_delta:
+            courses = subject_delta['courses']
+        else:
+            courses = {course['code']: course for course in load_courses(
+                subject_path if exists else None)}
+            for code in subject_delta.get('removed', ()):
+                del courses[code]
+            for code, change in subject_delta.get('changed', {}).items():
+                courses[code] = apply_course(courses[code], change)
+            courses.update(subject_delta.get('added', {}))
+            courses = [courses[code]
+                       for code in subject_delta.get('order', courses)]
+        data = json.dumps(courses).encode()
+        if digest(data) != subject_delta['hash']:
+            raise ValueError(f'Applying the changes of {subject} gave a different file')
+        tmp_path = f'{subject_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, subject_path)
+    return len(delta['subjects'])
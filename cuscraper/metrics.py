@@ -0,0 +1,247 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Run metrics: latency & size of each kind of request, time spent in each parse stage, captcha
+# attempts per subject and errors by category. Exported as a JSON run report and a Prometheus
+# textfile (for node_exporter's textfile collector).
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Error lines of the parser log, by category
+LOG_ERRORS = [
+    (re.compile(r'Error parsing course info'), 'course_info'),
+    (re.compile(r'Error parsing course terms'), 'course_terms'),
+    (re.compile(r'Error parsing course details'), 'course_details'),
+    (re.compile(r'Error parsing course section'), 'course_section'),
+    (re.compile(r'Error parsing subject'), 'subject'),
+    (re.compile(r'Gave up \w+ after'), 'captcha_gave_up'),
+    (re.compile(r'Captcha pool failed'), 'captcha_pool'),
+]
+
+
+# Kind of a catalog request, from its url & form
+def request_kind(method: str, url: str, data=None) -> str:
+    if 'BuildCaptcha' in urlsplit(url).path:
+        return 'captcha'
+    if method.upper() == 'GET':
+        return 'search_page'
+    data = data if isinstance(data, dict) else {}
+    if 'btn_search' in data:
+        return 'search'
+    if 'btn_course_outcome' in data:
+        return 'outcome'
+    if 'uc_course$btn_class_section' in data:
+        return 'term_sections'
+    if '__EVENTTARGET' in data:
+        return 'course_detail'
+    return 'other'
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class StageTimer:
+    def __init__(self):
+        self.excluded = 0.0
+
+    @contextmanager
+    def paused(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.excluded += time.perf_counter() - start
+
+
+class Metrics:
+    # profile: cProfile the parse stages (in the thread that first enters one), trace_memory: peak
+    # traced memory per parse stage
+    def __init__(self, profile=False, trace_memory=False):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.latencies = {}
+        self.bytes = Counter()
+        self.parse_times = {}
+        self.memory_peaks = {}
+        self.captcha_attempts = {}
+        self.errors = Counter()
+        self.profiler = cProfile.Profile() if profile else None
+        self.profiling = False
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record_request(self, kind, latency, nbytes=0, error=None):
+        with self.lock:
+            self.latencies.setdefault(kind, []).append(latency)
+            self.bytes[kind] += nbytes
+            if error:
+                self.errors[f'{kind}:{error}'] += 1
+
+    def record_parse(self, stage, seconds):
+        with self.lock:
+            self.parse_times.setdefault(stage, []).append(seconds)
+
+    def record_captcha(self, subject, attempts, solved=True):
+        with self.lock:
+            self.captcha_attempts[subject] = {
+                'attempts': attempts, 'solved': solved}
+
+    def record_error(self, category):
+        with self.lock:
+            self.errors[category] += 1
+
+    # Hooked to the parser log, see LockedWriter
+    def record_log(self, line: str):
+        for pattern, category in LOG_ERRORS:
+            if pattern.match(line):
+                self.record_error(category)
+                return
+
+    # Times the block as a parse stage, excluding the time spent in timer.paused() blocks (e.g. requests)
+    @contextmanager
+    def parse_stage(self, stage):
+        timer = StageTimer()
+        profiling = False
+        if self.profiler:
+            with self.lock:
+                if not self.profiling:
+                    self.profiling = profiling = True
+            if profiling:
+                self.profiler.enable()
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            self.record_parse(stage, time.perf_counter() -
+                              start - timer.excluded)
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - start_memory
+                with self.lock:
+                    self.memory_peaks[stage] = max(
+                        self.memory_peaks.get(stage, 0), peak)
+            if profiling:
+                self.profiler.disable()
+                with self.lock:
+                    self.profiling = False
+
+    def report(self) -> dict:
+        with self.lock:
+            requests = {}
+            for kind, latencies in self.latencies.items():
+                latencies = sorted(latencies)
+                requests[kind] = {
+                    'count': len(latencies),
+                    'seconds': sum(latencies),
+                    'bytes': self.bytes[kind],
+                    'latency_p50': percentile(latencies, 0.5),
+                    'latency_p90': percentile(latencies, 0.9),
+                    'latency_p99': percentile(latencies, 0.99),
+                    'latency_max': latencies[-1],
+                }
+            parse = {}
+            for stage, times in self.parse_times.items():
+                parse[stage] = {
+                    'count': len(times),
+                    'seconds': sum(times),
+                    'mean': sum(times) / len(times),
+                    'max': max(times),
+                }
+                if stage in self.memory_peaks:
+                    parse[stage]['peak_memory_kb'] = self.memory_peaks[stage] / 1024
+            attempts = [v['attempts'] for v in self.captcha_attempts.values()]
+            return {
+                'started': self.started,
+                'seconds': time.time() - self.started,
+                'requests': requests,
+                'parse': parse,
+                'captcha': {
+                    'subjects': len(attempts),
+                    'attempts': sum(attempts),
+                    'attempts_per_subject': sum(attempts) / len(attempts) if attempts else 0,
+                    'gave_up': sum(not v['solved'] for v in self.captcha_attempts.values()),
+                    'by_subject': dict(self.captcha_attempts),
+                },
+                'errors': dict(self.errors),
+            }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    # Written to a temp file & renamed, so the textfile collector never reads a partial file
+    def write_prometheus(self, path):
+        lines = []
+
+        def metric(name, kind, help):
+            lines.append(f'# HELP cuscraper_{name} {help}')
+            lines.append(f'# TYPE cuscraper_{name} {kind}')
+
+        with self.lock:
+            metric('request_duration_seconds', 'histogram',
+                   'Latency of catalog requests by kind')
+            for kind, latencies in sorted(self.latencies.items()):
+                for le in LATENCY_BUCKETS:
+                    lines.append(
+                        f'cuscraper_request_duration_seconds_bucket{{kind="{kind}",le="{le}"}} {sum(x <= le for x in latencies)}')
+                lines.append(
+                    f'cuscraper_request_duration_seconds_bucket{{kind="{kind}",le="+Inf"}} {len(latencies)}')
+                lines.append(
+                    f'cuscraper_request_duration_seconds_sum{{kind="{kind}"}} {sum(latencies)}')
+                lines.append(
+                    f'cuscraper_request_duration_seconds_count{{kind="{kind}"}} {len(latencies)}')
+            metric('response_bytes_total', 'counter',
+                   'Response bytes by request kind')
+            for kind, nbytes in sorted(self.bytes.items()):
+                lines.append(
+                    f'cuscraper_response_bytes_total{{kind="{kind}"}} {nbytes}')
+            metric('parse_seconds_total', 'counter',
+                   'Time spent in each parse stage')
+            for stage, times in sorted(self.parse_times.items()):
+                lines.append(
+                    f'cuscraper_parse_seconds_total{{stage="{stage}"}} {sum(times)}')
+            metric('parse_calls_total', 'counter',
+                   'Calls of each parse stage')
+            for stage, times in sorted(self.parse_times.items()):
+                lines.append(
+                    f'cuscraper_parse_calls_total{{stage="{stage}"}} {len(times)}')
+            metric('captcha_attempts_total', 'counter',
+                   'Captcha attempts over all searched subjects')
+            lines.append(
+                f'cuscraper_captcha_attempts_total {sum(v["attempts"] for v in self.captcha_attempts.values())}')
+            metric('subjects_searched_total', 'counter',
+                   'Subjects searched, by captcha outcome')
+            solved = sum(v['solved'] for v in self.captcha_attempts.values())
+            lines.append(
+                f'cuscraper_subjects_searched_total{{result="solved"}} {solved}')
+            lines.append(
+                f'cuscraper_subjects_searched_total{{result="gave_up"}} {len(self.captcha_attempts) - solved}')
+            metric('errors_total', 'counter', 'Errors by category')
+            for category, n in sorted(self.errors.items()):
+                lines.append(
+                    f'cuscraper_errors_total{{category="{category}"}} {n}')
+            metric('run_start_timestamp_seconds', 'gauge',
+                   'Start of the run')
+            lines.append(f'cuscraper_run_start_timestamp_seconds {self.started}')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def write_profile(self, path):
+        if self.profiler:
+            self.profiler.dump_stats(path)
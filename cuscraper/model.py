@@ -0,0 +1,182 @@
+import datetime
+import json
+import sys
+from functools import lru_cache
+from .timetable import MINUTES_PER_DAY, format_minutes, to_minutes
+from .utils import get_term_sort_key
+
+# Compact in-memory form of the course files, for analytics over every term of every subject:
+#   courses = load_courses('data/1660000000/courses/CSCI.json')
+#   courses[0].terms['2022-23 Term 1']['--LEC (5000)'].start  # minute of week, Monday 9:30 -> 2010
+# Section times are minutes of the week (day * 1440 + minutes of the day), meeting dates are date
+# ordinals (the year taken from the term) and locations, instructors & keys are interned, so the
+# same room or name is a single string across the catalog. to_json() gives back the exact dict it
+# was built from, i.e. json.dumps of it is byte for byte the original. Values that don't have a
+# canonical form (e.g. 'TBA', '09:30', an unknown term) are kept as they are.
+
+SECTION_KEYS = ('startTimes', 'endTimes', 'days',
+                'locations', 'instructors', 'meetingDates')
+# Layouts (key order) of course records, shared by every course with the same keys
+_layouts = {}
+
+
+def parse_time(s, day):
+    if type(day) is not int or not isinstance(s, str):
+        return s
+    value = day_minutes(s)
+    return s if value is None else day * MINUTES_PER_DAY + value
+
+
+# The same few hundred times & dates repeat over the whole catalog, hence the caches
+@lru_cache(maxsize=None)
+def day_minutes(s):
+    value = to_minutes(s)
+    # Only if it prints back the same, e.g. not '09:30'
+    return value if value is not None and format_time(value) == s else None
+
+
+format_time = lru_cache(maxsize=None)(format_minutes)
+
+
+@lru_cache(maxsize=None)
+def term_years(term):
+    # Term 1 runs Sep-Dec of the first year, Term 2 & the summer session in the second one
+    key = get_term_sort_key(term) if isinstance(term, str) else None
+    if key is None:
+        return None
+    return key[0] if key[1] == 1 else key[0] + 1
+
+
+def parse_date(s, year):
+    if year is None or not isinstance(s, str):
+        return s
+    return date_ordinal(s, year)
+
+
+@lru_cache(maxsize=None)
+def date_ordinal(s, year):
+    day, sep, month = s.partition('/')
+    if not sep or not day.isdigit() or not month.isdigit():
+        return s
+    try:
+        ordinal = datetime.date(year, int(month), int(day)).toordinal()
+    except ValueError:
+        return s
+    return ordinal if format_date(ordinal) == s else s
+
+
+@lru_cache(maxsize=None)
+def format_date(ordinal) -> str:
+    return datetime.date.fromordinal(ordinal).strftime('%d/%m')
+
+
+def intern_all(values):
+    return tuple(sys.intern(value) if type(value) is str else value for value in values)
+
+
+class Section:
+    __slots__ = ('days', 'start', 'end', 'locations',
+                 'instructors', 'dates', 'raw')
+
+    # year: calendar year of the meeting dates, see term_years
+    def __init__(self, data: dict, year=None):
+        self.raw = None
+        if not isinstance(data, dict) or tuple(data) != SECTION_KEYS or not all(isinstance(data[key], list) for key in SECTION_KEYS) \
+                or not len(data['days']) == len(data['startTimes']) == len(data['endTimes']):
+            # Not a section as parse_sections writes it, kept as is
+            self.raw = data
+            self.days = self.start = self.end = self.locations = self.instructors = self.dates = ()
+            return
+        self.days = tuple(data['days'])
+        self.start = tuple(parse_time(s, day)
+                           for s, day in zip(data['startTimes'], self.days))
+        self.end = tuple(parse_time(s, day)
+                         for s, day in zip(data['endTimes'], self.days))
+        self.locations = intern_all(data['locations'])
+        self.instructors = intern_all(data['instructors'])
+        self.dates = tuple(parse_date(s, year) for s in data['meetingDates'])
+
+    def to_json(self) -> dict:
+        if self.raw is not None:
+            return self.raw
+        return {
+            'startTimes': [format_time(value - day * MINUTES_PER_DAY) if type(value) is int else value
+                           for value, day in zip(self.start, self.days)],
+            'endTimes': [format_time(value - day * MINUTES_PER_DAY) if type(value) is int else value
+                         for value, day in zip(self.end, self.days)],
+            'days': list(self.days),
+            'locations': list(self.locations),
+            'instructors': list(self.instructors),
+            'meetingDates': [format_date(value) if type(value) is int else value for value in self.dates],
+        }
+
+    # (start, end) minute of week, location & instructor of each timeslot with a known time
+    def meetings(self):
+        for start, end, location, instructor in zip(self.start, self.end, self.locations, self.instructors):
+            if type(start) is int and type(end) is int:
+                yield start, end, location, instructor
+
+    def __repr__(self):
+        return f'Section({self.to_json()!r})'
+
+
+class Course:
+    __slots__ = ('layout', 'values')
+
+    def __init__(self, data: dict):
+        layout = tuple(data)
+        self.layout = _layouts.setdefault(layout, intern_all(layout))
+        values = []
+        for key, value in data.items():
+            if key == 'terms' and isinstance(value, dict):
+                value = {sys.intern(term): {sys.intern(name): Section(section, term_years(term)) for name, section in sections.items()}
+                         if isinstance(sections, dict) else sections for term, sections in value.items()}
+            elif type(value) is str and len(value) < 64:
+                # Short values (units, grading, campus, ...) repeat across the catalog
+                value = sys.intern(value)
+            values.append(value)
+        self.values = tuple(values)
+
+    def __getitem__(self, key):
+        try:
+            return self.values[self.layout.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.layout
+
+    @property
+    def code(self):
+        return self['code']
+
+    @property
+    def terms(self) -> dict:
+        return self.get('terms', {})
+
+    def to_json(self) -> dict:
+        data = dict(zip(self.layout, self.values))
+        terms = data.get('terms')
+        if isinstance(terms, dict):
+            data['terms'] = {term: {name: section.to_json() for name, section in sections.items()}
+                             if isinstance(sections, dict) else sections for term, sections in terms.items()}
+        return data
+
+    def __repr__(self):
+        return f'Course({self.get("code")!r}, {self.get("title")!r})'
+
+
+def load_courses(path) -> list:
+    with open(path, 'r') as f:
+        return [Course(course) for course in json.load(f)]
+
+
+# What json.dump wrote for the courses, e.g. the {subject}.json the model was loaded from
+def dumps_courses(courses) -> str:
+    return json.dumps([course.to_json() for course in courses])
@@ -0,0 +1,311 @@
+from typing import TYPE_CHECKING, Callable, List, Optional
+import html as html_lib
+import importlib.util
+import re
+import time
+import traceback
+from .utils import parse_days_and_times, get_date_sort_key, get_term_sort_key
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# Page parsers shared by the sync, async & pipeline scrapers. They never touch the network,
+# follow-up pages are requested through the fetch callbacks passed in by the caller.
+
+# bs4 & lxml are only imported once a page is parsed
+DEFAULT_PARSER = 'lxml' if importlib.util.find_spec(
+    'lxml') else 'html.parser'
+
+INPUT_TAG_REGEX = re.compile(r"""<input\b(?:[^>"']|"[^"]*"|'[^']*')*>""", re.IGNORECASE)
+ATTRIBUTE_REGEX = re.compile(
+    r"""([^\s=/>"']+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+))""")
+OPTION_TAG_REGEX = re.compile(
+    r"""<option\b((?:[^>"']|"[^"]*"|'[^']*')*)>(.*?)(?=</option>|<option\b|$)""", re.IGNORECASE | re.DOTALL)
+
+
+def make_soup(html: str, parser: str = None) -> 'BeautifulSoup':
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, parser or DEFAULT_PARSER)
+
+
+# id -> value of every <input> in the page, in one pass over the raw html. Covers the
+# ASP.NET form state (__VIEWSTATE*, __EVENTVALIDATION, ...) and hidden fields like hf_Captcha
+def extract_form_state(html: str) -> dict:
+    form_state = {}
+    for tag in INPUT_TAG_REGEX.finditer(html):
+        attrs = {}
+        for m in ATTRIBUTE_REGEX.finditer(tag.group(), 6):
+            value = m.group(2) if m.group(2) is not None else m.group(
+                3) if m.group(3) is not None else m.group(4)
+            attrs.setdefault(m.group(1).lower(), value)
+        if 'id' in attrs and 'value' in attrs:
+            # Same as select_one, the first element with the id wins
+            form_state.setdefault(html_lib.unescape(
+                attrs['id']), html_lib.unescape(attrs['value']))
+    return form_state
+
+
+# value, text & selected flag of each option of a <select>, None if there's no such select
+def extract_select_options(html: str, id: str) -> Optional[List[dict]]:
+    select = re.search(r"""<select\b(?:[^>"']|"[^"]*"|'[^']*')*\bid=["']?{}["'\s>](?:[^>"']|"[^"]*"|'[^']*')*>(.*?)</select>""".format(
+        re.escape(id)), html, re.IGNORECASE | re.DOTALL)
+    if not select:
+        return None
+    options = []
+    for m in OPTION_TAG_REGEX.finditer(select.group(1)):
+        attrs = {}
+        for attr in ATTRIBUTE_REGEX.finditer(m.group(1)):
+            attrs.setdefault(attr.group(1).lower(), html_lib.unescape(next(
+                v for v in attr.groups()[1:] if v is not None)))
+        options.append({
+            'value': attrs.get('value'),
+            'text': html_lib.unescape(m.group(2)),
+            # also matches the bare attribute, i.e. <option selected value=...>
+            'selected': re.search(r'\bselected\b', re.sub(r""""[^"]*"|'[^']*'""", '', m.group(1)), re.IGNORECASE) is not None,
+        })
+    return options
+
+
+def course_event_target(i: int) -> str:
+    return 'gv_detail$ctl{}$lbtn_course_title'.format(f'0{i+2}' if i + 2 < 10 else str(i+2))
+
+
+# code & title of each course listed in the search result, None if there's no result table (e.g. wrong captcha)
+def parse_course_rows(soup: 'BeautifulSoup') -> Optional[List[dict]]:
+    course_detail_node = soup.select_one('#gv_detail')
+    if not course_detail_node:
+        return None
+    course_row_nodes = course_detail_node.findChildren(
+        'tr', recursive=False)
+    course_row_nodes.pop(0)  # remove the header node
+    course_rows = []
+    for row in course_row_nodes:
+        a_node = row.select('a')
+        course_rows.append({
+            'code': a_node[0].text,
+            'title': a_node[1].text,
+        })
+    return course_rows
+
+
+def parse_course_info(soup: 'BeautifulSoup') -> dict:
+    course_detail = {
+        'career': soup.select_one('#uc_course_lbl_acad_career').text,
+        'units': soup.select_one('#uc_course_lbl_units').text,
+        'grading': soup.select_one('#uc_course_lbl_grading_basis').text,
+        'components': soup.select_one('#uc_course_lbl_component').text,
+        'campus': soup.select_one('#uc_course_lbl_campus').text,
+        'academic_group': soup.select_one('#uc_course_lbl_acad_group').text,
+        'requirements': soup.select_one('#uc_course_tc_enrl_requirement'),
+        'description': soup.select_one('#uc_course_lbl_crse_descrlong').text,
+        'outcome': '',
+        'syllabus': '',
+        'required_readings': '',
+        'recommended_readings': '',
+    }
+    course_detail['requirements'] = course_detail['requirements'].get_text(
+        ';') if course_detail['requirements'] else ''
+    return course_detail
+
+
+def parse_term_options(soup: 'BeautifulSoup') -> list:
+    return soup.select_one(
+        '#uc_course_ddl_class_term').findChildren('option', recursive=False)
+
+
+# Fields filled in by parse_course_outcome, journaled together so a resumed run skips the outcome page
+OUTCOME_KEYS = ['outcome', 'syllabus', 'required_readings', 'recommended_readings', 'assessments']
+
+
+def parse_course_outcome(soup: 'BeautifulSoup', course_detail: dict):
+    course_detail.update({
+        'outcome': soup.select_one('#uc_course_outcome_lbl_learning_outcome').text,
+        'syllabus': soup.select_one('#uc_course_outcome_lbl_course_syllabus').text,
+        'required_readings': soup.select_one('#uc_course_outcome_lbl_req_reading').text,
+        'recommended_readings': soup.select_one('#uc_course_outcome_lbl_rec_reading').text,
+    })
+    assessment_nodes = soup.select_one('#uc_course_outcome_gv_ast').findChildren(
+        'tr', recursive=False)  # if no node, will raise error and return
+    assessment_nodes.pop(0)
+    assessments = {}
+    for tr in assessment_nodes:
+        td_nodes = tr.select('td')
+        assessments[td_nodes[1].text] = td_nodes[2].text
+    course_detail['assessments'] = assessments
+
+
+# What is known about a course before fetching it, any key may be missing:
+#   {'terms': {term: sections}, 'outcome': {field: value},        e.g. from a checkpoint journal
+#    'reuse_before': term, 'old_terms': {term: sections},         terms before reuse_before are taken from old_terms
+#    'refresh_term': term, 'old_course': course}                  only refresh_term is fetched, see refresh_course_detail
+# Returns (hit, sections), sections is None for a term the course is not offered in
+def cached_term_sections(cache: Optional[dict], term: str) -> tuple:
+    if not cache:
+        return False, None
+    if term in cache.get('terms', {}):
+        return True, cache['terms'][term]
+    if cache.get('refresh_term') is not None:
+        return term != cache['refresh_term'], cache['old_course'].get('terms', {}).get(term)
+    if cache.get('old_terms') is not None:
+        key, reuse_before = get_term_sort_key(
+            term), get_term_sort_key(cache['reuse_before'])
+        if key is not None and reuse_before is not None and key < reuse_before:
+            return True, cache['old_terms'].get(term)
+    return False, None
+
+
+# fetch_term(term_value) & fetch_outcome(first_term_value) return the soup of the requested page.
+# Pages already in the cache are not requested, and journal(record) is called with each newly parsed
+# {'term': term, 'sections': sections} & {'outcome': fields} so an interrupted run can resume from them
+def build_course_detail(course_id: str, soup: 'BeautifulSoup', fetch_term: Callable, fetch_outcome: Callable, log: Callable, cache: dict = None, journal: Callable = None) -> dict:
+    if cache and cache.get('refresh_term') is not None:
+        return refresh_course_detail(course_id, soup, fetch_term, log, cache, journal)
+    # Get general information about the course
+    try:
+        course_detail = parse_course_info(soup)
+    except AttributeError as e:
+        print('Error parsing information for this course')
+        log(f'Error parsing course info for {course_id}: {str(e)}\n')
+        log(traceback.format_exc())
+        return {}
+
+    # Get sections of the course
+    try:
+        term_selection_options = parse_term_options(soup)
+        terms = {}
+        offered = False
+        for term_node in term_selection_options:
+            hit, course_sections = cached_term_sections(cache, term_node.text)
+            if not hit:
+                if term_node.has_attr('selected'):
+                    course_sections = parse_sections(course_id, soup, log)
+                else:
+                    # schedule for non-default term needs another request
+                    course_sections = parse_sections(
+                        course_id, fetch_term(term_node['value']), log)
+                if journal:
+                    journal({'term': term_node.text,
+                            'sections': course_sections})
+            if course_sections:
+                offered = True
+                terms[term_node.text] = course_sections
+        if offered:
+            course_detail['terms'] = terms
+        # Get course outcome for the course
+        if cache and cache.get('outcome') is not None:
+            course_detail.update(cache['outcome'])
+        else:
+            parse_course_outcome(fetch_outcome(
+                term_selection_options[0]['value']), course_detail)
+            if journal:
+                journal({'outcome': {k: course_detail[k]
+                        for k in OUTCOME_KEYS}})
+    except AttributeError as e:
+        # Probably just missing some non-mandatory fields
+        log(f'Error parsing course terms for {course_id}: {str(e)}\n')
+        log(traceback.format_exc())
+    except Exception as e:
+        print('Error parsing section / outcome for this course')
+        log(f'Error parsing course details for {course_id}: {str(e)}\n')
+        log(traceback.format_exc())
+    return course_detail
+
+
+# The old course with only the sections of cache['refresh_term'] replaced (removed if not offered anymore),
+# every other field & term is kept as it is. Costs the detail page, plus the term's page if it isn't the default one
+def refresh_course_detail(course_id: str, soup: 'BeautifulSoup', fetch_term: Callable, log: Callable, cache: dict, journal: Callable = None) -> dict:
+    term = cache['refresh_term']
+    course = dict(cache['old_course'])
+    hit, sections = cached_term_sections({'terms': cache.get('terms', {})}, term)
+    if not hit:
+        try:
+            for term_node in parse_term_options(soup):
+                if term_node.text == term:
+                    sections = parse_sections(course_id, soup if term_node.has_attr('selected') else fetch_term(term_node['value']), log)
+                    break
+        except Exception as e:
+            # Kept as it was, better stale than gone
+            print('Error refreshing sections for this course')
+            log(f'Error refreshing sections of {course_id}: {str(e)}\n')
+            log(traceback.format_exc())
+            return course
+        if journal:
+            journal({'term': term, 'sections': sections})
+    terms = dict(course.get('terms', {}))
+    if sections:
+        terms[term] = sections
+    else:
+        terms.pop(term, None)
+    if terms:
+        course['terms'] = terms
+    else:
+        course.pop('terms', None)
+    return course
+
+
+# build_course_detail over pages fetched beforehand, pages = {'detail': html, 'terms': {term_value: html}, 'outcome': html}
+# where a failed request is kept as its exception. Returns the detail, log lines & parse time, so it can run in another process
+def parse_course_pages(course_id: str, pages: dict, parser: str = None, cache: dict = None) -> tuple:
+    start = time.perf_counter()
+    logs = []
+
+    def fetch(page):
+        if isinstance(page, BaseException):
+            raise page
+        return make_soup(page, parser)
+
+    course_detail = build_course_detail(
+        course_id, make_soup(pages['detail'], parser),
+        lambda term_value: fetch(pages['terms'][term_value]),
+        lambda term_value: fetch(pages['outcome']),
+        logs.append, cache)
+    return course_detail, logs, time.perf_counter() - start
+
+
+def parse_sections(course_id: str, soup: 'BeautifulSoup', log: Callable) -> dict:
+    course_sections = {}
+    course_sections_table_container = soup.select_one(
+        '#uc_course_gv_sched')
+    if not course_sections_table_container:
+        return None
+    course_sections_table = course_sections_table_container.findChildren(
+        'tr', recursive=False)
+    course_sections_table.pop(0)  # remove the header node
+    for schedule in course_sections_table:
+        try:
+            # schedule is a <tr> tag with 3 children, first is the section code, second is the reg status, last is course detail table
+            children = schedule.findChildren('td', recursive=False)
+            section = children[0].text.strip('\n')
+            start_times, end_times, days, locations, instructors, meeting_dates = [], [], [], [], [], []
+            # each tr is a teaching timeslot, e.g. Wed and Thu Lectures are two teaching timelot
+            timeslots = children[2].findChildren('tr')
+            for node in timeslots:
+                # 0: days & time 1: Room 2: Instructor 3: part of teaching date
+                details = list(filter(lambda x: x != '\n',
+                               node.get_text(';').split(';')))
+                days_and_times = parse_days_and_times(details[0])
+                meeting_dates.extend(details[3].split(', '))
+                # i.e. duplicated (meeting dates may not dup, so add before continue)
+                if days_and_times[0] in days and days_and_times[1] in start_times:
+                    continue
+                days.append(days_and_times[0])
+                start_times.append(days_and_times[1])
+                end_times.append(days_and_times[2])
+                locations.append(details[1])
+                instructors.append(details[2])
+            # split, dedup & sort dates
+            processed_meeting_dates = sorted(set(filter(None, meeting_dates)), key=get_date_sort_key)
+            course_sections[section] = {
+                'startTimes': start_times,
+                'endTimes': end_times,
+                'days': days,
+                'locations': locations,
+                'instructors': instructors,
+                'meetingDates': processed_meeting_dates,
+            }
+        except Exception as e:
+            # Probably just missing some non-mandatory fields
+            log(f'Error parsing course section for {course_id}: {str(e)}\n')
+            log(traceback.format_exc())
+
+    return course_sections
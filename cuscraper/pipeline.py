@@ -0,0 +1,245 @@
+import os
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from . import CourseScraper, FLUSH
+from .parsing import cached_term_sections, course_event_target, extract_form_state, extract_select_options, make_soup, parse_course_pages, parse_course_rows
+
+_STOP = object()
+
+
+# fetch -> parse -> write stages connected by bounded queues. The caller thread(s) fetch raw pages,
+# a dispatcher hands them to a process pool of parsers, and a writer assembles & saves each subject.
+# The first error of the dispatcher or the writer stops the pipeline: later pages are drained without
+# being saved (so fetchers never block on a dead stage), unfinished subjects are discarded and join()
+# raises it. A fetcher failing mid-subject aborts that subject only.
+class ParsePipeline:
+    def __init__(self, scraper, parse_workers=None, queue_size=64):
+        self.scraper = scraper
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.running = False
+        self.error = None
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.page_queue = queue.Queue(maxsize=self.queue_size)
+            self.parsed_queue = queue.Queue(maxsize=self.queue_size)
+            self.subjects = {}
+            self.pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+            # Start the parser processes before any pipeline thread exists
+            self.pool.submit(int).result()
+            self.dispatcher = threading.Thread(
+                target=self.dispatch, daemon=True)
+            self.writer = threading.Thread(target=self.write, daemon=True)
+            self.dispatcher.start()
+            self.writer.start()
+            self.running = True
+
+    # Blocks when the parsers fall behind, so fetchers never hold more than queue_size pages
+    def put_subject(self, subject, num_courses, save):
+        self.start()
+        self.check()
+        self.page_queue.put(('subject', subject, num_courses, save))
+
+    # pages=None for a course resumed from the checkpoint journal, i.e. nothing to parse
+    def put_course(self, subject, course, pages, cache=None):
+        self.check()
+        self.page_queue.put(('course', subject, course, pages, cache))
+
+    # The subject won't get all its courses (e.g. a request failed), its partial file is removed
+    def abort_subject(self, subject):
+        self.page_queue.put(('abort', subject))
+
+    # Stops fetching once a later stage failed, the error itself is raised by join()
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError('Parse pipeline failed') from self.error
+
+    def fail(self, e):
+        if self.error is None:
+            self.error = e
+
+    def dispatch(self):
+        while True:
+            item = self.page_queue.get()
+            if item is _STOP:
+                self.parsed_queue.put(_STOP)
+                return
+            if item[0] == 'course' and self.error is None:
+                _, subject, course, pages, cache = item
+                try:
+                    future = None if pages is None else self.pool.submit(
+                        parse_course_pages, subject + course['code'], pages, self.scraper.parser, cache)
+                except BaseException as e:
+                    self.fail(e)
+                    continue
+                item = ('course', subject, course, future)
+            self.parsed_queue.put(item)
+
+    def write(self):
+        while True:
+            item = self.parsed_queue.get()
+            if item is _STOP:
+                return
+            try:
+                self.write_item(item)
+            except BaseException as e:
+                self.fail(e)
+            del item
+
+    def write_item(self, item):
+        kind, subject = item[0], item[1]
+        if kind == 'abort':
+            entry = self.subjects.pop(subject, None)
+            if entry:
+                entry['writer'].discard()
+            return
+        if self.error is not None:
+            # Drained, unfinished subjects are discarded by join()
+            if kind == 'course' and item[3] is not None:
+                item[3].cancel()
+            return
+        if kind == 'subject':
+            _, subject, num_courses, save = item
+            self.subjects[subject] = {
+                'num_courses': num_courses, 'save': save, 'writer': self.scraper.subject_writer(subject, save)}
+        else:
+            _, subject, course, future = item
+            if future is not None:
+                course = self.collect(subject, course, future)
+            self.subjects[subject]['writer'].write(course)
+        entry = self.subjects[subject]
+        if len(entry['writer']) == entry['num_courses']:
+            del self.subjects[subject]
+            try:
+                self.scraper.save_subject_courses(
+                    subject, entry['writer'], entry['save'])
+            finally:
+                entry['writer'].discard()
+
+    def collect(self, subject, course, future) -> dict:
+        try:
+            course_detail, logs, seconds = future.result()
+            self.scraper.metrics.record_parse('course_detail', seconds)
+            course = {**course, **course_detail}
+            for line in logs:
+                self.scraper.log_file.write(line)
+        except Exception as e:
+            print(f'Error parsing {subject}{course["code"]} in parser process')
+            self.scraper.log_file.write(
+                f'Error parsing course details for {subject}{course["code"]}: {str(e)}\n')
+            self.scraper.log_file.write(traceback.format_exc())
+        if self.scraper.journal:
+            self.scraper.journal.record_course(subject, course)
+        return course
+
+    # Wait until every fetched page is parsed & saved, raises the error that stopped the pipeline if any
+    def join(self):
+        with self.lock:
+            if not self.running:
+                return
+            self.page_queue.put(_STOP)
+            self.dispatcher.join()
+            self.writer.join()
+            self.pool.shutdown()
+            for entry in self.subjects.values():
+                entry['writer'].discard()
+            self.subjects = {}
+            self.running = False
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+
+class PipelineCourseScraper(CourseScraper):
+    def __init__(self, *args, parse_workers=None, queue_size=64, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Shared with parallel workers spawned from this scraper
+        self.pipeline = ParsePipeline(self, parse_workers, queue_size)
+        self.in_batch = False
+
+    def parse_all(self, *args, **kwargs):
+        self.pipeline.start()
+        self.in_batch = True
+        try:
+            return super().parse_all(*args, **kwargs)
+        finally:
+            self.in_batch = False
+            self.pipeline.join()
+
+    def search_subject(self, subject, save=True, manual=False):
+        try:
+            return super().search_subject(subject, save, manual)
+        finally:
+            if not self.in_batch:
+                self.pipeline.join()
+
+    def post_processing(self, stat=False, courses: dict = None):
+        self.pipeline.join()
+        super().post_processing(stat, courses)
+
+    # Fetch stage: only the lightweight extractors run here, page parsing is left to the pool
+    def parse_subject_courses(self, subject, html, save):
+        with self.metrics.parse_stage('course_rows'):
+            self.update_form(html)
+            course_rows = parse_course_rows(make_soup(html, self.parser))
+        if course_rows is None:
+            return False
+        print(f'Found {len(course_rows)} courses under subject {subject}')
+        self.pipeline.put_subject(subject, len(course_rows), save)
+        caches = self.course_caches(subject)
+        try:
+            for i, course in enumerate(course_rows):
+                cache = caches.get(course['code'], {})
+                if cache.get('course'):
+                    self.pipeline.put_course(subject, cache['course'], None)
+                    continue
+                sys.stdout.write('{}Fetching #{} for {}{} {}'.format(
+                    FLUSH, i + 1, subject, course['code'], course['title']))
+                form_body = {
+                    '__EVENTTARGET': course_event_target(i),
+                }
+                form_body.update(self.form_body)
+                self.pipeline.put_course(
+                    subject, course, self.fetch_course_pages(self.post_page(form_body), cache), cache)
+        except BaseException:
+            self.pipeline.abort_subject(subject)
+            raise
+        return True
+
+    def post_page(self, form) -> str:
+        with closing(self.sess.post(self.course_url, headers=self.headers, data=form)) as res:
+            return res.text
+
+    # Every page build_course_detail may ask for, failed forms are kept as exceptions
+    def fetch_course_pages(self, html, cache=None) -> dict:
+        pages = {'detail': html, 'terms': {}}
+        term_options = extract_select_options(
+            html, 'uc_course_ddl_class_term')
+        if not term_options:
+            return pages
+        form_state = extract_form_state(html)
+        for option in term_options:
+            if not option['selected'] and not cached_term_sections(cache, option['text'])[0]:
+                try:
+                    form = self.term_form(form_state, option['value'])
+                except Exception as e:
+                    pages['terms'][option['value']] = e
+                    continue
+                pages['terms'][option['value']] = self.post_page(form)
+        if cache and cache.get('outcome') is not None:
+            return pages
+        try:
+            form = self.outcome_form(form_state, term_options[0]['value'])
+        except Exception as e:
+            pages['outcome'] = e
+        else:
+            pages['outcome'] = self.post_page(form)
+        return pages
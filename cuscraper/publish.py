@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+# Bundle of the files the frontend downloads, minified with precompressed siblings so the CDN serves
+# them as they are instead of compressing on every cache miss:
+#   publish/<relpath>.json, .json.gz & .json.br (if brotli is installed) of courses/, derived/ & resources/
+#   publish/manifest.json: {relpath: {'hash', 'etag', 'bytes', 'gzip_bytes', 'br_bytes'}}
+# Output is deterministic (gzip without mtime), so an unchanged file keeps its hash & ETag across runs,
+# and its compressed files are copied from the previous bundle instead of compressed again.
+#   publish_snapshot('data/1660000000', previous='../data/publish')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PUBLISH_DIRS = ['courses', 'derived', 'resources']
+MANIFEST_FILE = 'manifest.json'
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+# Minified, non-ASCII left as UTF-8 like orjson does, so both backends give the same bytes for our files
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def load_manifest(dirname) -> dict:
+    try:
+        with open(os.path.join(dirname, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_file(path, data: bytes):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def relpaths(snapshot_dir) -> list:
+    paths = []
+    for dirname in PUBLISH_DIRS:
+        try:
+            with os.scandir(os.path.join(snapshot_dir, dirname)) as it:
+                paths += sorted(f'{dirname}/{entry.name}' for entry in it
+                                if entry.is_file() and entry.name.endswith('.json'))
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+# Compressed sibling of the file, from the previous bundle when the content is the same
+def publish_compressed(path, data, suffix, compress, previous_path):
+    if previous_path and os.path.exists(previous_path + suffix):
+        shutil.copyfile(previous_path + suffix, path + suffix)
+    else:
+        write_file(path + suffix, compress(data))
+    return os.path.getsize(path + suffix)
+
+
+# Returns the manifest. previous: a bundle from an earlier run, e.g. <merge_dir>/publish
+def publish_snapshot(snapshot_dir, publish_dir=None, previous=None) -> dict:
+    publish_dir = publish_dir or os.path.join(snapshot_dir, 'publish')
+    previous_manifest = load_manifest(previous) if previous else {}
+    manifest = {}
+    for relpath in relpaths(snapshot_dir):
+        with open(os.path.join(snapshot_dir, relpath), 'r') as f:
+            data = dumps(json.load(f))
+        h = content_hash(data)
+        path = os.path.join(publish_dir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file(path, data)
+        previous_path = os.path.join(previous, relpath) if previous_manifest.get(
+            relpath, {}).get('hash') == h else None
+        entry = manifest[relpath] = {'hash': h, 'etag': f'"{h}"', 'bytes': len(data)}
+        entry['gzip_bytes'] = publish_compressed(path, data, '.gz', lambda data: gzip.compress(
+            data, compresslevel=GZIP_LEVEL, mtime=0), previous_path)
+        if brotli is not None:
+            entry['br_bytes'] = publish_compressed(path, data, '.br', lambda data: brotli.compress(
+                data, quality=BROTLI_QUALITY), previous_path)
+    write_file(os.path.join(publish_dir, MANIFEST_FILE), json.dumps(manifest, indent=1).encode())
+    return manifest
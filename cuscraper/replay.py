@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from .metrics import request_kind
+from .transport import ScraperSession
+
+# Record every request made through the scraper session into an on-disk corpus, and serve it back
+# offline, either in-process (ReplaySession) or over HTTP (serve) for a scraper with a local base_url.
+#
+# Corpus layout:
+#   index.jsonl     one line per response: method, path, key, status, content_type, file
+#   responses/      raw response bodies (html pages & captcha images)
+
+
+def request_path(url: str) -> str:
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+# Requests are matched by method, path (host excluded) & form body, regardless of field order
+def request_key(method: str, url: str, data=None) -> str:
+    if isinstance(data, (str, bytes)):
+        data = parse_qsl(data.decode() if isinstance(data, bytes)
+                         else data, keep_blank_values=True)
+    elif isinstance(data, dict):
+        data = [(k, v) for k, v in data.items() if v is not None]
+    body = urlencode(sorted(data or []))
+    return hashlib.sha1(f'{method.upper()} {request_path(url)}\n{body}'.encode()).hexdigest()
+
+
+class Corpus:
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.index_path = os.path.join(dirname, 'index.jsonl')
+        self.responses_dir = os.path.join(dirname, 'responses')
+        self.entries = {}
+        self.cursors = {}
+        self.num_entries = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.responses_dir, exist_ok=True)
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry['key'], []).append(entry)
+                    self.num_entries += 1
+
+    def add(self, method, url, data, res: requests.Response):
+        key = request_key(method, url, data)
+        with self.lock:
+            filename = f'{self.num_entries:07d}'
+            self.num_entries += 1
+            with open(os.path.join(self.responses_dir, filename), 'wb') as f:
+                f.write(res.content)
+            entry = {
+                'method': method.upper(),
+                'path': request_path(url),
+                'key': key,
+                'status': res.status_code,
+                'content_type': res.headers.get('Content-Type', ''),
+                'file': filename,
+            }
+            self.entries.setdefault(key, []).append(entry)
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    # Identical requests (e.g. the search page GET) get their recorded responses in order, then the last one again
+    def get(self, method, url, data=None) -> dict:
+        key = request_key(method, url, data)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            entries = self.entries[key]
+            cursor = self.cursors.get(key, 0)
+            self.cursors[key] = cursor + 1
+            return entries[min(cursor, len(entries) - 1)]
+
+    def read(self, entry) -> bytes:
+        with open(os.path.join(self.responses_dir, entry['file']), 'rb') as f:
+            return f.read()
+
+
+class RecordingSession(ScraperSession):
+    def __init__(self, corpus: Corpus, limiter=None, **kwargs):
+        super().__init__(limiter, **kwargs)
+        self.corpus = corpus
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        res = super().request(method, url, params=params, data=data, **kwargs)
+        self.corpus.add(method, res.url if params else url, data, res)
+        return res
+
+
+class ReplaySession(ScraperSession):
+    def __init__(self, corpus: Corpus, limiter=None, latency=0, metrics=None):
+        super().__init__(limiter, metrics=metrics)
+        self.corpus = corpus
+        self.latency = latency
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if self.limiter:
+            self.limiter.wait()
+        start = time.monotonic()
+        if params:
+            url = requests.Request(method, url, params=params).prepare().url
+        entry = self.corpus.get(method, url, data)
+        if entry is None:
+            raise KeyError(
+                f'No recorded response for {method} {request_path(url)}')
+        if self.latency:
+            time.sleep(self.latency)
+        res = requests.Response()
+        res.status_code = entry['status']
+        res.headers['Content-Type'] = entry['content_type']
+        res.encoding = requests.utils.get_encoding_from_headers(
+            res.headers) or 'utf-8'
+        res.url = url
+        res._content = self.corpus.read(entry)
+        res._content_consumed = True
+        if self.metrics:
+            self.metrics.record_request(request_kind(
+                method, url, data), time.monotonic() - start, len(res._content))
+        return res
+
+
+# Local stand-in for the course catalog server, point the scraper at it with CourseScraper(base_url=...)
+def serve(corpus_dir, host='127.0.0.1', port=8000, latency=0):
+    corpus = Corpus(corpus_dir)
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, data=None):
+            entry = corpus.get(self.command, self.path, data)
+            if latency:
+                time.sleep(latency)
+            if entry is None:
+                self.send_error(404, 'No recorded response')
+                return
+            content = corpus.read(entry)
+            self.send_response(entry['status'])
+            self.send_header('Content-Type', entry['content_type'])
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self.respond()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.respond(self.rfile.read(length))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'Serving {corpus.num_entries} recorded responses at http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve a recorded corpus as a local stand-in of the course catalog server')
+    parser.add_argument('corpus_dir')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='artificial latency per response in seconds')
+    args = parser.parse_args()
+    serve(args.corpus_dir, args.host, args.port, args.latency)
@@ -0,0 +1,183 @@
+import json
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+# Inverted index over the text fields of every course, saved by generate_stat as
+# derived/search_index.json for the frontend to ship:
+#   {'docs': [course id], 'terms': {token: [doc id gap, score, doc id gap, score, ...]}}
+# Scores are BM25 over the fields (title counting FIELD_WEIGHTS['title'] times), in 1/SCORE_SCALE
+# steps from 1 to 255, so a query is the sum of the scores of its tokens. The file is kept under
+# max_bytes by capping postings per token and then dropping the lowest scores.
+#   index = SearchIndex.load('data/1660000000/derived/search_index.json')
+#   index.search('machine learn', prefix=True)
+
+FIELD_WEIGHTS = {
+    'title': 3,
+    'description': 1,
+    'outcome': 1,
+    'syllabus': 1,
+    'requirements': 1,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SCORE_SCALE = 16
+MAX_SCORE = 255
+MAX_POSTINGS = 2000
+MAX_BYTES = 4 * 1024 * 1024
+STOPWORDS = set('''a an and are as at be by for from has have in is it its of on or that the this to was were
+will with which their they these those into such can may also other than each all any not no both
+students student course courses'''.split())
+TAG_REGEX = re.compile(r'<[^>]*>')
+TOKEN_REGEX = re.compile(r'[a-z0-9]+')
+
+
+# Lowercase words & numbers without stopwords, with a light plural stripping (queries go through
+# the same, so 'networks' finds 'network')
+def tokenize(text: str) -> list:
+    tokens = []
+    for token in TOKEN_REGEX.findall(TAG_REGEX.sub(' ', text).lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class SearchIndexBuilder:
+    def __init__(self, max_postings=MAX_POSTINGS, max_bytes=MAX_BYTES):
+        self.max_postings = max_postings
+        self.max_bytes = max_bytes
+        self.docs = []
+        self.lengths = []
+        self.postings = {}
+
+    # Each subject is tokenised as it comes, only (doc id, weighted term frequency) is kept
+    def add(self, subject, courses):
+        for course in courses:
+            frequencies = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = course.get(field)
+                if isinstance(value, str):
+                    for token in tokenize(value):
+                        frequencies[token] += weight
+            if not frequencies:
+                continue
+            doc_id = len(self.docs)
+            self.docs.append(subject + course['code'])
+            self.lengths.append(sum(frequencies.values()))
+            for token, frequency in frequencies.items():
+                self.postings.setdefault(token, []).append((doc_id, frequency))
+
+    def scores(self) -> dict:
+        num_docs = len(self.docs)
+        average_length = sum(self.lengths) / num_docs if num_docs else 0
+        scores = {}
+        for token, postings in self.postings.items():
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[token] = [(doc_id, idf * frequency * (BM25_K1 + 1) / (
+                frequency + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / average_length))) for doc_id, frequency in postings]
+        return scores
+
+    def result(self) -> 'SearchIndex':
+        scores = self.scores()
+        terms = {}
+        for token, postings in scores.items():
+            if len(postings) > self.max_postings:
+                postings = sorted(postings, key=lambda posting: -posting[1])[:self.max_postings]
+                postings.sort()
+            terms[token] = [(doc_id, min(MAX_SCORE, max(1, round(score * SCORE_SCALE))))
+                            for doc_id, score in postings]
+        index = SearchIndex(self.docs, terms)
+        if self.max_bytes:
+            index = index.bounded(self.max_bytes)
+        return index
+
+
+class SearchIndex:
+    # terms: {token: [(doc id, score)]} sorted by doc id
+    def __init__(self, docs: list, terms: dict):
+        self.docs = docs
+        self.terms = terms
+        self.tokens = sorted(terms)
+
+    @classmethod
+    def load(cls, path) -> 'SearchIndex':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        terms = {}
+        for token, flat in data['terms'].items():
+            postings, doc_id = [], 0
+            for i in range(0, len(flat), 2):
+                doc_id += flat[i]
+                postings.append((doc_id, flat[i + 1]))
+            terms[token] = postings
+        return cls(data['docs'], terms)
+
+    def to_json(self, min_score=0) -> dict:
+        terms = {}
+        for token, postings in self.terms.items():
+            flat, last = [], 0
+            for doc_id, score in postings:
+                if score >= min_score:
+                    flat += [doc_id - last, score]
+                    last = doc_id
+            if flat:
+                terms[token] = flat
+        return {'docs': self.docs, 'terms': terms}
+
+    def dumps(self, min_score=0) -> str:
+        return json.dumps(self.to_json(min_score), separators=(',', ':'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            f.write(self.dumps())
+
+    # The same index without the lowest scores needed to fit max_bytes
+    def bounded(self, max_bytes) -> 'SearchIndex':
+        if len(self.dumps()) <= max_bytes:
+            return self
+        lo, hi = 1, MAX_SCORE + 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(self.dumps(mid)) <= max_bytes:
+                hi = mid
+            else:
+                lo = mid + 1
+        terms = {token: kept for token, kept in (
+            (token, [posting for posting in postings if posting[1] >= lo]) for token, postings in self.terms.items()) if kept}
+        return SearchIndex(self.docs, terms)
+
+    # Tokens of the index starting with prefix
+    def expand(self, prefix) -> list:
+        i = bisect_left(self.tokens, prefix)
+        tokens = []
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            tokens.append(self.tokens[i])
+            i += 1
+        return tokens
+
+    # [(course id, score)] best first. prefix: the last word may be incomplete, e.g. while typing
+    def search(self, query: str, limit=20, prefix=False) -> list:
+        query = query.lower()
+        last = None
+        if prefix:
+            # Taken as typed, e.g. 'the' is the start of 'theory' rather than a stopword
+            words = list(TOKEN_REGEX.finditer(query))
+            if words:
+                last = words[-1].group()
+                query = query[:words[-1].start()]
+        scores = Counter()
+        for token in tokenize(query):
+            for doc_id, score in self.terms.get(token, ()):
+                scores[doc_id] += score
+        if last:
+            # Best of the completions, so a short prefix doesn't outweigh whole words
+            best = {}
+            for completion in self.expand(last):
+                for doc_id, score in self.terms[completion]:
+                    best[doc_id] = max(best.get(doc_id, 0), score)
+            scores.update(best)
+        return [(self.docs[doc_id], score) for doc_id, score in scores.most_common(limit)]
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from .utils import subject_paths
+
+# Content-addressed store of data/<timestamp> snapshots. Course records (with their sections replaced
+# by references) and sections are stored once by hash, zlib-compressed, so the courses that didn't
+# change since the last run (most of them) cost nothing. A snapshot is only a manifest:
+#   {'subjects': {subject: [course hash]}, 'subject_files': {subject: file hash}, 'files': {path: file hash}}
+# where subject_files keeps the few {subject}.json that can't be rebuilt byte for byte from their
+# courses (e.g. written by another tool), and files the other outputs: derived/, resources/, the
+# publish/ bundle & catalog.sqlite.
+# Files are re-materialised on read, one at a time, under <store>/materialized/<name>/.
+#   store = SnapshotStore('store')
+#   store.put_snapshot('data/1660000000')
+#   store.snapshot('latest').path('courses/CSCI.json')
+
+SNAPSHOT_FILE_DIRS = ['derived', 'resources', 'publish']
+SNAPSHOT_FILES = ['catalog.sqlite']
+QUERY_BATCH = 500
+
+
+def object_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def encode(value) -> bytes:
+    return json.dumps(value).encode()
+
+
+# (relpath, path) of the files of a data/<timestamp> dir stored besides the courses, sorted
+def snapshot_files(snapshot_dir) -> list:
+    files = [(filename, os.path.join(snapshot_dir, filename)) for filename in SNAPSHOT_FILES
+             if os.path.isfile(os.path.join(snapshot_dir, filename))]
+    for dirname in SNAPSHOT_FILE_DIRS:
+        for root, _, filenames in os.walk(os.path.join(snapshot_dir, dirname)):
+            for filename in filenames:
+                if not filename.endswith('.tmp'):
+                    path = os.path.join(root, filename)
+                    files.append((os.path.relpath(path, snapshot_dir).replace(os.sep, '/'), path))
+    return sorted(files)
+
+
+class SnapshotStore:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        # Shared by the scraper's parallel workers
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(
+            path, 'store.sqlite'), check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, data BLOB NOT NULL)')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots (name TEXT PRIMARY KEY, created REAL NOT NULL, manifest BLOB NOT NULL)')
+
+    def close(self):
+        self.db.close()
+
+    # hash -> bytes, returns the number of objects that weren't stored yet
+    def put_objects(self, objects: dict) -> int:
+        with self.lock, self.db:
+            before = self.db.total_changes
+            self.db.executemany('INSERT OR IGNORE INTO objects VALUES (?, ?)',
+                                [(h, zlib.compress(data)) for h, data in objects.items() if not self.has_object(h)])
+            return self.db.total_changes - before
+
+    def has_object(self, h) -> bool:
+        return self.db.execute('SELECT 1 FROM objects WHERE hash = ?', (h,)).fetchone() is not None
+
+    def get_objects(self, hashes) -> dict:
+        hashes = list(set(hashes))
+        objects = {}
+        with self.lock:
+            for i in range(0, len(hashes), QUERY_BATCH):
+                batch = hashes[i:i + QUERY_BATCH]
+                for h, data in self.db.execute(
+                        f'SELECT hash, data FROM objects WHERE hash IN ({",".join("?" * len(batch))})', batch):
+                    objects[h] = zlib.decompress(data)
+        missing = set(hashes) - objects.keys()
+        if missing:
+            raise KeyError(f'{len(missing)} objects missing from the store, e.g. {next(iter(missing))}')
+        return objects
+
+    # Stores the course & its sections into objects, returns the hash of the course record
+    @staticmethod
+    def split_course(course: dict, objects: dict) -> str:
+        record = course
+        if isinstance(course.get('terms'), dict):
+            record = dict(course)
+            record['terms'] = {}
+            for term, sections in course['terms'].items():
+                refs = record['terms'][term] = {}
+                for name, section in sections.items():
+                    data = encode(section)
+                    refs[name] = h = object_hash(data)
+                    objects[h] = data
+        data = encode(record)
+        h = object_hash(data)
+        objects[h] = data
+        return h
+
+    # Store every file of a data/<timestamp> dir as snapshot `name` (the dir name by default)
+    def put_snapshot(self, snapshot_dir, name=None) -> dict:
+        name = name or os.path.basename(os.path.normpath(snapshot_dir))
+        manifest = {'subjects': {}, 'subject_files': {}, 'files': {}}
+        stats = {'name': name, 'subjects': 0, 'objects': 0,
+                 'new_objects': 0, 'bytes': 0}
+        course_dir = os.path.join(snapshot_dir, 'courses')
+        for subject, path in sorted(subject_paths(course_dir).items()):
+            with open(path, 'rb') as f:
+                data = f.read()
+            objects = {}
+            courses = json.loads(data)
+            hashes = [self.split_course(course, objects) for course in courses]
+            if encode(courses) == data:
+                manifest['subjects'][subject] = hashes
+            else:
+                objects = {object_hash(data): data}
+                manifest['subject_files'][subject] = object_hash(data)
+            # Stored per subject, so memory is bounded by one subject
+            stats['objects'] += len(objects)
+            stats['new_objects'] += self.put_objects(objects)
+            stats['subjects'] += 1
+            stats['bytes'] += len(data)
+        for relpath, path in snapshot_files(snapshot_dir):
+            with open(path, 'rb') as f:
+                data = f.read()
+            h = manifest['files'][relpath] = object_hash(data)
+            stats['objects'] += 1
+            stats['new_objects'] += self.put_objects({h: data})
+            stats['bytes'] += len(data)
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)',
+                            (name, time.time(), zlib.compress(encode(manifest))))
+        # Files materialised from an older version of the snapshot are stale
+        shutil.rmtree(os.path.join(self.path, 'materialized', name), ignore_errors=True)
+        return stats
+
+    # Names of the stored snapshots, oldest first
+    def snapshots(self) -> list:
+        with self.lock:
+            return [name for name, in self.db.execute('SELECT name FROM snapshots ORDER BY created')]
+
+    def has_snapshot(self, name) -> bool:
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM snapshots WHERE name = ?', (name,)).fetchone() is not None
+
+    # 'latest' for the last stored one
+    def snapshot(self, name='latest') -> 'Snapshot':
+        with self.lock:
+            if name == 'latest':
+                row = self.db.execute(
+                    'SELECT name, manifest FROM snapshots ORDER BY created DESC LIMIT 1').fetchone()
+            else:
+                row = self.db.execute(
+                    'SELECT name, manifest FROM snapshots WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise KeyError(f'No snapshot {name} in {self.path}')
+        return Snapshot(self, row[0], json.loads(zlib.decompress(row[1])))
+
+
+class Snapshot:
+    def __init__(self, store: SnapshotStore, name, manifest: dict):
+        self.store = store
+        self.name = name
+        self.manifest = manifest
+        # Where files are materialised, laid out like data/<timestamp>
+        self.dirname = os.path.join(store.path, 'materialized', name)
+        self.lock = threading.Lock()
+
+    def subjects(self) -> list:
+        return sorted(set(self.manifest['subjects']) | set(self.manifest['subject_files']))
+
+    def load(self, subject) -> list:
+        return json.loads(self.read(f'courses/{subject}.json'))
+
+    def build_courses(self, course_hashes) -> list:
+        records = {h: json.loads(data) for h, data in self.store.get_objects(
+            course_hashes).items()}
+        section_hashes = [ref for record in records.values() if isinstance(record.get('terms'), dict)
+                          for sections in record['terms'].values() for ref in sections.values()]
+        sections = self.store.get_objects(section_hashes)
+        courses = []
+        for h in course_hashes:
+            course = dict(records[h])
+            if isinstance(course.get('terms'), dict):
+                course['terms'] = {term: {name: json.loads(sections[ref]) for name, ref in refs.items()}
+                                   for term, refs in course['terms'].items()}
+            courses.append(course)
+        return courses
+
+    # Content of a file of the snapshot, e.g. courses/CSCI.json or resources/instructors.json
+    def read(self, relpath) -> bytes:
+        relpath = relpath.replace(os.sep, '/')
+        dirname, filename = os.path.split(relpath)
+        if dirname == 'courses' and filename.endswith('.json'):
+            subject = filename[:-5]
+            if subject in self.manifest['subjects']:
+                return encode(self.build_courses(self.manifest['subjects'][subject]))
+            if subject in self.manifest['subject_files']:
+                h = self.manifest['subject_files'][subject]
+                return self.store.get_objects([h])[h]
+        elif relpath in self.manifest['files']:
+            h = self.manifest['files'][relpath]
+            return self.store.get_objects([h])[h]
+        raise FileNotFoundError(f'{relpath} is not in snapshot {self.name}')
+
+    # Path of the file, materialised on first access. Raises FileNotFoundError like open() would
+    def path(self, relpath) -> str:
+        path = os.path.join(self.dirname, relpath)
+        if os.path.exists(path):
+            return path
+        data = self.read(relpath)
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        return path
+
+    def relpaths(self) -> list:
+        return [f'courses/{subject}.json' for subject in self.subjects()] + sorted(self.manifest['files'])
+
+    # Every file (that isn't there yet) into dirname, e.g. data/<timestamp>, or only those under prefix, e.g. 'publish/'
+    def materialize(self, dirname=None, prefix='') -> str:
+        dirname = dirname or self.dirname
+        for relpath in self.relpaths():
+            if not relpath.startswith(prefix):
+                continue
+            path = os.path.join(dirname, relpath)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(self.read(relpath))
+                os.replace(tmp_path, path)
+        return dirname
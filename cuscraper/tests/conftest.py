@@ -0,0 +1,26 @@
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.benchmarks.fixtures import CatalogFixture, FixtureSession
+
+# Scrapers under test run in a temp dir against a CatalogFixture instead of the network
+
+
+@pytest.fixture
+def catalog_fixture():
+    return CatalogFixture(num_subjects=2, courses_per_subject=3)
+
+
+@pytest.fixture
+def make_scraper(tmp_path, monkeypatch, catalog_fixture):
+    monkeypatch.chdir(tmp_path)
+
+    def make(cls=CourseScraper, fixture=None, **kwargs):
+        fixture = fixture or catalog_fixture
+        kwargs.setdefault('timestamp', 't')
+        kwargs.setdefault('merge_dir', 'nomerge')
+        scraper = cls(**kwargs)
+        # Also the session of every worker spawned from it
+        scraper.new_session = lambda: FixtureSession(fixture)
+        scraper.sess = scraper.new_session()
+        return scraper
+    return make
@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+from cuscraper.aggregate import InstructorsBuilder, load_subjects, merge_sorted, normalize_instructor
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.tests.test_store import read_tree
+
+
+def stat_outputs(scraper) -> dict:
+    return {dirname: read_tree(dirname) for dirname in [scraper.derived_dirname, scraper.resources_dirname]}
+
+
+def test_load_subjects_ahead(tmp_path):
+    dirname = str(tmp_path / 'courses')
+    generate_course_dir(dirname, num_subjects=5, courses_per_subject=2, seed=3)
+    subjects = list(load_subjects(dirname))
+    assert len(subjects) == 5
+    assert list(load_subjects(dirname, workers=3)) == subjects
+
+
+def test_stat_from_memory_matches_course_dir(make_scraper):
+    scraper = make_scraper(keep_courses=True)
+    scraper.parse_all(verbose=False)
+    assert len(scraper.courses) == 2
+    scraper.generate_stat(scraper.courses, publish=False)
+    from_memory = stat_outputs(scraper)
+    for dirname in from_memory:
+        shutil.rmtree(dirname)
+        os.makedirs(dirname)
+    scraper.generate_stat(workers=2, publish=False)
+    assert stat_outputs(scraper) == from_memory
+    assert os.path.exists(os.path.join(scraper.derived_dirname, 'timetable.json'))
+
+
+def test_stat_without_kept_courses_reads_course_dir(make_scraper):
+    scraper = make_scraper()
+    scraper.parse_all(verbose=False)
+    assert scraper.courses == {}
+    scraper.generate_stat(scraper.courses, publish=False)
+    outputs = stat_outputs(scraper)
+    scraper.generate_stat(publish=False)
+    assert stat_outputs(scraper) == outputs
+    with open(os.path.join(scraper.derived_dirname, 'courses.json'), 'r') as f:
+        assert len(json.load(f)) == 6
+
+
+def test_normalize_instructor():
+    assert normalize_instructor('Professor CHAN Tai Man, Dr. LEE Siu Ming') == ('CHAN Tai Man', 'LEE Siu Ming')
+    assert normalize_instructor('Ms. CHEUNG Mei\n\r') == ('CHEUNG Mei',)
+    assert normalize_instructor('Mr CHAN A.') == ('CHAN A',)
+
+
+def test_merge_sorted():
+    assert merge_sorted(['A', 'C'], {'B', 'C', 'D'}) == ['A', 'B', 'C', 'D']
+    # Edited by hand
+    assert merge_sorted(['C', 'A'], {'B'}) == ['A', 'B', 'C']
+    assert merge_sorted([], set()) == []
+
+
+def test_instructor_index():
+    section = {'instructors': ['Dr. A', 'Dr. A', 'Prof. B, Dr. A']}
+    builder = InstructorsBuilder(['Z'])
+    builder.add('CSCI', [{'code': '1000', 'terms': {'T1': {'L1': section, 'L2': {'instructors': ['Dr. B']}}}},
+                         {'code': '2000'}])
+    instructors, index = builder.result()
+    assert instructors == ['A', 'B', 'Z']
+    assert index == {
+        'A': [['CSCI1000', 'T1', 'L1']],
+        'B': [['CSCI1000', 'T1', 'L1'], ['CSCI1000', 'T1', 'L2']],
+    }
+
+
+def test_instructors_accumulate_across_runs(make_scraper, catalog_fixture):
+    previous = make_scraper(timestamp='previous')
+    previous.parse_all(verbose=False)
+    previous.generate_stat(publish=False)
+    with open(os.path.join(previous.resources_dirname, 'instructors.json'), 'w') as f:
+        json.dump(['AAA Retired'], f)
+    scraper = make_scraper(merge_dir=previous.dir_prefix)
+    scraper.parse_all(verbose=False)
+    scraper.generate_stat(publish=False)
+    with open(os.path.join(scraper.resources_dirname, 'instructors.json'), 'r') as f:
+        instructors = json.load(f)
+    with open(os.path.join(scraper.derived_dirname, 'instructor_index.json'), 'r') as f:
+        index = json.load(f)
+    assert instructors == sorted(instructors) and instructors[0] == 'AAA Retired'
+    assert instructors[1:] == list(index)
+    taught = {(course_id, term) for sections in index.values() for course_id, term, _ in sections}
+    assert taught == {(subject + course['code'], term) for subject, courses in catalog_fixture.subjects.items()
+                      for course in courses for term, schedule in course['schedules'].items() if schedule}
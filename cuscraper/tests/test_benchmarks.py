@@ -0,0 +1,17 @@
+import json
+from cuscraper.benchmarks.__main__ import compare, main
+
+
+def test_smoke(tmp_path):
+    output = str(tmp_path / 'bench.json')
+    assert main(['--subjects', '1', '--courses', '3', '--repeat', '1', '--no-memory', '--output', output]) == 0
+    with open(output, 'r') as f:
+        results = json.load(f)['results']
+    assert {'parse_course_detail', 'parse_subject_courses', 'generate_stat [1 subjects]'} <= set(results)
+    assert all(result['rate'] > 0 for result in results.values())
+
+
+def test_compare_flags_regressions():
+    baseline = {'a': {'rate': 100}, 'b': {'rate': 100}, 'gone': {'rate': 1}}
+    results = {'a': {'rate': 85}, 'b': {'rate': 70}, 'new': {'rate': 1}}
+    assert compare(results, baseline, 0.2) == ['b']
@@ -1,24 +1,73 @@
+import io
 import os
-import onnxruntime
-import ddddocr
-
-onnxruntime.set_default_logger_severity(3)
-ocr = ddddocr.DdddOcr()
+import pytest
+from cuscraper.benchmarks.captcha import evaluate, load_samples
+from cuscraper.benchmarks.fixtures import captcha_image, captcha_samples
+from cuscraper.captcha import CaptchaPool, recognize, recognize_concurrent
+from cuscraper.metrics import Metrics
 
+# Accuracy of the captcha model, see python -m cuscraper.benchmarks.captcha for latency, confusions &
+# model comparison
+ddddocr = pytest.importorskip('ddddocr')
+# Captchas saved with save_captchas=True
 path = "captchas"
 
-count = 0
-t_count = 0
-
-for f in os.listdir(path):
-    name, ext = os.path.splitext(f)
-    if ext == '.png':
-        label, time = name.split('_')
-        with open(os.path.join(path, f), 'rb') as img:
-            img_bytes = img.read()
-            res = ocr.classification(img_bytes)
-            count += 1
-            if res == label:
-                t_count +=1
-
-print(f"Accuracy: {round(t_count/count, 5)} ({t_count}/{count})")
+
+@pytest.fixture(scope='module')
+def ocr():
+    from cuscraper.captcha import get_ocr
+    return get_ocr()
+
+
+def test_synthetic_accuracy(ocr):
+    result = evaluate(ocr, captcha_samples(50), workers=4)
+    assert result['count'] == 50
+    assert result['accuracy'] >= 0.8
+    assert result['length_errors'] <= 5
+
+
+@pytest.mark.skipif(not os.path.isdir(path), reason='no saved captchas')
+def test_saved_accuracy(ocr):
+    samples = load_samples(path)
+    if not samples:
+        pytest.skip('no saved captchas')
+    result = evaluate(ocr, samples, workers=os.cpu_count() or 1)
+    print(f"Accuracy: {round(result['accuracy'], 5)} ({result['correct']}/{result['count']})")
+    assert result['accuracy'] >= 0.8
+
+
+def blank_page():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 40), (255, 255, 255)).save(buffer, 'PNG')
+    return {'hf_Captcha': 'blank'}, buffer.getvalue()
+
+
+def test_pool_tickets(ocr):
+    pool = CaptchaPool(lambda: ({'hf_Captcha': 'x'}, captcha_image('7xq2')), size=2, min_confidence=0.1)
+    ticket = pool.get()
+    pool.close()
+    assert ticket.form_state == {'hf_Captcha': 'x'}
+    assert ticket.captcha.lower() == '7xq2' and ticket.confidence >= 0.1
+
+
+def test_pool_gives_up_on_low_confidence(ocr):
+    metrics = Metrics()
+    pool = CaptchaPool(blank_page, size=2, min_confidence=0.1, metrics=metrics, max_misses=3, backoff=0)
+    with pytest.raises(RuntimeError):
+        pool.get()
+    assert metrics.errors['captcha_low_confidence'] == 6
+    assert metrics.errors['captcha_pool_gave_up'] == 1
+
+
+def test_recognize_concurrent(ocr):
+    samples = captcha_samples(8, seed=5)
+    images = [image for _, image in samples]
+    assert recognize_concurrent(images, workers=4) == [recognize(image) for image in images]
+
+
+def test_prefetching_scraper(make_scraper, catalog_fixture):
+    scraper = make_scraper(captcha_prefetch=2)
+    scraper.parse_all(verbose=False)
+    assert sorted(os.listdir(scraper.course_dirname)) == [f'{subject}.json' for subject in catalog_fixture.subjects]
+    assert scraper.captcha_pool is None
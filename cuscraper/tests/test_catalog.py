@@ -0,0 +1,84 @@
+import json
+import os
+import pytest
+from cuscraper.aggregate import aggregate, load_subjects, normalize_instructor
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.catalog import Catalog, CatalogBuilder
+from cuscraper.timetable import to_minutes
+from cuscraper.utils import subject_paths
+
+
+@pytest.fixture
+def course_dir(tmp_path):
+    dirname = str(tmp_path / 'courses')
+    generate_course_dir(dirname, num_subjects=3, courses_per_subject=8, seed=2)
+    return dirname
+
+
+@pytest.fixture
+def catalog(tmp_path, course_dir):
+    path, = aggregate(load_subjects(course_dir), [CatalogBuilder(str(tmp_path / 'catalog.sqlite'))])
+    catalog = Catalog(path)
+    yield catalog
+    catalog.close()
+
+
+def test_courses_round_trip(catalog, course_dir):
+    subjects = dict(load_subjects(course_dir))
+    assert catalog.subjects() == sorted(subjects)
+    assert catalog.course_counts() == {subject: len(courses) for subject, courses in subjects.items()}
+    for subject, courses in subjects.items():
+        assert catalog.load(subject) == courses
+        assert catalog.course(subject + courses[-1]['code']) == courses[-1]
+    assert catalog.course('ZZZZ1000') is None
+
+
+def test_queries(catalog, course_dir):
+    subject, courses = next(iter(load_subjects(course_dir)))
+    course = next(course for course in courses if course.get('terms'))
+    term, sections = next(iter(course['terms'].items()))
+    name, section = next(iter(sections.items()))
+    course_id = subject + course['code']
+    assert (course_id, name) in catalog.sections(term, subject)
+    instructor = normalize_instructor(section['instructors'][0])[0]
+    assert (course_id, term, name) in catalog.courses_taught_by(instructor, term)
+    day, start, end = section['days'][0], section['startTimes'][0], section['endTimes'][0]
+    meetings = catalog.meetings_between(term, day, start, end)
+    assert (course_id, name, day, start, end, section['locations'][0]) in meetings
+    assert all(to_minutes(row[3]) < to_minutes(end) and to_minutes(row[4]) > to_minutes(start) for row in meetings)
+    assert (course_id, name, day, start, end) in catalog.location_schedule(term, section['locations'][0])
+
+
+class FailingBuilder:
+    def add(self, subject, courses):
+        raise RuntimeError('failed')
+
+    def result(self):
+        pass
+
+
+def test_failed_pass_removes_database(tmp_path, course_dir):
+    path = str(tmp_path / 'catalog.sqlite')
+    with pytest.raises(RuntimeError):
+        aggregate(load_subjects(course_dir), [CatalogBuilder(path), FailingBuilder()])
+    assert not os.path.exists(path) and not os.path.exists(f'{path}.tmp')
+
+
+def test_scraper_helpers_read_course_files(make_scraper, catalog_fixture, capsys):
+    scraper = make_scraper()
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    # The catalog is only rewritten by generate_stat, the course files are the current data
+    first, second = catalog_fixture.subjects
+    with open(os.path.join(scraper.course_dirname, f'{first}.json'), 'w') as f:
+        json.dump([], f)
+    capsys.readouterr()
+    scraper.info()
+    assert capsys.readouterr().out == f'Number of courses: {len(catalog_fixture.subjects[second])}\n'
+    seen = []
+    scraper.with_course(lambda courses, subject, f: seen.append((subject, len(courses), f.name)))
+    assert seen == [(subject, 0 if subject == first else len(catalog_fixture.subjects[subject]), path)
+                    for subject, path in subject_paths(scraper.course_dirname).items()]
+    catalog = scraper.catalog()
+    assert catalog.count_courses() == sum(len(courses) for courses in catalog_fixture.subjects.values())
+    catalog.close()
@@ -0,0 +1,106 @@
+import json
+import os
+import pytest
+from cuscraper.benchmarks.fixtures import FixtureSession
+from cuscraper.checkpoint import CheckpointJournal
+from cuscraper.tests.test_store import read_tree
+
+
+# Interrupted on the Course Outcome request of one course, after its terms are journaled
+class InterruptedSession(FixtureSession):
+    def __init__(self, fixture, tag):
+        super().__init__(fixture)
+        self.tag = tag
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and 'btn_course_outcome' in data and data['__VIEWSTATE'].startswith(self.tag):
+            raise KeyboardInterrupt
+        return super().request(method, url, params, data, **kwargs)
+
+
+# Pages of the courses whose Course Outcome was requested
+class OutcomeCountingSession(FixtureSession):
+    def __init__(self, fixture):
+        super().__init__(fixture)
+        self.outcome_requests = []
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and 'btn_course_outcome' in data:
+            self.outcome_requests.append(data['__VIEWSTATE'].split('|')[0])
+        return super().request(method, url, params, data, **kwargs)
+
+
+def scrape(make_scraper, **kwargs):
+    scraper = make_scraper(**kwargs)
+    scraper.parse_all(verbose=False)
+    return scraper
+
+
+def test_journal_skips_cut_off_line(tmp_path):
+    journal = CheckpointJournal(str(tmp_path))
+    journal.course_journal('CSCI', '1000')({'term': 'T1', 'sections': None})
+    journal.course_journal('CSCI', '1000')({'outcome': {'outcome': 'x'}})
+    journal.record_course('CSCI', {'code': '2000'})
+    with open(journal.path('CSCI'), 'a') as f:
+        f.write('{"code": "3000", "cour')
+    assert journal.load('CSCI') == {
+        '1000': {'terms': {'T1': None}, 'outcome': {'outcome': 'x'}, 'course': None},
+        '2000': {'terms': {}, 'outcome': None, 'course': {'code': '2000'}},
+    }
+    journal.clear('CSCI')
+    assert journal.load('CSCI') == {}
+
+
+def test_resume_after_interrupt(make_scraper, catalog_fixture):
+    expected = read_tree(scrape(make_scraper, timestamp='full').course_dirname)
+    first, second = catalog_fixture.subjects
+    scraper = make_scraper(checkpoint=True)
+    scraper.sess = InterruptedSession(catalog_fixture, f'detail:{second}:1|')
+    with pytest.raises(KeyboardInterrupt):
+        scraper.parse_all(verbose=False)
+    assert os.listdir(scraper.course_dirname) == [f'{first}.json']
+    done, interrupted = (course['code'] for course in catalog_fixture.subjects[second][:2])
+    checkpoints = scraper.journal.load(second)
+    assert checkpoints[done]['course'] and checkpoints[interrupted]['terms']
+    assert checkpoints[interrupted]['course'] is None
+    # Same timestamp, the saved subject is skipped and the other picks up where it stopped
+    resumed = make_scraper(checkpoint=True)
+    resumed.parse_all(verbose=False, skip_parsed=True)
+    assert read_tree(resumed.course_dirname) == expected
+    assert os.listdir(os.path.join(resumed.dir_prefix, 'checkpoints')) == []
+    fresh = make_scraper(timestamp='fresh')
+    fresh.search_subject(second)
+    assert resumed.sess.num_requests < fresh.sess.num_requests
+
+
+def test_incremental_reuses_past_terms(make_scraper, catalog_fixture):
+    previous = scrape(make_scraper, timestamp='previous')
+    full = scrape(make_scraper, timestamp='full')
+    incremental = scrape(make_scraper, timestamp='incremental', merge_dir=previous.dir_prefix, incremental=True)
+    assert read_tree(incremental.course_dirname) == read_tree(full.course_dirname)
+    assert incremental.sess.num_requests < full.sess.num_requests
+
+
+def test_resume_skips_journaled_outcomes(make_scraper, catalog_fixture):
+    _, second = catalog_fixture.subjects
+    scraper = make_scraper(checkpoint=True)
+    scraper.sess = InterruptedSession(catalog_fixture, f'detail:{second}:2|')
+    with pytest.raises(KeyboardInterrupt):
+        scraper.parse_all(verbose=False)
+    # Every record of the first two courses but the finished course, as if it crashed right before that
+    path = scraper.journal.path(second)
+    with open(path, 'r') as f:
+        records = [line for line in f if 'course' not in json.loads(line)]
+    with open(path, 'w') as f:
+        f.writelines(records)
+    checkpoints = scraper.journal.load(second)
+    for course in catalog_fixture.subjects[second][:2]:
+        assert checkpoints[course['code']]['outcome'] and checkpoints[course['code']]['course'] is None
+    resumed = make_scraper(checkpoint=True)
+    resumed.sess = OutcomeCountingSession(catalog_fixture)
+    resumed.parse_all(verbose=False, skip_parsed=True)
+    assert resumed.sess.outcome_requests == [f'detail:{second}:2']
+    assert scraper.metrics.report()['errors'] == resumed.metrics.report()['errors'] == {}
+    resumed.log_file.close()
+    with open(os.path.join('logs', 'parser-t.log'), 'r') as f:
+        assert 'Error parsing' not in f.read()
@@ -0,0 +1,58 @@
+import json
+import os
+import pytest
+from cuscraper.__main__ import main
+from cuscraper.replay import Corpus
+from cuscraper.store import SnapshotStore
+from cuscraper.tests.test_replay import RecordingFixtureSession
+from cuscraper.tests.test_store import read_tree
+
+
+def test_commands_on_replayed_run(make_scraper, catalog_fixture, capsys):
+    recorded = make_scraper(timestamp='recorded')
+    corpus = Corpus('corpus')
+    recorded.sess = RecordingFixtureSession(corpus, catalog_fixture)
+    recorded.parse_all(verbose=False)
+    assert main(['scrape', '--replay-dir', 'corpus', '--timestamp', 'cli', '--merge-dir', 'nomerge', '--quiet']) == 0
+    course_dir = os.path.join('data', 'cli', 'courses')
+    assert read_tree(course_dir) == read_tree(recorded.course_dirname)
+    assert main(['stat', '--timestamp', 'cli', '--merge-dir', 'nomerge', '--no-publish']) == 0
+    assert os.path.exists(os.path.join('data', 'cli', 'catalog.sqlite'))
+    capsys.readouterr()
+    assert main(['info', '--timestamp', 'cli', '--merge-dir', 'nomerge']) == 0
+    num_courses = sum(len(courses) for courses in catalog_fixture.subjects.values())
+    assert f'Number of courses: {num_courses}' in capsys.readouterr().out
+    assert main(['diff', '--old', recorded.dir_prefix, '--timestamp', 'cli', '-o', 'changes.json']) == 0
+    with open('changes.json', 'r') as f:
+        assert not any(json.load(f)['summary'].values())
+
+
+def test_diff_needs_new_snapshot(capsys):
+    assert main(['diff']) == 2
+    assert 'required' in capsys.readouterr().out
+
+
+# Recorded up to the Course Outcome request of one course, replaying further fails
+class InterruptedRecordingSession(RecordingFixtureSession):
+    def __init__(self, corpus, fixture, tag):
+        super().__init__(corpus, fixture)
+        self.tag = tag
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and 'btn_course_outcome' in data and data['__VIEWSTATE'].startswith(self.tag):
+            raise KeyboardInterrupt
+        return super().request(method, url, params, data, **kwargs)
+
+
+def test_failed_scrape_is_not_post_processed(make_scraper, catalog_fixture):
+    _, second = catalog_fixture.subjects
+    recorded = make_scraper(timestamp='recorded')
+    recorded.sess = InterruptedRecordingSession(Corpus('corpus'), catalog_fixture, f'detail:{second}:1|')
+    with pytest.raises(KeyboardInterrupt):
+        recorded.parse_all(verbose=False)
+    with pytest.raises(KeyError):
+        main(['scrape', '--replay-dir', 'corpus', '--timestamp', 'cli', '--merge-dir', 'nomerge', '--quiet',
+              '--checkpoint', '--stat', '--store-dir', 'store', '--store-only'])
+    assert SnapshotStore('store').snapshots() == []
+    assert os.listdir(os.path.join('data', 'cli', 'derived')) == []
+    assert os.listdir(os.path.join('data', 'cli', 'checkpoints')) == [f'{second}.jsonl']
@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+from cuscraper.benchmarks.fixtures import FixtureSession
+from cuscraper.coordinator import Heartbeat, open_queue
+from cuscraper.tests.test_store import read_tree
+
+SUBJECTS = ['CSCI', 'ENGG', 'MATH']
+
+
+# Fails the search of one subject
+class FailingSession(FixtureSession):
+    def __init__(self, fixture, subject):
+        super().__init__(fixture)
+        self.subject = subject
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and data.get('ddl_subject') == self.subject:
+            raise ConnectionError('connection reset')
+        return super().request(method, url, params, data, **kwargs)
+
+
+@pytest.fixture(params=['queue.sqlite', 'queue'])
+def lease_queue(request, tmp_path):
+    queue = open_queue(str(tmp_path / request.param), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_claim_complete(lease_queue):
+    assert lease_queue.add(SUBJECTS) == 3
+    assert lease_queue.add(SUBJECTS + ['PHYS']) == 1
+    claimed = [lease_queue.claim(f'w{i}') for i in range(4)]
+    assert sorted(claimed) == sorted(SUBJECTS + ['PHYS'])
+    assert lease_queue.claim('w4') is None
+    assert lease_queue.status() == {'pending': 0, 'leased': 4, 'done': 0, 'failed': 0}
+    assert lease_queue.complete(claimed[0], 'w0', '/out/a.json')
+    # Done by the first one to complete it
+    assert not lease_queue.complete(claimed[0], 'w1', '/out/b.json')
+    assert lease_queue.outputs() == {claimed[0]: '/out/a.json'}
+    assert lease_queue.add(SUBJECTS) == 0
+
+
+def test_fail_until_max_attempts(lease_queue):
+    lease_queue.add(['CSCI'])
+    for attempt in range(2):
+        assert lease_queue.claim('w') == 'CSCI'
+        lease_queue.fail('CSCI', 'w', f'error {attempt}')
+    assert lease_queue.claim('w') is None
+    assert lease_queue.failed() == {'CSCI': 'error 1'}
+    assert lease_queue.reset_failed() == 1
+    assert lease_queue.claim('w') == 'CSCI'
+
+
+def test_expired_lease_is_claimed_again(lease_queue):
+    lease_queue.add(['CSCI'])
+    assert lease_queue.claim('dead', lease_seconds=0.05) == 'CSCI'
+    assert lease_queue.claim('w') is None
+    time.sleep(0.1)
+    assert lease_queue.claim('w', lease_seconds=0.05) == 'CSCI'
+    assert not lease_queue.heartbeat('CSCI', 'dead', 0.05)
+    time.sleep(0.1)
+    # Out of attempts
+    assert lease_queue.claim('w2') is None
+    assert lease_queue.failed() == {'CSCI': 'lease expired'}
+
+
+def test_late_completion_counts(lease_queue):
+    lease_queue.add(['CSCI'])
+    lease_queue.claim('slow', lease_seconds=0.05)
+    time.sleep(0.1)
+    assert lease_queue.claim('w') == 'CSCI'
+    assert lease_queue.complete('CSCI', 'slow', '/out/slow.json')
+    assert not lease_queue.heartbeat('CSCI', 'w')
+    assert not lease_queue.complete('CSCI', 'w', '/out/w.json')
+    assert lease_queue.outputs() == {'CSCI': '/out/slow.json'}
+    assert lease_queue.status()['done'] == 1
+
+
+def test_heartbeat_keeps_lease(lease_queue):
+    lease_queue.add(['CSCI'])
+    lease_queue.claim('w', lease_seconds=0.3)
+    with Heartbeat(lease_queue, 'CSCI', 'w', 0.3) as heartbeat:
+        time.sleep(0.6)
+        assert lease_queue.claim('other') is None
+    assert not heartbeat.lost
+    assert lease_queue.complete('CSCI', 'w', None)
+
+
+def test_workers_share_queue(make_scraper, lease_queue, catalog_fixture):
+    sequential = make_scraper(timestamp='sequential')
+    sequential.parse_all(verbose=False)
+    lease_queue.add(catalog_fixture.subjects)
+    workers = [make_scraper(timestamp=f'worker{i}') for i in range(2)]
+    threads = [threading.Thread(target=worker.parse_queue, args=(lease_queue, f'w{i}'))
+               for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert lease_queue.status() == {'pending': 0, 'leased': 0, 'done': 2, 'failed': 0}
+    scraper = make_scraper()
+    assert scraper.merge_queue(lease_queue) == 2
+    assert read_tree(scraper.course_dirname) == read_tree(sequential.course_dirname)
+
+
+def test_failed_subject_is_retried_then_failed(make_scraper, lease_queue, catalog_fixture):
+    first, second = catalog_fixture.subjects
+    lease_queue.add(catalog_fixture.subjects)
+    scraper = make_scraper()
+    scraper.sess = FailingSession(catalog_fixture, first)
+    scraper.parse_queue(lease_queue, 'w')
+    assert lease_queue.failed() == {first: 'connection reset'}
+    assert list(lease_queue.outputs()) == [second]
@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import pytest
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.diff import apply_delta, diff_snapshots, subject_hashes
+
+
+def make_snapshots(tmp_path):
+    old, new = tmp_path / 'old' / 'courses', tmp_path / 'new' / 'courses'
+    generate_course_dir(str(old), num_subjects=4, courses_per_subject=6, seed=1)
+    shutil.copytree(old, new)
+    subjects = sorted(os.listdir(new))
+    # Changed course fields & sections, a new subject and a removed one
+    with open(new / subjects[0], 'r') as f:
+        courses = json.load(f)
+    courses[0]['title'] = 'Renamed'
+    courses[1].pop('terms', None)
+    courses.append({**courses[-1], 'code': '9999'})
+    with open(new / subjects[0], 'w') as f:
+        json.dump(courses, f)
+    os.remove(new / subjects[1])
+    shutil.copy(new / subjects[2], new / 'ZZZZ.json')
+    return tmp_path / 'old', tmp_path / 'new'
+
+
+def listing(path):
+    return sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(path))
+
+
+def test_diff_apply_round_trip(tmp_path):
+    old, new = make_snapshots(tmp_path)
+    delta = diff_snapshots(str(old), str(new))
+    assert delta['summary']['subjects_changed'] == 3
+    assert delta['summary']['courses_added'] >= 1
+    mirror = tmp_path / 'mirror'
+    shutil.copytree(old / 'courses', mirror)
+    # Through json like a change set saved with diff -o
+    assert apply_delta(str(mirror), json.loads(json.dumps(delta))) == 3
+    assert sorted(os.listdir(mirror)) == sorted(os.listdir(new / 'courses'))
+    for name in os.listdir(mirror):
+        assert (mirror / name).read_bytes() == (new / 'courses' / name).read_bytes()
+
+
+def test_apply_checks_base(tmp_path):
+    old, new = make_snapshots(tmp_path)
+    delta = diff_snapshots(str(old), str(new))
+    with pytest.raises(ValueError):
+        apply_delta(str(new), delta)
+
+
+def test_diff_never_writes_to_snapshots(tmp_path):
+    old, new = make_snapshots(tmp_path)
+    before = listing(old / 'courses'), listing(new / 'courses')
+    cache_dir = tmp_path / 'cache'
+    diff_snapshots(str(old), str(new), str(cache_dir))
+    assert (listing(old / 'courses'), listing(new / 'courses')) == before
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_cached_hashes(tmp_path):
+    old, _ = make_snapshots(tmp_path)
+    course_dir, cache_dir = str(old / 'courses'), str(tmp_path / 'cache')
+    hashes = subject_hashes(course_dir, cache_dir)
+    assert subject_hashes(course_dir, cache_dir) == hashes == subject_hashes(course_dir)
@@ -0,0 +1,35 @@
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.aio import AsyncCourseScraper
+from cuscraper.pipeline import PipelineCourseScraper
+from cuscraper.tests.test_store import read_tree
+
+
+def scrape(make_scraper, cls, timestamp, **kwargs):
+    scraper = make_scraper(cls, timestamp=timestamp, **kwargs.pop('options', {}))
+    scraper.parse_all(verbose=False, **kwargs)
+    return read_tree(scraper.course_dirname)
+
+
+@pytest.fixture
+def sequential(make_scraper, catalog_fixture):
+    files = scrape(make_scraper, CourseScraper, 'sequential')
+    assert sorted(files) == sorted(f'{subject}.json' for subject in catalog_fixture.subjects)
+    return files
+
+
+def test_threaded(make_scraper, sequential):
+    assert scrape(make_scraper, CourseScraper, 'threaded', workers=2) == sequential
+
+
+def test_async(make_scraper, sequential):
+    assert scrape(make_scraper, AsyncCourseScraper, 'async', options={'concurrency': 4}) == sequential
+
+
+def test_pipeline(make_scraper, sequential):
+    assert scrape(make_scraper, PipelineCourseScraper, 'pipeline', options={'parse_workers': 2}) == sequential
+
+
+def test_pipeline_threaded(make_scraper, sequential):
+    assert scrape(make_scraper, PipelineCourseScraper, 'pipeline-threaded', options={'parse_workers': 2},
+                  workers=2) == sequential
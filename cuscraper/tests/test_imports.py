@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+# import cuscraper (e.g. for stat / info) stays light, the rest is loaded on first use
+HEAVY_MODULES = ['onnxruntime', 'ddddocr', 'asyncio', 'multiprocessing', 'sqlite3', 'brotli', 'orjson',
+                 'cuscraper.store', 'cuscraper.catalog', 'cuscraper.publish', 'cuscraper.coordinator']
+
+
+def imported_after(code) -> list:
+    out = subprocess.run([sys.executable, '-c', f'import sys; {code}; print(" ".join(sys.modules))'],
+                         capture_output=True, text=True, check=True).stdout.split()
+    return [name for name in HEAVY_MODULES if name in out]
+
+
+def test_import_is_light():
+    assert imported_after('import cuscraper') == []
+
+
+def test_lazy_attributes():
+    assert imported_after('import cuscraper; cuscraper.Catalog') == ['sqlite3', 'cuscraper.catalog']
+    import cuscraper
+    from cuscraper.coordinator import LEASE_SECONDS
+    from cuscraper.store import SnapshotStore
+    assert cuscraper.LEASE_SECONDS == LEASE_SECONDS and cuscraper.SnapshotStore is SnapshotStore
@@ -0,0 +1,52 @@
+import json
+import os
+import re
+from cuscraper.metrics import Metrics, request_kind
+
+SAMPLE_REGEX = re.compile(r'^cuscraper_\w+(\{\w+="[^"]*"(,\w+="[^"]*")*\})? -?[\d.e+-]+$')
+
+
+def test_request_kind():
+    url = 'http://catalog.test/cusis/Course/Search.aspx'
+    assert request_kind('GET', 'http://catalog.test/cusis/BuildCaptcha.aspx') == 'captcha'
+    assert request_kind('get', url) == 'search_page'
+    assert request_kind('POST', url, {'btn_search': 'Search'}) == 'search'
+    assert request_kind('POST', url, {'__EVENTTARGET': 'x', 'btn_course_outcome': '1'}) == 'outcome'
+    assert request_kind('POST', url, {'uc_course$btn_class_section': '1'}) == 'term_sections'
+    assert request_kind('POST', url, {'__EVENTTARGET': 'x'}) == 'course_detail'
+    assert request_kind('POST', url, b'raw') == 'other'
+
+
+def test_log_errors_and_stage_timer():
+    metrics = Metrics()
+    metrics.record_log('Error parsing course info for CSCI1000\n')
+    metrics.record_log('Gave up CSCI after 10 captcha attempts\n')
+    metrics.record_log('Found 3 courses\n')
+    with metrics.parse_stage('detail') as timer:
+        with timer.paused():
+            pass
+    report = metrics.report()
+    assert report['errors'] == {'course_info': 1, 'captcha_gave_up': 1}
+    assert report['parse']['detail']['count'] == 1
+
+
+def test_exported_run_metrics(make_scraper, catalog_fixture):
+    scraper = make_scraper(metrics=True)
+    scraper.parse_all(verbose=False)
+    scraper.metrics.record_request('search', 0.3, 100, 'http_503')
+    scraper.post_processing()
+    with open(os.path.join('logs', 'metrics-t.json'), 'r') as f:
+        report = json.load(f)
+    assert report['captcha']['subjects'] == len(catalog_fixture.subjects)
+    assert report['captcha']['gave_up'] == 0
+    assert report['parse']['course_rows']['count'] == len(catalog_fixture.subjects)
+    assert report['errors'] == {'search:http_503': 1}
+    with open(os.path.join('logs', 'metrics-t.prom'), 'r') as f:
+        lines = f.read().splitlines()
+    assert not os.path.exists(os.path.join('logs', 'metrics-t.prom.tmp'))
+    samples = [line for line in lines if not line.startswith('#')]
+    assert all(SAMPLE_REGEX.match(line) for line in samples)
+    assert 'cuscraper_request_duration_seconds_bucket{kind="search",le="0.5"} 1' in samples
+    assert 'cuscraper_request_duration_seconds_bucket{kind="search",le="0.25"} 0' in samples
+    assert f'cuscraper_subjects_searched_total{{result="solved"}} {len(catalog_fixture.subjects)}' in samples
+    assert 'cuscraper_errors_total{category="search:http_503"} 1' in samples
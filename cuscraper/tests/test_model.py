@@ -0,0 +1,29 @@
+import os
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.model import Course, Section, dumps_courses, load_courses
+from cuscraper.timetable import minute_of_week
+
+
+def test_round_trip(tmp_path):
+    generate_course_dir(str(tmp_path), num_subjects=3, courses_per_subject=8, seed=3)
+    for entry in os.scandir(tmp_path):
+        with open(entry.path, 'r') as f:
+            assert dumps_courses(load_courses(entry.path)) == f.read()
+
+
+def test_section_times():
+    data = {'startTimes': ['9:30', '09:30', 'TBA'], 'endTimes': ['11:15', '10:15', 'TBA'], 'days': [2, 3, 'TBA'],
+            'locations': ['LSB LT1', 'LSB LT1', 'TBA'], 'instructors': ['Dr. A', 'Dr. A', 'TBA'], 'meetingDates': ['06/09', '13/09']}
+    section = Section(data, year=2022)
+    assert section.start == (minute_of_week('Tu', '9:30'), '09:30', 'TBA')
+    assert list(section.meetings()) == [(minute_of_week(2, '9:30'), minute_of_week(2, '11:15'), 'LSB LT1', 'Dr. A')]
+    assert section.to_json() == data
+    # Interned across sections
+    assert Section(dict(data)).locations[0] is section.locations[0]
+
+
+def test_course_access():
+    course = Course({'code': '1000', 'title': 'Intro', 'terms': {'2022-23 Term 1': {}}})
+    assert course.code == '1000' and course['title'] == 'Intro' and 'terms' in course
+    assert course.get('units') is None
+    assert course.to_json() == {'code': '1000', 'title': 'Intro', 'terms': {'2022-23 Term 1': {}}}
@@ -0,0 +1,89 @@
+import pytest
+from cuscraper.benchmarks.fixtures import TERMS, FixtureSession
+from cuscraper.parsing import cached_term_sections, course_event_target, extract_form_state, extract_select_options, make_soup
+
+
+def soup_form_state(html) -> dict:
+    form_state = {}
+    for tag in make_soup(html, 'html.parser').select('input[id]'):
+        if tag.has_attr('value'):
+            form_state.setdefault(tag['id'], tag['value'])
+    return form_state
+
+
+def soup_select_options(html, id) -> list:
+    return [{'value': option.get('value'), 'text': option.text, 'selected': option.has_attr('selected')}
+            for option in make_soup(html, 'html.parser').select(f'#{id} option')]
+
+
+@pytest.fixture
+def pages(catalog_fixture):
+    subject = next(iter(catalog_fixture.subjects))
+    search_page = FixtureSession(catalog_fixture).get('http://localhost/').text
+    return {
+        'search': search_page,
+        'result': catalog_fixture.result_page(subject),
+        'detail': catalog_fixture.detail_page(subject, 1, TERMS[0]),
+        'outcome': catalog_fixture.outcome_page(subject, 1),
+    }
+
+
+def test_form_state_matches_soup(pages):
+    for html in pages.values():
+        form_state = extract_form_state(html)
+        assert form_state == soup_form_state(html)
+        assert '__VIEWSTATE' in form_state and '__EVENTVALIDATION' in form_state
+    assert extract_form_state(pages['search'])['hf_Captcha'] == 'captcha1'
+
+
+def test_form_state_markup_variants():
+    html = ('<INPUT type=hidden ID=a VALUE=1>'
+            '<input data-x="b>c" value=\'&lt;2&gt;\' id="b" />'
+            '<input id="c" value="">'
+            '<input id="a" value="second">'
+            '<input id="no_value">')
+    assert extract_form_state(html) == soup_form_state(html) == {'a': '1', 'b': '<2>', 'c': ''}
+
+
+def test_select_options_match_soup(pages, catalog_fixture):
+    search_options = extract_select_options(pages['search'], 'ddl_subject')
+    assert search_options == soup_select_options(pages['search'], 'ddl_subject')
+    assert [option['value'] for option in search_options] == [''] + list(catalog_fixture.subjects)
+    term_options = extract_select_options(pages['detail'], 'uc_course_ddl_class_term')
+    assert term_options == soup_select_options(pages['detail'], 'uc_course_ddl_class_term')
+    assert [option['text'] for option in term_options if option['selected']] == [TERMS[0]]
+    assert extract_select_options(pages['result'], 'ddl_subject') is None
+
+
+def test_select_options_markup_variants():
+    html = ('<select id="s"><option selected value="1">One &amp; a half'
+            '<option value=\'2\' title="not selected">Two</option>'
+            '<OPTION VALUE=3 SELECTED>Three</OPTION></select>')
+    assert extract_select_options(html, 's') == [
+        {'value': '1', 'text': 'One & a half', 'selected': True},
+        {'value': '2', 'text': 'Two', 'selected': False},
+        {'value': '3', 'text': 'Three', 'selected': True},
+    ]
+
+
+def test_course_event_target(pages):
+    soup = make_soup(pages['result'], 'html.parser')
+    links = [a['id'] for a in soup.select('#gv_detail a[id$="lbtn_course_title"]')]
+    assert [course_event_target(i).replace('$', '_') for i in range(len(links))] == links
+    assert course_event_target(7) == 'gv_detail$ctl09$lbtn_course_title'
+    assert course_event_target(8) == 'gv_detail$ctl10$lbtn_course_title'
+
+
+def test_cached_term_sections():
+    sections = {'-MCLA': {}}
+    old_course = {'terms': {TERMS[0]: sections}}
+    assert cached_term_sections(None, TERMS[0]) == (False, None)
+    assert cached_term_sections({'terms': {TERMS[1]: None}}, TERMS[1]) == (True, None)
+    # Terms before reuse_before come from the old course, later ones are fetched
+    cache = {'old_terms': old_course['terms'], 'reuse_before': TERMS[1]}
+    assert cached_term_sections(cache, TERMS[0]) == (True, sections)
+    assert cached_term_sections(cache, TERMS[1]) == (False, None)
+    # Only the refreshed term is fetched
+    cache = {'refresh_term': TERMS[1], 'old_course': old_course}
+    assert cached_term_sections(cache, TERMS[0]) == (True, sections)
+    assert cached_term_sections(cache, TERMS[1]) == (False, None)
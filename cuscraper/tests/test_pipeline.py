@@ -0,0 +1,46 @@
+import os
+import pytest
+from cuscraper.benchmarks.fixtures import FixtureSession
+from cuscraper.pipeline import PipelineCourseScraper
+
+
+class FailingSession(FixtureSession):
+    # Fails the course detail request of one course
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and data.get('__EVENTTARGET', '').startswith('gv_detail$ctl03'):
+            raise ConnectionError('connection reset')
+        return super().request(method, url, params, data, **kwargs)
+
+
+def test_fetch_error_aborts_subject(make_scraper, catalog_fixture):
+    scraper = make_scraper(PipelineCourseScraper, parse_workers=2)
+    scraper.sess = FailingSession(catalog_fixture)
+    subject = next(iter(catalog_fixture.subjects))
+    with pytest.raises(ConnectionError):
+        scraper.search_subject(subject)
+    assert os.listdir(scraper.partial_dirname) == []
+    assert os.listdir(scraper.course_dirname) == []
+    # The pipeline is still usable
+    scraper.sess = FixtureSession(catalog_fixture)
+    assert scraper.search_subject(subject)
+    assert os.listdir(scraper.course_dirname) == [f'{subject}.json']
+
+
+def test_writer_error_raised_from_join(make_scraper, catalog_fixture):
+    scraper = make_scraper(PipelineCourseScraper, parse_workers=2)
+
+    def save_subject_courses(subject, writer, save):
+        raise OSError('disk full')
+    scraper.save_subject_courses = save_subject_courses
+    with pytest.raises(OSError, match='disk full'):
+        scraper.parse_all(verbose=False)
+    assert os.listdir(scraper.partial_dirname) == []
+    assert not scraper.pipeline.running
+
+
+def test_post_processing_with_courses(make_scraper, catalog_fixture):
+    scraper = make_scraper(PipelineCourseScraper, parse_workers=2, keep_courses=True)
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True, courses=scraper.courses)
+    assert sorted(scraper.courses) == sorted(catalog_fixture.subjects)
+    assert os.path.exists(scraper.catalog_path)
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+import pytest
+from cuscraper import publish
+from cuscraper.publish import load_manifest, publish_snapshot
+from cuscraper.tests.test_store import read_tree
+
+
+def published_run(make_scraper, timestamp='t'):
+    scraper = make_scraper(timestamp=timestamp)
+    scraper.parse_all(verbose=False)
+    scraper.generate_stat()
+    return scraper
+
+
+def test_bundle_matches_sources(make_scraper, catalog_fixture):
+    scraper = published_run(make_scraper)
+    publish_dir = os.path.join(scraper.dir_prefix, 'publish')
+    manifest = load_manifest(publish_dir)
+    assert {f'courses/{subject}.json' for subject in catalog_fixture.subjects} <= set(manifest)
+    assert 'derived/timetable.json' in manifest and 'resources/course_list.json' in manifest
+    for relpath, entry in manifest.items():
+        with open(os.path.join(scraper.dir_prefix, relpath), 'r') as f:
+            source = json.load(f)
+        with open(os.path.join(publish_dir, relpath), 'rb') as f:
+            data = f.read()
+        assert json.loads(data) == source and len(data) == entry['bytes']
+        assert entry['etag'] == f'"{entry["hash"]}"'
+        with gzip.open(os.path.join(publish_dir, relpath + '.gz'), 'rb') as f:
+            assert f.read() == data
+        assert os.path.getsize(os.path.join(publish_dir, relpath + '.gz')) == entry['gzip_bytes']
+
+
+def test_deterministic(make_scraper):
+    scraper = published_run(make_scraper)
+    publish_snapshot(scraper.dir_prefix, 'again')
+    assert read_tree('again') == read_tree(os.path.join(scraper.dir_prefix, 'publish'))
+
+
+def test_reuses_previous_bundle(make_scraper, catalog_fixture):
+    scraper = published_run(make_scraper)
+    previous = os.path.join(scraper.dir_prefix, 'publish')
+    unchanged, changed = (f'courses/{subject}.json' for subject in catalog_fixture.subjects)
+    # Copied as they are, so a marker in the previous bundle shows up in the new one
+    with open(os.path.join(previous, unchanged + '.gz'), 'wb') as f:
+        f.write(b'reused')
+    with open(os.path.join(scraper.dir_prefix, changed), 'w') as f:
+        json.dump([], f)
+    manifest = publish_snapshot(scraper.dir_prefix, 'next', previous)
+    with open(os.path.join('next', unchanged + '.gz'), 'rb') as f:
+        assert f.read() == b'reused'
+    with gzip.open(os.path.join('next', changed + '.gz'), 'rb') as f:
+        assert f.read() == b'[]'
+    assert manifest[changed]['hash'] != load_manifest(previous)[changed]['hash']
+
+
+def test_next_run_publishes_from_merge_dir(make_scraper):
+    previous = published_run(make_scraper, 'previous')
+    scraper = make_scraper(merge_dir=previous.dir_prefix)
+    scraper.parse_all(verbose=False)
+    scraper.generate_stat()
+    assert load_manifest(os.path.join(scraper.dir_prefix, 'publish')) == load_manifest(
+        os.path.join(previous.dir_prefix, 'publish'))
+
+
+def test_json_fallback_matches_orjson(monkeypatch):
+    pytest.importorskip('orjson')
+    value = {'title': 'Café 中文', 'terms': {'2022-23 Term 1': [1, 2.5, None, True]}}
+    data = publish.dumps(value)
+    monkeypatch.setattr(publish, 'orjson', None)
+    assert publish.dumps(value) == data
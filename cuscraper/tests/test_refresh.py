@@ -0,0 +1,71 @@
+import json
+import os
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.aio import AsyncCourseScraper
+from cuscraper.benchmarks.fixtures import TERMS
+from cuscraper.pipeline import PipelineCourseScraper
+
+
+def load_courses(scraper) -> dict:
+    courses = {}
+    for name in os.listdir(scraper.course_dirname):
+        with open(os.path.join(scraper.course_dirname, name), 'r') as f:
+            courses.update((name[:-5] + course['code'], course) for course in json.load(f))
+    return courses
+
+
+def scrape(make_scraper, cls=CourseScraper, **kwargs):
+    scraper = make_scraper(cls, **kwargs)
+    scraper.parse_all(verbose=False)
+    return scraper
+
+
+# A previous run, then changes to the catalog: sections of the current & a past term of one course,
+# descriptions of every course and a course the previous run didn't have
+@pytest.fixture
+def previous(make_scraper, catalog_fixture):
+    previous = scrape(make_scraper, timestamp='previous')
+    first, second = catalog_fixture.subjects
+    course = catalog_fixture.subjects[first][0]
+    course['schedules'][TERMS[-1]], course['schedules'][TERMS[-2]] = course['schedules'][TERMS[-2]], []
+    for courses in catalog_fixture.subjects.values():
+        for c in courses:
+            c['description'] = 'Changed'
+    path = os.path.join(previous.course_dirname, f'{second}.json')
+    with open(path, 'r') as f:
+        courses = json.load(f)
+    with open(path, 'w') as f:
+        json.dump(courses[1:], f)
+    return previous
+
+
+@pytest.mark.parametrize('current_term', [TERMS[-1], TERMS[0]])
+def test_refresh_patches_current_term(make_scraper, catalog_fixture, previous, current_term):
+    full = scrape(make_scraper, timestamp='full', current_term=current_term)
+    refreshed = scrape(make_scraper, merge_dir=previous.dir_prefix, refresh=True, current_term=current_term)
+    assert refreshed.sess.num_requests < full.sess.num_requests
+    old, new, expected = load_courses(previous), load_courses(refreshed), load_courses(full)
+    assert list(new) == list(expected)
+    for course_id, course in new.items():
+        if course_id not in old:
+            # Fetched in full
+            assert course == expected[course_id]
+            continue
+        patched = dict(old[course_id])
+        terms = patched.pop('terms', {})
+        terms.pop(current_term, None)
+        if current_term in expected[course_id].get('terms', {}):
+            terms[current_term] = expected[course_id]['terms'][current_term]
+        if terms:
+            patched['terms'] = terms
+        assert course == patched
+        assert course['description'] != 'Changed'
+
+
+@pytest.mark.parametrize('cls, kwargs', [(AsyncCourseScraper, {'concurrency': 4}), (PipelineCourseScraper, {'parse_workers': 2})])
+def test_refresh_engines(make_scraper, previous, cls, kwargs):
+    sequential = scrape(make_scraper, timestamp='sequential', merge_dir=previous.dir_prefix, refresh=True)
+    refreshed = scrape(make_scraper, cls, merge_dir=previous.dir_prefix, refresh=True, **kwargs)
+    assert load_courses(refreshed) == load_courses(sequential)
+    assert refreshed.sess.num_requests == sequential.sess.num_requests
@@ -0,0 +1,42 @@
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.benchmarks.fixtures import FixtureSession
+from cuscraper.replay import Corpus, RecordingSession, ReplaySession, request_key
+from cuscraper.tests.test_store import read_tree
+
+
+# Records the fixture's responses instead of the network's
+class RecordingFixtureSession(RecordingSession, FixtureSession):
+    def __init__(self, corpus, fixture):
+        FixtureSession.__init__(self, fixture)
+        self.corpus = corpus
+
+
+def test_request_key_ignores_field_order():
+    url = 'http://example.com/a/b.aspx?x=1'
+    key = request_key('post', url, {'b': '2', 'a': '1', 'c': None})
+    assert key == request_key('POST', 'http://other.host/a/b.aspx?x=1', b'a=1&b=2')
+    assert key != request_key('POST', url, {'a': '1', 'b': '3'})
+
+
+def test_replay_reproduces_run(make_scraper, catalog_fixture):
+    scraper = make_scraper(timestamp='recorded')
+    corpus = Corpus('corpus')
+    scraper.new_session = lambda: RecordingFixtureSession(corpus, catalog_fixture)
+    scraper.sess = scraper.new_session()
+    scraper.parse_all(verbose=False)
+    assert corpus.num_entries == scraper.sess.num_requests
+    replayed = CourseScraper(timestamp='replayed', merge_dir='nomerge', replay_dir='corpus')
+    assert isinstance(replayed.sess, ReplaySession)
+    replayed.parse_all(verbose=False)
+    assert read_tree(replayed.course_dirname) == read_tree(scraper.course_dirname)
+
+
+def test_identical_requests_replay_in_order(tmp_path, catalog_fixture):
+    corpus = Corpus(str(tmp_path))
+    session = RecordingFixtureSession(corpus, catalog_fixture)
+    pages = [session.get('http://localhost/search').text for _ in range(2)]
+    replay = ReplaySession(Corpus(str(tmp_path)))
+    assert [replay.get('http://localhost/search').text for _ in range(3)] == pages + pages[-1:]
+    with pytest.raises(KeyError):
+        replay.post('http://localhost/search', data={'unknown': '1'})
@@ -0,0 +1,54 @@
+from cuscraper.aggregate import aggregate, load_subjects
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.search import SearchIndex, SearchIndexBuilder, tokenize
+
+COURSES = {
+    'CSCI': [
+        {'code': '1000', 'title': 'Theory of Computation', 'description': 'Automata and languages.'},
+        {'code': '2000', 'title': 'Computer Networks', 'description': 'Network protocols, <b>routing</b> and the internet.'},
+        {'code': '3000', 'title': 'Machine Learning', 'description': 'Learning from data, neural networks.'},
+    ],
+    'MATH': [
+        {'code': '1000', 'title': 'Calculus', 'description': 'Limits and the theory of integration.'},
+    ],
+}
+
+
+def build(**kwargs) -> SearchIndex:
+    index, = aggregate(COURSES.items(), [SearchIndexBuilder(**kwargs)])
+    return index
+
+
+def test_tokenize():
+    assert tokenize('The <i>Networks</i> of Students, class & C++') == ['network', 'class']
+
+
+def test_search_ranks_title_first():
+    results = build().search('networks')
+    assert [course_id for course_id, _ in results] == ['CSCI2000', 'CSCI3000']
+    assert results[0][1] > results[1][1]
+    assert build().search('unknown words') == []
+
+
+def test_prefix_is_not_tokenized():
+    index = build()
+    # A stopword, too short & a plural as whole words, the start of a word when typed last
+    assert {course_id for course_id, _ in index.search('the', prefix=True)} == {'CSCI1000', 'MATH1000'}
+    assert index.search('the') == []
+    assert [course_id for course_id, _ in index.search('m', prefix=True)][:1] == ['CSCI3000']
+    assert [course_id for course_id, _ in index.search('learning netw', prefix=True)][0] == 'CSCI3000'
+
+
+def test_save_load(tmp_path):
+    index = build()
+    path = str(tmp_path / 'search_index.json')
+    index.save(path)
+    loaded = SearchIndex.load(path)
+    assert loaded.docs == index.docs and loaded.terms == index.terms
+
+
+def test_max_bytes(tmp_path):
+    generate_course_dir(str(tmp_path), num_subjects=3, courses_per_subject=20, seed=4)
+    index, = aggregate(load_subjects(str(tmp_path)), [SearchIndexBuilder(max_bytes=20000)])
+    assert len(index.dumps()) <= 20000
+    assert index.search('analysis')
@@ -0,0 +1,84 @@
+import os
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.catalog import Catalog
+from cuscraper.store import SnapshotStore
+
+
+def read_tree(dirname) -> dict:
+    files = {}
+    for root, _, filenames in os.walk(dirname):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, dirname)] = f.read()
+    return files
+
+
+def test_materialize_round_trip(make_scraper):
+    scraper = make_scraper(store_dir='store')
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    files = read_tree(scraper.dir_prefix)
+    assert 'catalog.sqlite' in files and os.path.join('publish', 'manifest.json') in files
+    snapshot = SnapshotStore('store').snapshot('latest')
+    assert snapshot.name == 't'
+    assert read_tree(snapshot.materialize('copy')) == files
+
+
+def test_unchanged_run_adds_no_objects(make_scraper):
+    scraper = make_scraper(store_dir='store')
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    stats = SnapshotStore('store').put_snapshot(scraper.dir_prefix, 'again')
+    assert stats['new_objects'] == 0 and stats['subjects'] == 2
+
+
+def test_store_only_keeps_catalog(make_scraper, catalog_fixture):
+    scraper = make_scraper(store_dir='store', store_only=True)
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    assert not os.path.exists(scraper.dir_prefix)
+    # e.g. stat / info of the stored run
+    stored = CourseScraper(timestamp='t', merge_dir='nomerge', store_dir='store')
+    catalog = Catalog(stored.catalog_path)
+    assert catalog.course_counts() == {subject: len(courses) for subject, courses in catalog_fixture.subjects.items()}
+    catalog.close()
+    assert os.path.exists(os.path.join(stored.dir_prefix, 'publish', 'manifest.json'))
+
+
+def test_merged_catalog_from_snapshot(make_scraper, catalog_fixture):
+    scraper = make_scraper(store_dir='store', store_only=True)
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    later = make_scraper(timestamp='t2', store_dir='store', merge_snapshot='latest')
+    catalog = later.catalog(merged=True)
+    assert catalog.subjects() == list(catalog_fixture.subjects)
+    catalog.close()
+
+
+def test_first_run_merges_nothing(make_scraper, catalog_fixture):
+    scraper = make_scraper(store_dir='store', merge_snapshot='latest', incremental=True, store_only=True)
+    assert scraper.merge_snapshot is None
+    scraper.parse_all(verbose=False)
+    scraper.post_processing(stat=True)
+    assert SnapshotStore('store').snapshots() == ['t']
+
+
+def test_unfinished_run_is_not_stored(make_scraper, catalog_fixture):
+    # test_checkpoint imports this module
+    from cuscraper.tests.test_checkpoint import InterruptedSession
+    _, second = catalog_fixture.subjects
+    scraper = make_scraper(store_dir='store', store_only=True, checkpoint=True)
+    scraper.sess = InterruptedSession(catalog_fixture, f'detail:{second}:1|')
+    with pytest.raises(KeyboardInterrupt):
+        scraper.parse_all(verbose=False)
+    scraper.post_processing()
+    assert scraper.unfinished_subjects() == [second]
+    assert SnapshotStore('store').snapshots() == []
+    assert os.listdir(os.path.join(scraper.dir_prefix, 'checkpoints')) == [f'{second}.jsonl']
+    resumed = make_scraper(store_dir='store', store_only=True, checkpoint=True)
+    resumed.parse_all(verbose=False, skip_parsed=True)
+    resumed.post_processing(stat=True)
+    assert SnapshotStore('store').snapshots() == ['t']
+    assert not os.path.exists(resumed.dir_prefix)
@@ -0,0 +1,95 @@
+import os
+import pytest
+from cuscraper.aggregate import aggregate, load_subjects
+from cuscraper.benchmarks.fixtures import generate_course_dir
+from cuscraper.timetable import TermIndex, TimetableBuilder, TimetableIndex, format_minute_of_week, minute_of_week, to_minutes
+
+
+@pytest.fixture(scope='module')
+def course_dir(tmp_path_factory) -> str:
+    dirname = str(tmp_path_factory.mktemp('courses'))
+    generate_course_dir(dirname, num_subjects=4, courses_per_subject=10, seed=4)
+    return dirname
+
+
+# term -> (start, end, course id, section, location) of every timeslot, straight from the course files
+@pytest.fixture(scope='module')
+def timeslots(course_dir) -> dict:
+    timeslots = {}
+    for subject, courses in load_subjects(course_dir):
+        for course in courses:
+            for term, sections in course.get('terms', {}).items():
+                for name, section in sections.items():
+                    for day, start, end, location in zip(section['days'], section['startTimes'], section['endTimes'], section['locations']):
+                        if type(day) is int and to_minutes(start) is not None:
+                            timeslots.setdefault(term, []).append((minute_of_week(day, start), minute_of_week(
+                                day, end), subject + course['code'], name, location))
+    return timeslots
+
+
+@pytest.fixture(scope='module')
+def index(course_dir, tmp_path_factory) -> TimetableIndex:
+    builder, = aggregate(load_subjects(course_dir), [TimetableBuilder()])
+    path = str(tmp_path_factory.mktemp('derived') / 'timetable.json')
+    builder.save(path)
+    return TimetableIndex.load(path)
+
+
+def test_overlaps_match_scan(index, timeslots):
+    for term, term_timeslots in timeslots.items():
+        for start in range(minute_of_week('Mo', '8:00'), minute_of_week('Sa', '0:00'), 97):
+            expected = sorted((course_id, name, s, e, location) for s, e, course_id, name, location in term_timeslots
+                              if s < start + 45 and e > start)
+            assert sorted(index.overlaps(term, start, start + 45)) == expected
+
+
+def test_clashes_match_scan(index, timeslots):
+    for term, term_timeslots in timeslots.items():
+        for _, _, course_id, name, _ in term_timeslots[:50]:
+            own = [(s, e) for s, e, c, n, _ in term_timeslots if (c, n) == (course_id, name)]
+            expected = {(c, n) for s, e, c, n, _ in term_timeslots if (c, n) != (course_id, name) and any(
+                s < own_end and e > own_start for own_start, own_end in own)}
+            clashes = index.clashes(term, course_id, name)
+            assert len(clashes) == len(expected) and set(map(tuple, clashes)) == expected
+    with pytest.raises(KeyError):
+        index.clashes(term, 'ZZZZ1000', '--LEC')
+
+
+def test_free_locations_match_scan(index, timeslots):
+    term, term_timeslots = next(iter(timeslots.items()))
+    start, end = minute_of_week('Tu', '10:30'), minute_of_week('Tu', '12:15')
+    busy = {location for s, e, _, _, location in term_timeslots if s < end and e > start}
+    free = index.free_locations(term, start, end)
+    assert set(free) == {location for _, _, _, _, location in term_timeslots} - busy
+    assert free and busy
+
+
+def test_free_slots():
+    # Overlapping & back to back timeslots, one running past the end of the day
+    index = TimetableIndex({'T': TermIndex.build([
+        (minute_of_week('Mo', '9:30'), minute_of_week('Mo', '11:15'), ('A1000', 'L1'), 'R1'),
+        (minute_of_week('Mo', '10:30'), minute_of_week('Mo', '12:15'), ('A2000', 'L1'), 'R1'),
+        (minute_of_week('Mo', '12:15'), minute_of_week('Mo', '13:00'), ('A3000', 'L1'), 'R1'),
+        (minute_of_week('Mo', '14:00'), minute_of_week('Mo', '14:30'), ('A3000', 'L1'), 'R1'),
+        (minute_of_week('Mo', '21:00'), minute_of_week('Mo', '23:00'), ('A4000', 'L1'), 'R1'),
+        (minute_of_week('Tu', '9:30'), minute_of_week('Tu', '11:15'), ('A1000', 'L1'), 'R2'),
+    ])})
+    slots = index.free_slots('T', 'R1', 'Mo')
+    assert [(format_minute_of_week(start), format_minute_of_week(end)) for start, end in slots] == [
+        ('Mo 8:30', 'Mo 9:30'), ('Mo 13:00', 'Mo 14:00'), ('Mo 14:30', 'Mo 21:00')]
+    assert index.free_slots('T', 'R1', 'Mo', min_minutes=61) == [slots[-1]]
+    assert index.free_slots('T', 'R1', 'Tu') == [(minute_of_week('Tu', '8:30'), minute_of_week('Tu', '22:00'))]
+    assert [timeslot[0] for timeslot in index.occupancy('T', 'R1', 'Mo')] == ['A1000', 'A2000', 'A3000', 'A3000', 'A4000']
+    assert index.occupancy('T', 'R3') == []
+    assert index.clashes('T', 'A1000', 'L1') == [['A2000', 'L1']]
+    assert index.free_locations('T', minute_of_week('Mo', '13:00'), minute_of_week('Mo', '14:00')) == ['R1', 'R2']
+
+
+def test_scraper_writes_index(make_scraper, catalog_fixture):
+    scraper = make_scraper()
+    scraper.parse_all(verbose=False)
+    scraper.generate_stat(publish=False)
+    index = TimetableIndex.load(os.path.join(scraper.derived_dirname, 'timetable.json'))
+    course_ids = {subject + course['code'] for subject, courses in catalog_fixture.subjects.items() for course in courses}
+    assert {course_id for term in index.terms.values() for course_id, _ in term.sections} <= course_ids
+    assert index.terms
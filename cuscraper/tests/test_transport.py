@@ -0,0 +1,122 @@
+import email.utils
+import time
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from cuscraper import CourseScraper
+from cuscraper.metrics import Metrics
+from cuscraper.transport import AdaptiveRateLimiter, RateLimiter, ScraperSession, retry_after
+
+URL = 'http://catalog.test/Search.aspx'
+
+
+# Answers each request with the next scripted exception or (status, body, headers)
+class ScriptedAdapter(HTTPAdapter):
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.num_requests = 0
+
+    def send(self, request, **kwargs):
+        self.num_requests += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        status, body, headers = response
+        res = requests.Response()
+        res.status_code = status
+        res.headers.update(headers)
+        res._content = body
+        res.url = request.url
+        res.request = request
+        return res
+
+
+@pytest.fixture
+def search_page(catalog_fixture):
+    return catalog_fixture.search_page().encode()
+
+
+def session(responses, **kwargs) -> ScraperSession:
+    adapter = ScriptedAdapter(responses)
+    return ScraperSession(adapter=adapter, backoff=0.001, **kwargs)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(max_rps=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+    unlimited = RateLimiter()
+    start = time.monotonic()
+    for _ in range(100):
+        unlimited.wait()
+    assert time.monotonic() - start < 0.05
+
+
+def test_adaptive_rate_limiter():
+    limiter = AdaptiveRateLimiter(max_rps=8, min_rps=1, target_latency=1)
+    limiter.observe(0.1, False)
+    assert limiter.rps == 4
+    # Sent before the decrease, not another signal of overload
+    limiter.observe(10, True)
+    assert limiter.rps == 4
+    time.sleep(0.01)
+    limiter.observe(0.001, False)
+    assert limiter.rps == 2
+    for _ in range(100):
+        limiter.observe(0.1, True)
+    assert limiter.rps == 8 and limiter.interval == 1 / 8
+    for _ in range(10):
+        limiter.last_decrease = 0
+        limiter.observe(0.1, False)
+    assert limiter.rps == 1
+
+
+def test_retry_after():
+    def response(value):
+        res = requests.Response()
+        if value is not None:
+            res.headers['Retry-After'] = value
+        return res
+    assert retry_after(response(None)) is None
+    assert retry_after(response('2')) == 2
+    assert retry_after(response('-1')) == 0
+    assert retry_after(response('soon')) is None
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after(response(later)) <= 30
+
+
+def test_retries_throttled_and_transient_pages(search_page):
+    metrics = Metrics()
+    sess = session([
+        requests.ConnectionError('reset'),
+        (503, b'busy', {'Retry-After': '0'}),
+        (200, b'<html>Service Unavailable</html>', {'Content-Type': 'text/html'}),
+        (200, search_page, {'Content-Type': 'text/html'}),
+    ], retries=3, metrics=metrics, is_transient=CourseScraper.is_transient_page)
+    res = sess.get(URL)
+    assert res.status_code == 200 and res.content == search_page
+    assert metrics.report()['errors'] == {
+        'search_page:connection': 1, 'search_page:http_503': 1, 'search_page:transient_page': 1}
+    assert metrics.report()['requests']['search_page']['count'] == 4
+
+
+def test_gives_up_after_retries(search_page):
+    sess = session([(429, b'', {})] * 3, retries=2)
+    assert sess.get(URL).status_code == 429
+    assert sess.get_adapter(URL).num_requests == 3
+    sess = session([requests.Timeout('slow')] * 2 + [(200, search_page, {})], retries=1)
+    with pytest.raises(requests.Timeout):
+        sess.get(URL)
+    # No retries by default, other statuses are returned as they are
+    sess = session([(404, b'', {}), (200, search_page, {})])
+    assert sess.get(URL).status_code == 404
+
+
+def test_failures_slow_down_adaptive_limiter(search_page):
+    limiter = AdaptiveRateLimiter(max_rps=8)
+    sess = session([(502, b'', {}), (200, search_page, {})], retries=1, limiter=limiter)
+    assert sess.get(URL).status_code == 200
+    assert limiter.rps < 8
@@ -0,0 +1,97 @@
+import json
+import os
+import pytest
+from cuscraper import CourseScraper
+from cuscraper.aio import AsyncCourseScraper
+from cuscraper.benchmarks.fixtures import FixtureSession
+from cuscraper.writer import SubjectWriter
+
+COURSES = [{'code': '3100', 'title': 'C'}, {'code': '1000', 'title': 'A'}, {'code': '2000', 'title': 'B'}]
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    course_dir, partial_dir = tmp_path / 'courses', tmp_path / 'partial'
+    course_dir.mkdir()
+    partial_dir.mkdir()
+    return course_dir, partial_dir
+
+
+def test_finalize_matches_json_dump(dirs):
+    course_dir, partial_dir = dirs
+    writer = SubjectWriter(str(course_dir / 'CSCI.json'), str(partial_dir))
+    for course in COURSES:
+        writer.write(course)
+    old = [{'code': '2000', 'title': 'Old B'}, {'code': '9999', 'title': 'Gone'}]
+    assert writer.finalize(old) == 4
+    expected = sorted(COURSES, key=lambda course: course['code']) + [old[1]]
+    assert (course_dir / 'CSCI.json').read_text() == json.dumps(expected)
+    assert os.listdir(partial_dir) == []
+    assert writer.courses is None
+
+
+def test_out_of_order_positions(dirs):
+    course_dir, partial_dir = dirs
+    writer = SubjectWriter(str(course_dir / 'CSCI.json'), str(partial_dir), keep=True)
+    writer.write({'code': '1000', 'title': 'Second'}, position=1)
+    writer.write({'code': '1000', 'title': 'First'}, position=0)
+    writer.finalize()
+    titles = [course['title'] for course in json.loads((course_dir / 'CSCI.json').read_text())]
+    assert titles == ['First', 'Second']
+    assert [course['title'] for course in writer.courses] == titles
+
+
+def test_discard_keeps_old_file(dirs):
+    course_dir, partial_dir = dirs
+    path = course_dir / 'CSCI.json'
+    path.write_text('[]')
+    writer = SubjectWriter(str(path), str(partial_dir))
+    writer.write(COURSES[0])
+    writer.discard()
+    assert path.read_text() == '[]'
+    assert os.listdir(partial_dir) == []
+
+
+def test_without_partial_dir_only_in_memory(dirs):
+    course_dir, partial_dir = dirs
+    writer = SubjectWriter(str(course_dir / 'CSCI.json'))
+    for course in COURSES:
+        writer.write(course)
+    assert writer.finalize(save=False) == 3
+    assert [course['code'] for course in writer.courses] == ['1000', '2000', '3100']
+    assert os.listdir(course_dir) == [] and os.listdir(partial_dir) == []
+
+
+def test_search_subject_without_save(make_scraper, catalog_fixture):
+    scraper = make_scraper()
+    subject = next(iter(catalog_fixture.subjects))
+    assert scraper.search_subject(subject, save=False)
+    codes = [course['code'] for course in catalog_fixture.subjects[subject]]
+    assert [course['code'] for course in scraper.courses[subject]] == codes
+    assert os.listdir(scraper.course_dirname) == [] and os.listdir(scraper.partial_dirname) == []
+
+
+def test_search_subject_streams_to_disk(make_scraper, catalog_fixture):
+    scraper = make_scraper()
+    subject = next(iter(catalog_fixture.subjects))
+    assert scraper.search_subject(subject)
+    with open(os.path.join(scraper.course_dirname, f'{subject}.json'), 'r') as f:
+        assert len(json.load(f)) == len(catalog_fixture.subjects[subject])
+    assert scraper.courses == {}
+
+
+class FailingSession(FixtureSession):
+    # Fails the course detail request of the second course
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if data and data.get('__EVENTTARGET', '').startswith('gv_detail$ctl03'):
+            raise ConnectionError('connection reset')
+        return super().request(method, url, params, data, **kwargs)
+
+
+@pytest.mark.parametrize('cls', [CourseScraper, AsyncCourseScraper])
+def test_failed_subject_leaves_no_partial_file(make_scraper, catalog_fixture, cls):
+    scraper = make_scraper(cls)
+    scraper.sess = FailingSession(catalog_fixture)
+    with pytest.raises(ConnectionError):
+        scraper.search_subject(next(iter(catalog_fixture.subjects)))
+    assert os.listdir(scraper.partial_dirname) == [] and os.listdir(scraper.course_dirname) == []
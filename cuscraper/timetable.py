@@ -0,0 +1,180 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Interval index of every timeslot of every section, per term, for clash / free slot / room queries
+# without scanning the course files. Times are minutes of the week (day * 1440 + minutes of the day,
+# Sunday = 0 like the days of parse_sections). Timeslots are sorted by start, so the ones overlapping
+# [start, end) all start within [start - longest timeslot, end): two bisections and a short scan.
+#   index = TimetableIndex.load('data/1660000000/derived/timetable.json')
+#   index.clashes('2022-23 Term 1', 'CSCI1000', '--LEC (5000)')
+#   index.free_locations('2022-23 Term 1', minute_of_week('Tu', '14:30'), minute_of_week('Tu', '16:15'))
+
+MINUTES_PER_DAY = 24 * 60
+DAYS = {'Su': 0, 'Mo': 1, 'Tu': 2, 'We': 3, 'Th': 4, 'Fr': 5, 'Sa': 6}
+
+
+def to_minutes(s):
+    hours, sep, minutes = s.partition(':') if isinstance(s, str) else ('', '', '')
+    if not sep or not hours.isdigit() or not minutes.isdigit():
+        return None
+    return int(hours) * 60 + int(minutes)
+
+
+# e.g. minute_of_week('Tu', '14:30') or minute_of_week(2, '14:30')
+def minute_of_week(day, time: str) -> int:
+    return DAYS.get(day, day) * MINUTES_PER_DAY + to_minutes(time)
+
+
+# Minutes of the day as in the course files, e.g. 9:30
+def format_minutes(minutes) -> str:
+    return f'{minutes // 60}:{minutes % 60:02d}'
+
+
+def format_minute_of_week(minutes) -> str:
+    day = next(name for name, i in DAYS.items() if i == minutes // MINUTES_PER_DAY)
+    return f'{day} {format_minutes(minutes % MINUTES_PER_DAY)}'
+
+
+class TermIndex:
+    __slots__ = ('sections', 'locations', 'starts', 'ends', 'section_ids',
+                 'location_ids', 'longest', 'section_lookup', 'location_lookup', 'by_section', 'by_location')
+
+    # sections: [course id, section name], timeslots sorted by start, given as column arrays
+    def __init__(self, sections, locations, starts, ends, section_ids, location_ids):
+        self.sections = sections
+        self.locations = locations
+        self.starts = array('i', starts)
+        self.ends = array('i', ends)
+        self.section_ids = array('i', section_ids)
+        self.location_ids = array('i', location_ids)
+        self.longest = max((end - start for start, end in zip(self.starts, self.ends)), default=0)
+        self.section_lookup = {(course_id, name): i for i, (course_id, name) in enumerate(sections)}
+        self.location_lookup = {location: i for i, location in enumerate(locations)}
+        self.by_section = {}
+        self.by_location = {}
+        for i, (section_id, location_id) in enumerate(zip(self.section_ids, self.location_ids)):
+            self.by_section.setdefault(section_id, []).append(i)
+            self.by_location.setdefault(location_id, []).append(i)
+
+    @classmethod
+    def build(cls, timeslots: list) -> 'TermIndex':
+        # timeslots: (start, end, (course id, section name), location)
+        timeslots.sort(key=lambda timeslot: timeslot[0])
+        sections, locations = {}, {}
+        section_ids = [sections.setdefault(section, len(sections)) for _, _, section, _ in timeslots]
+        location_ids = [locations.setdefault(location, len(locations)) for _, _, _, location in timeslots]
+        return cls([list(section) for section in sections], list(locations), [timeslot[0] for timeslot in timeslots],
+                   [timeslot[1] for timeslot in timeslots], section_ids, location_ids)
+
+    def timeslot(self, i) -> tuple:
+        course_id, name = self.sections[self.section_ids[i]]
+        return course_id, name, self.starts[i], self.ends[i], self.locations[self.location_ids[i]]
+
+    # Indexes of the timeslots overlapping [start, end)
+    def overlapping(self, start, end) -> list:
+        lo = bisect_right(self.starts, start - self.longest)
+        hi = bisect_left(self.starts, end)
+        ends = self.ends
+        return [i for i in range(lo, hi) if ends[i] > start]
+
+    def to_json(self) -> dict:
+        return {
+            'sections': self.sections,
+            'locations': self.locations,
+            'starts': list(self.starts),
+            'ends': list(self.ends),
+            'section_ids': list(self.section_ids),
+            'location_ids': list(self.location_ids),
+        }
+
+
+class TimetableIndex:
+    def __init__(self, terms: dict):
+        self.terms = terms
+
+    @classmethod
+    def load(cls, path) -> 'TimetableIndex':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls({term: TermIndex(**columns) for term, columns in data['terms'].items()})
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'terms': {term: index.to_json() for term, index in self.terms.items()}},
+                      f, separators=(',', ':'))
+
+    # (course id, section, start, end, location) of the timeslots overlapping [start, end)
+    def overlaps(self, term, start, end, location=None) -> list:
+        index = self.terms[term]
+        timeslots = [index.timeslot(i) for i in index.overlapping(start, end)]
+        if location is not None:
+            timeslots = [timeslot for timeslot in timeslots if timeslot[4] == location]
+        return timeslots
+
+    # [course id, section] of the other sections with a timeslot overlapping one of the section's
+    def clashes(self, term, course_id, section) -> list:
+        index = self.terms[term]
+        section_id = index.section_lookup.get((course_id, section))
+        if section_id is None:
+            raise KeyError(f'{course_id} {section} has no timeslot in {term}')
+        clashing = {}
+        for i in index.by_section[section_id]:
+            for j in index.overlapping(index.starts[i], index.ends[i]):
+                if index.section_ids[j] != section_id:
+                    clashing.setdefault(index.section_ids[j])
+        return [index.sections[j] for j in clashing]
+
+    # Locations used in the term that are free during the whole of [start, end)
+    def free_locations(self, term, start, end) -> list:
+        index = self.terms[term]
+        busy = set(index.location_ids[i] for i in index.overlapping(start, end))
+        return [location for i, location in enumerate(index.locations) if i not in busy]
+
+    # Timeslots at the location, in order, on the given day (0-6 or 'Mo', ...) or the whole week
+    def occupancy(self, term, location, day=None) -> list:
+        index = self.terms[term]
+        location_id = index.location_lookup.get(location)
+        if location_id is None:
+            return []
+        timeslots = [index.timeslot(i) for i in index.by_location[location_id]]
+        if day is not None:
+            day = DAYS.get(day, day)
+            timeslots = [timeslot for timeslot in timeslots if timeslot[2] // MINUTES_PER_DAY == day]
+        return timeslots
+
+    # Free (start, end) intervals of the location on the day, between day_start & day_end ('HH:MM')
+    def free_slots(self, term, location, day, day_start='8:30', day_end='22:00', min_minutes=0) -> list:
+        start, end = minute_of_week(day, day_start), minute_of_week(day, day_end)
+        free, cursor = [], start
+        for _, _, slot_start, slot_end, _ in self.occupancy(term, location, day):
+            if slot_start > cursor:
+                free.append((cursor, min(slot_start, end)))
+            cursor = max(cursor, slot_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            free.append((cursor, end))
+        return [(slot_start, slot_end) for slot_start, slot_end in free if slot_end - slot_start >= max(min_minutes, 1)]
+
+
+# derived/timetable.json, see generate_stat. Timeslots without a known day & time (e.g. TBA) are left out
+class TimetableBuilder:
+    def __init__(self):
+        self.timeslots = {}
+
+    def add(self, subject, courses):
+        for course in courses:
+            course_id = subject + course['code']
+            for term, sections in course.get('terms', {}).items():
+                term_timeslots = self.timeslots.setdefault(term, [])
+                for name, section in sections.items():
+                    for day, start, end, location in zip(section['days'], section['startTimes'], section['endTimes'], section['locations']):
+                        start, end = to_minutes(start), to_minutes(end)
+                        if type(day) is not int or start is None or end is None:
+                            continue
+                        term_timeslots.append((day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end,
+                                               (course_id, name), location))
+
+    def result(self) -> TimetableIndex:
+        return TimetableIndex({term: TermIndex.build(timeslots) for term, timeslots in self.timeslots.items()})
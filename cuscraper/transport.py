@@ -0,0 +1,138 @@
+import email.utils
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import request_kind
+
+# Throttled by the server (429) or a gateway in front of it
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60
+
+
+# Spaces out requests so that all sessions sharing a limiter stay under max_rps
+class RateLimiter:
+    def __init__(self, max_rps=None):
+        self.interval = 1.0 / max_rps if max_rps else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            scheduled = max(now, self.next_time)
+            self.next_time = scheduled + self.interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+    # Called with the outcome of every request, a fixed limiter ignores it
+    def observe(self, latency: float, ok: bool):
+        pass
+
+
+# Finds the rate the server is comfortable with: additive increase (by `increase` rps per second of
+# requests) while responses are fine & faster than target_latency, halved on an error or a slow
+# response. In-flight requests sent before a decrease don't decrease it again.
+class AdaptiveRateLimiter(RateLimiter):
+    def __init__(self, max_rps=10, min_rps=0.5, target_latency=2.0, increase=0.5, decrease=0.5):
+        super().__init__(max_rps)
+        self.max_rps = max_rps
+        self.min_rps = min_rps
+        self.rps = max_rps
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.last_decrease = 0.0
+
+    def observe(self, latency: float, ok: bool):
+        with self.lock:
+            now = time.monotonic()
+            if not ok or latency > self.target_latency:
+                if now - latency >= self.last_decrease:
+                    self.rps = max(self.min_rps, self.rps * self.decrease)
+                    self.last_decrease = now
+            else:
+                self.rps = min(self.max_rps, self.rps +
+                               self.increase / self.rps)
+            self.interval = 1.0 / self.rps
+
+
+# One connection pool shared by every session mounting it, i.e. keep-alive connections are reused
+# across parallel workers while cookies (the ASP.NET session) stay per session
+def make_adapter(pool_maxsize=10) -> HTTPAdapter:
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+
+
+class ScraperSession(requests.Session):
+    # timeout: (connect, read) seconds applied to every request that doesn't set one. Connection errors,
+    # timeouts, RETRY_STATUSES & responses is_transient(res) flags are retried up to `retries` times
+    # with full-jitter exponential backoff. Every attempt is recorded in metrics, if given
+    def __init__(self, limiter: RateLimiter = None, timeout=None, retries=0, backoff=0.5, adapter: HTTPAdapter = None, is_transient=None, metrics=None):
+        super().__init__()
+        self.limiter = limiter
+        self.metrics = metrics
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.is_transient = is_transient
+        if adapter:
+            self.mount('http://', adapter)
+            self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.wait()
+            start = time.monotonic()
+            try:
+                res = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                latency = time.monotonic() - start
+                if self.limiter:
+                    self.limiter.observe(latency, False)
+                if self.metrics:
+                    self.metrics.record_request(request_kind(method, url, kwargs.get('data')), latency,
+                                                error='timeout' if isinstance(e, requests.Timeout) else 'connection')
+                if attempt >= self.retries:
+                    raise
+            else:
+                latency = time.monotonic() - start
+                error = f'http_{res.status_code}' if res.status_code in RETRY_STATUSES else 'transient_page' if (
+                    self.is_transient is not None and self.is_transient(res)) else None
+                if self.limiter:
+                    self.limiter.observe(latency, error is None)
+                if self.metrics:
+                    self.metrics.record_request(request_kind(
+                        method, url, kwargs.get('data')), latency, len(res.content), error)
+                transient = error is not None
+                if not transient or attempt >= self.retries:
+                    return res
+                delay = retry_after(res)
+                res.close()
+                if delay is not None:
+                    time.sleep(min(delay, MAX_RETRY_AFTER))
+                    attempt += 1
+                    continue
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+
+# Seconds asked for by a Retry-After header, if any
+def retry_after(res: requests.Response):
+    value = res.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,4 +1,4 @@
-import os, sys
+import os, re, sys, threading
 
 def get_date_sort_key(s: str):
         parts = s.split('/')
@@ -6,6 +6,21 @@ def get_date_sort_key(s: str):
             return (int(parts[1]), int(parts[0]))
         return 0
 
+# Order of terms within an academic year, e.g. 2022-23 Term 1 < 2022-23 Term 2 < 2022-23 Summer Session
+TERM_ORDER = {'Term 1': 1, 'Term 2': 2, 'Summer Session': 3}
+
+def get_term_sort_key(s: str):
+        m = re.match(r'(\d{4})-\d{2} (.+)$', s.strip())
+        if not m or m.group(2) not in TERM_ORDER:
+            return None
+        return (int(m.group(1)), TERM_ORDER[m.group(2)])
+
+# {subject: path} of every {subject}.json in a course dir, in scandir order
+def subject_paths(course_dir) -> dict:
+    with os.scandir(course_dir) as it:
+        return {entry.name[:-5]: entry.path for entry in it
+                if len(entry.name) == 9 and entry.name.endswith('.json')}  # i.e. filename is a valid subject code
+
 def make_dirs(dirs):
     for dir in dirs:
         if not os.path.isdir(dir):
@@ -48,3 +63,21 @@ class HiddenPrints:
         if self.hide:
             sys.stdout.close()
             sys.stdout = self._original_stdout
+
+class LockedWriter:
+    # Serialises writes to a shared file (e.g. the parser log) across worker threads,
+    # on_write(s) sees every write, e.g. to count errors
+    def __init__(self, file, on_write=None):
+        self.file = file
+        self.lock = threading.Lock()
+        self.on_write = on_write
+
+    def write(self, s: str):
+        if self.on_write:
+            self.on_write(s)
+        with self.lock:
+            return self.file.write(s)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
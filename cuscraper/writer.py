@@ -0,0 +1,73 @@
+import json
+import os
+
+# Streams the courses of a subject to disk as they're parsed instead of holding them until the
+# subject is done: one json line per course in partial_dir/{subject}.ndjson, then finalize() writes
+# {subject}.json sorted by code, byte for byte what json.dump(course_list, f) writes, and swaps it in
+# atomically. Only (code, position, offset, length) of each course stays in memory.
+
+
+class SubjectWriter:
+    # keep: also keep the courses in memory, e.g. for CourseScraper(keep_courses=True).
+    # Without partial_dir nothing is written to disk, the courses are only kept in memory
+    def __init__(self, path, partial_dir=None, keep=False):
+        self.path = path
+        self.partial_path = os.path.join(
+            partial_dir, os.path.basename(path)[:-5] + '.ndjson') if partial_dir else None
+        self.file = open(self.partial_path, 'w+b') if partial_dir else None
+        self.index = []
+        self.courses = [] if keep or not partial_dir else None
+
+    def __len__(self):
+        return len(self.index)
+
+    def codes(self) -> set:
+        return set(code for code, _, _, _ in self.index)
+
+    # position: order of the course on the search page, courses written out of order (e.g. as their
+    # requests complete) are saved in the same order as when written in order
+    def write(self, course: dict, position=None):
+        if position is None:
+            position = len(self.index)
+        if self.file is None:
+            self.index.append((course['code'], position, None, None))
+        else:
+            line = json.dumps(course).encode()
+            offset = self.file.seek(0, os.SEEK_END)
+            self.file.write(line + b'\n')
+            self.index.append((course['code'], position, offset, len(line)))
+        if self.courses is not None:
+            self.courses.append((position, course))
+
+    # Written sorted by code, then the old courses (e.g. from merge_dir) no longer on the search page.
+    # Returns the number of courses saved, save=False (or no partial_dir) only sorts the courses in memory
+    def finalize(self, old_courses=(), save=True) -> int:
+        self.index.sort(key=lambda entry: (entry[0], entry[1]))
+        codes = self.codes()
+        old_courses = [
+            course for course in old_courses if course['code'] not in codes]
+        if self.courses is not None:
+            self.courses.sort(key=lambda item: (item[1]['code'], item[0]))
+            self.courses = [course for _, course in self.courses] + old_courses
+        if save and self.file is not None:
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(b'[')
+                for i, (_, _, offset, length) in enumerate(self.index):
+                    if i:
+                        f.write(b', ')
+                    self.file.seek(offset)
+                    f.write(self.file.read(length))
+                for course in old_courses:
+                    if f.tell() > 1:
+                        f.write(b', ')
+                    f.write(json.dumps(course).encode())
+                f.write(b']')
+            os.replace(tmp_path, self.path)
+        self.discard()
+        return len(self.index) + len(old_courses)
+
+    def discard(self):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+            os.remove(self.partial_path)